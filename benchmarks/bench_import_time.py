@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the startup of the ledger-app-tester commands, based on `python -X importtime`.
+Each command is started with `-h`, so that only its imports are measured.
+With `--max`, exits with an error if a command imports are slower than its budget.
+"""
+
+import os
+import re
+import sys
+import subprocess
+from argparse import ArgumentParser
+from typing import Dict, List, Optional, Tuple
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+# pylint: disable=wrong-import-position
+from cli import COMMANDS  # noqa: E402
+
+# `import time: self [us] | cumulative | imported package`, the nesting level being the indentation
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def import_times(command: str) -> Tuple[float, Dict[str, float]]:
+    """Start a command, and get its imports durations (in ms).
+    Returns:
+        The total of the top-level imports, and the cumulative duration of each top-level import.
+    """
+
+    cmd = [sys.executable, "-X", "importtime", os.path.join(SCRIPTS_DIR, "cli.py")]
+    if command:
+        cmd.append(command)
+    res = subprocess.run([*cmd, "-h"], check=False, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    modules: Dict[str, float] = {}
+    for line in res.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        # Only the top-level imports, as the cumulative durations include the nested ones
+        if match and len(match.group(3)) == 1:
+            modules[match.group(4)] = modules.get(match.group(4), 0.0) + int(match.group(2)) / 1000
+    return sum(modules.values()), modules
+
+
+def parse_budgets(values: List[str]) -> Dict[Optional[str], float]:
+    """Parse the budgets (in ms): `<command>=<ms>` for a command, `<ms>` for the other ones (None key)"""
+
+    budgets: Dict[Optional[str], float] = {}
+    for value in values:
+        command, _, ms = value.rpartition("=")
+        budgets[command if "=" in value else None] = float(ms)
+    return budgets
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmark of the commands import time")
+    parser.add_argument("-c", "--commands", nargs="+", default=["", *COMMANDS],
+                        help="Commands to measure ('' for the entry point alone). Defaults to all.")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Nb of repetitions. Defaults to %(default)s.")
+    parser.add_argument("-n", "--top", type=int, default=5,
+                        help="Nb of slowest imports listed per command. Defaults to %(default)s.")
+    parser.add_argument("--max", nargs="+", default=[],
+                        help="Max import time of the commands (in ms), to catch regressions: `<command>=<ms>` "
+                        "for a command ('' for the entry point), `<ms>` for the other ones.")
+    args = parser.parse_args()
+    budgets = parse_budgets(args.max)
+
+    failed: List[str] = []
+    for command in args.commands:
+        # The fastest run is the least disturbed by the machine load
+        total, modules = min((import_times(command) for _ in range(args.repeat)), key=lambda r: r[0])
+        name = command or "(entry point)"
+        print(f"{name:<15} {total:8.1f} ms")
+        for module, ms in sorted(modules.items(), key=lambda m: -m[1])[:args.top]:
+            print(f"    {module:<30} {ms:8.1f} ms")
+        budget = budgets.get(command, budgets.get(None))
+        if budget is not None and total > budget:
+            failed.append(f"{name} ({total:.0f} > {budget:.0f} ms)")
+
+    if failed:
+        print(f"Import time above the budget: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the job links lookup done by summary.py, on synthetic job lists.
+"""
+
+import os
+import sys
+import timeit
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../scripts"))
+# pylint: disable=wrong-import-position
+from summary import build_job_index, get_job_link  # noqa: E402
+
+
+def linear_job_link(app_name: str, job_name: str, jobs) -> str:
+    """Former implementation: linear scan with substring matching"""
+
+    job = next((job for job in jobs if app_name in job.name and job_name in job.name), None)
+    return f"[{job_name}]({job.html_url})" if job else "N/A"
+
+
+def synthetic_jobs(nb_apps: int) -> tuple:
+    """Generate a test run jobs list: 1 Build and 1 Test job per app, plus the other steps"""
+
+    apps = [f"app-{i:03d}" for i in range(nb_apps)]
+    jobs = []
+    for kind in ("Build", "Test"):
+        jobs.append(SimpleNamespace(name=f"{kind} All apps / Get applications list", html_url="url"))
+        for app in apps:
+            name = f"{kind} All apps / Run for all targets ({app}, c, ./, COIN)"
+            jobs.append(SimpleNamespace(name=name, html_url=f"https://jobs/{kind}/{app}"))
+        jobs.append(SimpleNamespace(name=f"{kind} Artifacts / Collecting artifacts", html_url="url"))
+    return apps, jobs
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmark of the job links lookup")
+    parser.add_argument("-a", "--apps", type=int, default=200, help="Nb of apps. Defaults to %(default)s.")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Nb of repetitions. Defaults to %(default)s.")
+    args = parser.parse_args()
+
+    apps, jobs = synthetic_jobs(args.apps)
+
+    def linear() -> None:
+        for app in apps:
+            linear_job_link(app, "Build", jobs)
+            linear_job_link(app, "Test", jobs)
+
+    def indexed() -> None:
+        index = build_job_index(jobs)
+        for app in apps:
+            get_job_link(app, "Build", index)
+            get_job_link(app, "Test", index)
+
+    t_linear = min(timeit.repeat(linear, number=1, repeat=args.repeat))
+    t_indexed = min(timeit.repeat(indexed, number=1, repeat=args.repeat))
+    print(f"{len(apps)} apps, {len(jobs)} jobs")
+    print(f"  linear scan: {t_linear * 1000:8.2f} ms")
+    print(f"  indexed    : {t_indexed * 1000:8.2f} ms (x{t_linear / t_indexed:.1f})")
+
+
+if __name__ == "__main__":
+    main()
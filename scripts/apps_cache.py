@@ -0,0 +1,122 @@
+"""
+On-disk cache of the applications information, validated against the HEAD sha of their default branch.
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from ledgered.github import AppRepository
+
+# Bump it when the format of the cached information changes
+CACHE_VERSION = 2
+CACHE_FILE = "apps_cache.json"
+
+
+class AppsCache:
+    """Cache of the resolved applications information.
+
+    Each record is keyed by the repository name, and holds the HEAD sha of the default branch,
+    the associated ETag, and the information resolved at this sha (None if the app has no manifest).
+    The cache is stored as a single JSON file, so the directory can be restored with `actions/cache`.
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, CACHE_FILE)
+        self.hits = 0
+        self.misses = 0
+        self._records: Dict[str, dict] = {}
+        self._heads: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        """Load the cache file, if any"""
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            logging.info("No apps cache found in '%s'", self.path)
+            return
+        except json.JSONDecodeError:
+            logging.warning("Invalid apps cache '%s', ignoring it", self.path)
+            return
+        if data.get("version") != CACHE_VERSION:
+            logging.info("Apps cache '%s' has an obsolete format, ignoring it", self.path)
+            return
+        self._records = data.get("apps", {})
+        logging.info("Loaded %d record(s) from apps cache '%s'", len(self._records), self.path)
+
+    def save(self) -> None:
+        """Write the cache file"""
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "apps": self._records}, f)
+
+    def evict(self, apps: List["AppRepository"]) -> int:
+        """Remove the records of the apps which are archived or not available anymore.
+
+        Args:
+            apps: Full list of the organization applications
+        Returns:
+            Number of evicted records
+        """
+
+        active = {app.name for app in apps if not app.archived}
+        evicted = [name for name in self._records if name not in active]
+        for name in evicted:
+            logging.debug("Evicting app '%s' from cache", name)
+            del self._records[name]
+        return len(evicted)
+
+    def lookup(self, app: "AppRepository") -> Optional[dict]:
+        """Revalidate the cached record of an application against its HEAD sha.
+           A conditional request is used, so an unchanged HEAD does not consume the rate limit.
+
+        Args:
+            app: The application repository
+        Returns:
+            The cached record if still valid, else None
+        """
+
+        record = self._records.get(app.name)
+        headers = {"Accept": "application/vnd.github.sha"}
+        if record and record.get("etag"):
+            headers["If-None-Match"] = record["etag"]
+        status, resp_headers, body = app.requester.requestJson("GET",
+                                                               f"{app.url}/commits/{app.default_branch}",
+                                                               headers=headers)
+        with self._lock:
+            if record and status == 304:
+                self.hits += 1
+                return record
+            if status != 200:
+                raise RuntimeError(f"Unexpected status {status} while getting HEAD of '{app.name}'")
+            sha = body.strip()
+            self._heads[app.name] = (sha, resp_headers.get("etag"))
+            if record and record["sha"] == sha:
+                record["etag"] = resp_headers.get("etag")
+                self.hits += 1
+                return record
+            self.misses += 1
+        return None
+
+    def store(self, app: "AppRepository", info: Optional[dict]) -> None:
+        """Store the resolved information of an application, at the HEAD sha found by `lookup`.
+
+        Args:
+            app: The application repository
+            info: The resolved information, or None if the app has no manifest
+        """
+
+        with self._lock:
+            head = self._heads.get(app.name)
+            if head is None:
+                return
+            sha, etag = head
+            self._records[app.name] = {"sha": sha, "etag": etag, "info": info}
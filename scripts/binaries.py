@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Content-addressed store of the Apps binaries, handed from the Build jobs to the Test jobs.
+
+Each binary is stored once, compressed, in `objects/`, named after the hash of its content,
+and a manifest per App (`manifests/<app>.json`) maps the binaries paths to their objects.
+The identical binaries (between devices, variants or Apps) are uploaded and downloaded only once,
+and the stores of several jobs can be merged by copying them in a same directory.
+The test side restores the `build/` tree of the Apps from their manifest, with hardlinks (or copies).
+"""
+
+import os
+import sys
+import gzip
+import json
+import shutil
+import logging
+from pathlib import Path
+from typing import Dict, List
+from argparse import ArgumentParser, Namespace
+from build_cache import file_hash
+from utils import logging_init, logging_set_level, get_test_info
+
+# Bump it when the format of the manifests changes
+MANIFEST_VERSION = 1
+# Directory of the decompressed objects, linked in the restored trees
+UNPACKED_DIR = ".unpacked"
+
+
+class BinariesStore:
+    """Store of the Apps binaries: compressed objects, and a manifest per App"""
+
+    def __init__(self, directory: str):
+        self.root = Path(directory)
+
+    def _object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / f"{digest}.gz"
+
+    def _manifest_path(self, app: str) -> Path:
+        return self.root / "manifests" / f"{app}.json"
+
+    def pack(self, app: str, paths: List[str]) -> Dict[str, int]:
+        """Add the binaries of an App.
+
+        Args:
+            app: The App name
+            paths: The binaries, relative to the current directory (like `<app>/build/stax/bin/app.elf`),
+                   or directories of binaries
+        Returns:
+            Statistics: the number of files and new objects, the binaries size and the new objects size
+        """
+
+        stats = {"files": 0, "objects": 0, "size": 0, "stored": 0}
+        files: Dict[str, dict] = {}
+        for path in paths:
+            sources = sorted(p for p in Path(path).rglob("*") if p.is_file()) if os.path.isdir(path) else [Path(path)]
+            for src in sources:
+                digest = file_hash(src)
+                size = src.stat().st_size
+                obj = self._object_path(digest)
+                if not obj.is_file():
+                    obj.parent.mkdir(parents=True, exist_ok=True)
+                    tmp = obj.with_suffix(".tmp")
+                    with open(src, "rb") as fin, gzip.GzipFile(tmp, "wb", compresslevel=9, mtime=0) as fout:
+                        shutil.copyfileobj(fin, fout)
+                    os.replace(tmp, obj)
+                    stats["objects"] += 1
+                    stats["stored"] += obj.stat().st_size
+                files[os.path.normpath(src)] = {"digest": digest, "size": size, "mode": src.stat().st_mode & 0o777}
+                stats["files"] += 1
+                stats["size"] += size
+
+        manifest = self._manifest_path(app)
+        manifest.parent.mkdir(parents=True, exist_ok=True)
+        with open(manifest, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "app": app, "files": files}, f, indent=2, sort_keys=True)
+        return stats
+
+    def _unpacked(self, digest: str, mode: int) -> Path:
+        """Get the decompressed content of an object, decompressing it the 1st time"""
+
+        path = self.root / UNPACKED_DIR / digest
+        if not path.is_file():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            with gzip.open(self._object_path(digest), "rb") as fin, open(tmp, "wb") as fout:
+                shutil.copyfileobj(fin, fout)
+            os.chmod(tmp, mode)
+            os.replace(tmp, path)
+        return path
+
+    def restore(self, app: str, dest_dir: str, copy: bool = False) -> int:
+        """Restore the binaries of an App, with the paths of its manifest.
+
+        Args:
+            app: The App name
+            dest_dir: Directory the binaries paths are relative to
+            copy: Copy the binaries, instead of hardlinking them to the decompressed objects
+        Returns:
+            The number of restored binaries, -1 if the App has no manifest
+        """
+
+        try:
+            with open(self._manifest_path(app), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return -1
+        for name, info in manifest["files"].items():
+            src = self._unpacked(info["digest"], info["mode"])
+            dest = Path(dest_dir) / name
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            dest.unlink(missing_ok=True)
+            if copy:
+                shutil.copy2(src, dest)
+                continue
+            try:
+                os.link(src, dest)
+            except OSError:
+                # Not on the same filesystem
+                shutil.copy2(src, dest)
+        return len(manifest["files"])
+
+
+# ===============================================================================
+#          Parse command line options
+# ===============================================================================
+def arg_parse() -> Namespace:
+    """Parse the commandline options"""
+
+    parser = ArgumentParser(description="Store the binaries of the Apps, or restore them from the store")
+    parser.add_argument("paths",
+                        nargs="*",
+                        help="Binaries (or directories) to store, relative to the directory of the Apps.")
+    parser.add_argument("-s",
+                        "--store",
+                        required=True,
+                        type=str,
+                        help="Store directory.")
+    parser.add_argument("-a",
+                        "--app",
+                        required=True,
+                        action="append",
+                        type=str,
+                        help="App name (only one to store binaries, can be repeated to restore them).")
+    parser.add_argument("-r",
+                        "--restore",
+                        action="store_true",
+                        help="Restore the binaries of the Apps, instead of storing them.")
+    parser.add_argument("-D",
+                        "--deps",
+                        action="store_true",
+                        help="Also restore the binaries of the Apps dependencies (see test_info.json).")
+    parser.add_argument("-d",
+                        "--dest",
+                        type=str,
+                        default=".",
+                        help="Directory where the binaries are restored. Defaults to the current directory.")
+    parser.add_argument("--copy",
+                        action="store_true",
+                        help="Copy the restored binaries, instead of hardlinking them.")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase verbosity.")
+
+    args = parser.parse_args()
+    if not args.restore and len(args.app) != 1:
+        parser.error("The binaries of a single App can be stored at once.")
+    return args
+
+
+# ===============================================================================
+#          MAIN
+# ===============================================================================
+def main() -> None:
+    """Main function"""
+
+    logging_init()
+    args = arg_parse()
+    logging_set_level(args.verbose)
+
+    store = BinariesStore(args.store)
+    if not args.restore:
+        stats = store.pack(args.app[0], args.paths)
+        logging.info("%s: %d binary(ies) stored (%d bytes), %d new object(s) (%d bytes compressed)",
+                     args.app[0], stats["files"], stats["size"], stats["objects"], stats["stored"])
+        return
+
+    apps = list(args.app)
+    if args.deps:
+        for app in args.app:
+            apps.extend(d for d in get_test_info(app).get("dependencies", "").split() if d not in apps)
+    missing = []
+    for app in apps:
+        nb = store.restore(app, args.dest, args.copy)
+        if nb < 0:
+            missing.append(app)
+        else:
+            logging.info("%s: %d binary(ies) restored", app, nb)
+    if missing:
+        logging.error("No binaries found for %s", ", ".join(missing))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,710 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tool to Build an App for the selected devices and manage the status and log files.
+The per-device and per-variant builds run concurrently, each one in an isolated copy of the App tree,
+so that the variants don't need to be cleaned between them.
+Each distinct SDK reference is checked out once, in its own worktree, shared by the devices using it.
+The Rust dependencies are resolved once per App, and can be compiled once per device for all the Apps of a job,
+in a shared target directory per device.
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from build_cache import BuildCache
+from compiler_cache import CompilerCache
+from results import Record, write_records
+from sdk_resolver import SdkResolver
+from utils import logging_init, logging_set_level, get_full_devices, get_test_info, add_timing
+
+
+# Root directory of the SDK(s) in the container
+SDK_ROOT = os.environ.get("SDK_ROOT", "/opt")
+SDK_PATH = f"{SDK_ROOT}/ledger-secure-sdk"
+
+BANNER = "#" * 73
+SEPARATOR = "-" * 52
+
+
+@dataclass
+class AppConfig:
+    """Build configuration of the App, from its execution plan (see `parse_all_apps.py`) or its manifest"""
+
+    sdk: str
+    build_directory: str
+    devices: List[str]
+    elf_name: Optional[str] = None
+
+    @property
+    def is_c(self) -> bool:
+        """The App uses the C SDK"""
+        return self.sdk.lower() == "c"
+
+    @property
+    def is_rust(self) -> bool:
+        """The App uses the Rust SDK"""
+        return self.sdk.lower() == "rust"
+
+
+@dataclass
+class DeviceBuild:
+    """Build of the App for a device"""
+
+    target: str
+    sdk_path: str = SDK_PATH
+    sdk_ref: Optional[str] = None
+    variant_param: Optional[str] = None
+    variants_values: List[str] = field(default_factory=list)
+    cache_key: Optional[str] = None
+
+    @property
+    def c_target(self) -> str:
+        """Particular target name of Nanos+ for C SDK"""
+        return self.target.replace("s+", "s2")
+
+    @property
+    def rust_target(self) -> str:
+        """Particular target name of Nanos+ for Rust SDK"""
+        return self.target.replace("s+", "splus")
+
+    @property
+    def status_name(self) -> str:
+        """Particular target name of Nanos+ in status files"""
+        return self.target.replace("s+", "sp")
+
+
+@dataclass
+class BuildTask:
+    """Build of a variant of the App for a device (or of its default variant)"""
+
+    build: DeviceBuild
+    variant: Optional[str] = None
+    app_dir: str = ""
+    output_dir: Optional[str] = None
+    log: Optional[str] = None
+    err: int = 0
+
+    @property
+    def name(self) -> str:
+        """Name of the build, used for its isolated tree and log file"""
+        return f"{self.build.status_name}-{self.variant}" if self.variant else self.build.status_name
+
+
+# ===============================================================================
+#          Parse command line options
+# ===============================================================================
+def arg_parse() -> Namespace:
+    """Parse the commandline options"""
+
+    parser = ArgumentParser(description="Build an App and manage the status and log files")
+    parser.add_argument("-a",
+                        "--app",
+                        required=True,
+                        type=str,
+                        help="App name.")
+    parser.add_argument("-d",
+                        "--devices",
+                        required=False,
+                        default="",
+                        type=str,
+                        help="List of selected devices (separated with space).")
+    parser.add_argument("-m",
+                        "--mode",
+                        required=True,
+                        type=str,
+                        choices=["build", "scan", "test"],
+                        help="Required mode.")
+    parser.add_argument("-s",
+                        "--sdk_branch",
+                        required=False,
+                        type=str,
+                        help="SDK branch.")
+    parser.add_argument("-V",
+                        "--variants",
+                        action="store_true",
+                        help="Build all Variants.")
+    parser.add_argument("-j",
+                        "--jobs",
+                        required=False,
+                        type=int,
+                        default=os.cpu_count() or 1,
+                        help="Max number of builds (devices and variants) run concurrently. "
+                        "Defaults to %(default)s.")
+    parser.add_argument("-c",
+                        "--cache",
+                        required=False,
+                        type=str,
+                        help="Build cache directory, to reuse the results of the unchanged device builds.")
+    parser.add_argument("-C",
+                        "--compiler_cache",
+                        required=False,
+                        type=str,
+                        help="Compiler cache directory (ccache), to reuse the objects of the C builds. "
+                        "Can be shared by the Apps of a job.")
+    parser.add_argument("-T",
+                        "--cargo_target_dir",
+                        required=False,
+                        type=str,
+                        help="Directory of the cargo target directories of the Rust builds (one per device), "
+                        "to reuse the compiled dependencies. Can be shared by the Apps of a job.")
+    parser.add_argument("--sdk_worktrees",
+                        required=False,
+                        type=str,
+                        help="Directory of the SDK worktrees, kept between the builds (see build_server.py). "
+                        "Defaults to temporary worktrees.")
+    parser.add_argument("-P",
+                        "--plan",
+                        required=False,
+                        type=str,
+                        help="JSON file with the execution plan of the App (entry of the Apps list), "
+                        "instead of reading its manifest, build flags and SDK references.")
+
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase verbosity.")
+
+    args = parser.parse_args()
+    args.devices = [d.lower().replace("nanosp", "nanos+") for d in args.devices.split()]
+    if args.jobs < 1:
+        parser.error("--jobs must be a positive integer.")
+    # Timing records of the build phases, next to the status file
+    args.timing = f"build_timing_{args.app}.jsonl"
+    return args
+
+
+# ===============================================================================
+#          Run a command
+# ===============================================================================
+def log_lines(task: BuildTask, lines: List[str]) -> None:
+    """Print lines in the output of a build"""
+
+    if task.log is None:
+        print("\n".join(lines), flush=True)
+    else:
+        with open(task.log, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def run_cmd(cmd: List[str], cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None,
+            log: Optional[str] = None) -> int:
+    """Run a command, with its output in the log file if any.
+
+    Args:
+        cmd: Command and its arguments
+        cwd: Working directory
+        env: Additional environment variables
+        log: Log file (optional)
+    Returns:
+        The command exit code
+    """
+
+    logging.debug("Running '%s'", " ".join(cmd))
+    full_env = {**os.environ, **(env or {})}
+    if log is None:
+        return subprocess.run(cmd, cwd=cwd, env=full_env, check=False).returncode
+    with open(log, "a", encoding="utf-8") as f:
+        f.write(f"$ {' '.join(cmd)}\n")
+        f.flush()
+        return subprocess.run(cmd, cwd=cwd, env=full_env, stdout=f, stderr=subprocess.STDOUT, check=False).returncode
+
+
+# ===============================================================================
+#          Prepare Build Flags
+# ===============================================================================
+def get_extra_flags(args: Namespace, plan: Optional[dict]) -> List[str]:
+    """Get the additional build flags, depending on the mode"""
+
+    if args.mode == "test":
+        app_flags = plan["build_flags"] if plan else get_test_info(args.app).get("build_flags", "").split()
+        if app_flags:
+            print(f"Found Extra flags: {' '.join(app_flags)}")
+            return app_flags
+    elif args.mode == "scan":
+        return ["ENABLE_SDK_WERROR=1", "scan-build"]
+    return []
+
+
+# ===============================================================================
+#          Get Available Variants
+# ===============================================================================
+def get_variants(build: DeviceBuild, build_dir: str) -> None:
+    """Get the variants of the App for a device, thanks to `make listvariants`"""
+
+    env = {**os.environ, "TARGET": build.c_target, "BOLOS_SDK": build.sdk_path}
+    res = subprocess.run(["make", "-C", build_dir, "listvariants"], env=env, check=False,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    line = next((line for line in res.stdout.splitlines() if "VARIANTS" in line), None)
+    if line:
+        parts = line.split()
+        build.variant_param = parts[1]
+        build.variants_values = parts[2:]
+        logging.info("Found Variants: %s -> %s", build.variant_param, " ".join(build.variants_values))
+    else:
+        print("No variants found.")
+
+
+def get_tasks(build: DeviceBuild, config: AppConfig, args: Namespace) -> List[BuildTask]:
+    """Get the builds to run for a device: one per variant, or a single one"""
+
+    if config.is_c:
+        if args.variants and build.variants_values:
+            logging.info("Planned Variants: %s -> %s", build.variant_param, " ".join(build.variants_values))
+        elif args.variants:
+            start = time.perf_counter()
+            get_variants(build, os.path.join(args.app, config.build_directory))
+            add_timing(args.timing, args.app, "listvariants", time.perf_counter() - start, build.target)
+        else:
+            logging.info("Variants not requested.")
+    if build.variant_param:
+        return [BuildTask(build, variant=val, app_dir=args.app) for val in build.variants_values]
+    return [BuildTask(build, app_dir=args.app)]
+
+
+# ===============================================================================
+#          Build application
+# ===============================================================================
+def build_c(task: BuildTask, build_dir: str, make_args: List[str], args: Namespace) -> int:
+    """Build a variant of a C App for a device"""
+
+    build = task.build
+    env = {"TARGET": build.c_target, "BOLOS_SDK": build.sdk_path, **args.compiler_env}
+    cmd = ["make", *make_args, *args.compiler_args, "-C", build_dir]
+    if task.output_dir:
+        cmd.append(f"BUILD_DIR={task.output_dir}")
+    if task.variant:
+        log_lines(task, [SEPARATOR, f"     Compiling VARIANT: {build.variant_param} -> {task.variant}", SEPARATOR])
+        cmd.append(f"{build.variant_param}={task.variant}")
+    elif args.variants:
+        log_lines(task, [SEPARATOR, "     Compiling default VARIANT", SEPARATOR])
+    return run_cmd(cmd + args.extra_flags, env=env, log=task.log)
+
+
+def update_rust(build_dir: str, args: Namespace) -> None:
+    """Update the SDK dependencies of a Rust App, once for all its devices"""
+
+    if args.mode == "scan":
+        return
+    nightly = f"+{os.environ.get('RUST_NIGHTLY', '')}"
+    run_cmd(["cargo", nightly, "update", "ledger_device_sdk"], cwd=build_dir)
+    run_cmd(["cargo", nightly, "update", "ledger_secure_sdk_sys"], cwd=build_dir)
+
+
+def cargo_target_dir(build: DeviceBuild, args: Namespace) -> Optional[str]:
+    """Get the shared cargo target directory of a device, if any"""
+
+    if not args.cargo_target_dir:
+        return None
+    return os.path.join(os.path.abspath(args.cargo_target_dir), build.rust_target)
+
+
+def build_rust(task: BuildTask, build_dir: str, args: Namespace, jobs: Optional[int]) -> int:
+    """Build a Rust App for a device (its dependencies being already updated)"""
+
+    build = task.build
+    env = {"CARGO_BUILD_JOBS": str(jobs)} if jobs else {}
+    target_dir = cargo_target_dir(build, args)
+    if target_dir:
+        # The up to date crates are also listed, to count them
+        env.update(CARGO_TARGET_DIR=target_dir, CARGO_TERM_VERBOSE="true")
+    elif task.output_dir:
+        env.update(CARGO_TARGET_DIR=task.output_dir)
+    nightly = f"+{os.environ.get('RUST_NIGHTLY', '')}"
+    if args.mode == "scan":
+        return run_cmd(["cargo", nightly, "clippy", "--target", build.rust_target, "--", "-Dwarnings"],
+                       cwd=build_dir, env=env, log=task.log)
+    return run_cmd(["cargo", "ledger", "build", build.rust_target], cwd=build_dir, env=env, log=task.log)
+
+
+def cargo_stats(task: BuildTask) -> Dict[str, int]:
+    """Get the number of crates reused (`Fresh`) and compiled by a Rust build, from its log"""
+
+    stats = {"fresh": 0, "compiled": 0}
+    if task.log is None or not os.path.isfile(task.log):
+        return stats
+    with open(task.log, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            word = line.lstrip().split(" ", 1)[0]
+            if word == "Fresh":
+                stats["fresh"] += 1
+            elif word == "Compiling":
+                stats["compiled"] += 1
+    return stats
+
+
+def export_rust_outputs(build: DeviceBuild, config: AppConfig, args: Namespace) -> None:
+    """Copy the binaries of a Rust build from the shared target directory into the App tree"""
+
+    target_dir = cargo_target_dir(build, args)
+    if not target_dir or not config.elf_name:
+        return
+    src = Path(target_dir) / build.rust_target / "release"
+    dest = Path(args.app) / config.build_directory / "target" / build.rust_target / "release"
+    for path in src.glob(f"{config.elf_name}*"):
+        if path.is_file() and (path.name == config.elf_name or path.name.startswith(f"{config.elf_name}.")):
+            dest.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, dest / path.name)
+
+
+def run_task(task: BuildTask, config: AppConfig, args: Namespace, jobs: Optional[int]) -> int:
+    """Run a build, with its own output directory if set.
+
+    Args:
+        task: The build (device and variant)
+        config: The App build configuration
+        args: Command line arguments
+        jobs: Number of parallel compilation jobs (None for no limit)
+    Returns:
+        The build exit code
+    """
+
+    build = task.build
+    if task.variant is None or task.variant == build.variants_values[0]:
+        log_lines(task, [BANNER, f"     Building for device {build.target}", BANNER])
+    build_dir = os.path.join(task.app_dir, config.build_directory)
+    start = time.perf_counter()
+    if config.is_rust:
+        err = build_rust(task, build_dir, args, jobs)
+    else:
+        make_args = [f"-j{jobs}"] if jobs else ["-j"]
+        err = build_c(task, build_dir, make_args, args)
+    add_timing(args.timing, args.app, "compile", time.perf_counter() - start, build.target, task.variant)
+    return err
+
+
+# ===============================================================================
+#          Isolated outputs
+# ===============================================================================
+def make_output_dir(workdir: str, task: BuildTask, config: AppConfig) -> str:
+    """Get the output directory of a build, used instead of the `build` (or `target` for Rust) directory
+    of the App: the builds share the sources of the App, and only their outputs are separated
+    """
+
+    out_name = "target" if config.is_rust else "build"
+    path = os.path.join(workdir, task.name, out_name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def merge_outputs(task: BuildTask, config: AppConfig) -> None:
+    """Merge the outputs of an isolated build into the App tree"""
+
+    if task.output_dir is None or not os.path.isdir(task.output_dir):
+        return
+    out_name = "target" if config.is_rust else "build"
+    shutil.copytree(task.output_dir, Path(task.app_dir) / config.build_directory / out_name, symlinks=True,
+                    dirs_exist_ok=True)
+
+
+# ===============================================================================
+#          Build cache
+# ===============================================================================
+def git_head(path: str) -> Optional[str]:
+    """Get the HEAD sha of a git repository"""
+
+    res = subprocess.run(["git", "-C", path, "rev-parse", "HEAD"], check=False,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return res.stdout.strip() if res.returncode == 0 else None
+
+
+def get_cache_key(build: DeviceBuild, args: Namespace) -> Optional[str]:
+    """Get the build cache key of a device build, or None if some of its inputs are unknown"""
+
+    app_sha = git_head(args.app)
+    sdk_sha = git_head(build.sdk_path)
+    image = os.environ.get("BUILDER_DIGEST")
+    if not (app_sha and sdk_sha and image):
+        logging.warning("App or SDK commit, or builder image digest (BUILDER_DIGEST) unknown: "
+                        "build cache disabled for %s", build.target)
+        return None
+    return BuildCache.make_key(app=app_sha, sdk=sdk_sha, device=build.target, mode=args.mode,
+                               variants=args.variants, flags=args.extra_flags, image=image)
+
+
+def save_cache_stats(path: str, cache: Optional[BuildCache], compiler_stats: Optional[Dict[str, int]],
+                     cargo: Optional[Dict[str, Dict[str, int]]] = None) -> None:
+    """Write the statistics of the build and compiler caches (and of the shared cargo target directories,
+       per device), to be aggregated by the summary
+    """
+
+    stats: Dict[str, object] = {}
+    if cache is not None:
+        stats.update(hits=cache.hits, misses=cache.misses)
+    if compiler_stats is not None:
+        stats["compiler"] = compiler_stats
+    if cargo:
+        stats["cargo"] = cargo
+    if stats:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+
+
+def output_files(build: DeviceBuild, config: AppConfig, args: Namespace) -> List[str]:
+    """Get the binaries of a C device build, relative to the App tree"""
+
+    bin_dir = Path(args.app) / config.build_directory / "build" / build.c_target / "bin"
+    if not bin_dir.is_dir():
+        return []
+    return [str(p.relative_to(args.app)) for p in sorted(bin_dir.rglob("*")) if p.is_file()]
+
+
+# ===============================================================================
+#          App configuration
+# ===============================================================================
+def load_config(args: Namespace) -> Tuple[AppConfig, Optional[dict]]:
+    """Get the build configuration of the App, and its execution plan if any"""
+
+    if args.plan:
+        with open(args.plan, encoding="utf-8") as f:
+            plan = json.load(f)
+        return AppConfig(plan["sdk"], plan["build_directory"], plan["devices"], plan.get("elf_name")), plan
+
+    # pylint: disable=import-outside-toplevel
+    import tomli
+    from ledgered.manifest import Manifest, MANIFEST_FILE_NAME
+    manifest = Manifest.from_path(Path(args.app) / MANIFEST_FILE_NAME)
+    config = AppConfig(manifest.app.sdk, str(manifest.app.build_directory), list(manifest.app.devices))
+    cargo = Path(args.app) / config.build_directory / "Cargo.toml"
+    if config.is_rust and cargo.is_file():
+        with open(cargo, "rb") as f:
+            config.elf_name = tomli.load(f)["package"]["name"]
+    return config, None
+
+
+# ===============================================================================
+#          Results
+# ===============================================================================
+def report_variants(tasks: List[BuildTask]) -> None:
+    """Print the result of each variant build"""
+
+    variants = [t for t in tasks if t.variant]
+    if not variants:
+        return
+    lines = [SEPARATOR, "     Variants results", SEPARATOR]
+    for task in variants:
+        res = "OK" if task.err == 0 else f"FAILED ({task.err})"
+        lines.append(f"{task.build.target:<8} {task.build.variant_param}={task.variant}: {res}")
+    print("\n".join(lines))
+
+
+def failure_name(build: DeviceBuild, tasks: List[BuildTask]) -> str:
+    """Get the name of a failed device build, with its failed variants if any"""
+
+    failed = [t.variant for t in tasks if t.err != 0 and t.variant]
+    if not failed:
+        return build.status_name
+    return f"{build.status_name} [{build.variant_param}: {' '.join(failed)}]"
+
+
+# ===============================================================================
+#          MAIN
+# ===============================================================================
+def main() -> None:
+    """Main function"""
+
+    logging_init()
+
+    # Arguments parsing
+    # -----------------
+    args = arg_parse()
+
+    # Arguments checking
+    # ------------------
+    logging_set_level(args.verbose)
+
+    file_status = f"build_status_{args.app}.md"
+    file_error = f"build_errors_{args.app}.md"
+    file_cache = f"build_cache_{args.app}.json"
+    file_results = f"build_results_{args.app}.jsonl"
+
+    # Processing
+    # ----------
+    config, plan = load_config(args)
+
+    start = time.perf_counter()
+    args.extra_flags = get_extra_flags(args, plan)
+    add_timing(args.timing, args.app, "flags", time.perf_counter() - start)
+
+    # Select the devices to build
+    devices = get_full_devices()
+    builds: Dict[str, DeviceBuild] = {}
+    for target in devices:
+        if target not in config.devices:
+            logging.info("%s not supported.", target)
+        elif target not in args.devices:
+            logging.info("%s not selected.", target)
+        else:
+            builds[target] = DeviceBuild(target)
+            # Declared once in the Makefile, for all the devices
+            if args.variants and plan and plan["sdk"].lower() == "c" and plan["variants_values"]:
+                builds[target].variant_param = plan["variant_param"]
+                builds[target].variants_values = plan["variants_values"]
+
+    # Same location in all the runs, for the paths of the SDK worktrees seen by the compiler cache
+    workdir = os.path.join(tempfile.gettempdir(), f"build_{args.app}")
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+    tasks: Dict[str, List[BuildTask]] = {}
+
+    # Resolve the SDK of each device once: a worktree per distinct reference, shared by its devices
+    if args.sdk_worktrees:
+        resolver = SdkResolver(SDK_PATH, os.path.abspath(args.sdk_worktrees), keep=True)
+    else:
+        resolver = SdkResolver(SDK_PATH, os.path.join(workdir, "sdk"))
+    if config.is_c:
+        start = time.perf_counter()
+        if plan and all(target in plan["sdk_refs"] for target in builds):
+            refs = {target: plan["sdk_refs"][target] for target in builds}
+        else:
+            refs = resolver.resolve(list(builds), args.mode, args.sdk_branch)
+        sdk_paths = resolver.checkout_all(ref for ref in refs.values() if ref is not None)
+        for target, ref in refs.items():
+            build = builds[target]
+            build.sdk_ref = ref
+            if ref is None:
+                # Using SDK from the container for the targeted device
+                build.sdk_path = f"{SDK_ROOT}/{build.rust_target}-secure-sdk"
+                continue
+            sdk_path = sdk_paths[ref]
+            if sdk_path is None:
+                # Nothing can be built: the device is reported as failed
+                tasks[target] = [BuildTask(build, app_dir=args.app, err=1)]
+                continue
+            build.sdk_path = sdk_path
+        add_timing(args.timing, args.app, "sdk", time.perf_counter() - start)
+
+    # Only the C builds are cached, as the Rust SDK is resolved by cargo at build time
+    cache = BuildCache(args.cache) if args.cache and config.is_c else None
+    # The objects of the static analysis are not cached
+    compiler = CompilerCache(args.compiler_cache, os.path.join(workdir, "ccache_stats.log")) \
+        if args.compiler_cache and config.is_c and args.mode != "scan" else None
+    if compiler is not None and compiler.enabled:
+        compiler.zero_stats()
+        args.compiler_env = compiler.env()
+        args.compiler_args = compiler.make_args()
+    else:
+        args.compiler_env = {}
+        args.compiler_args = []
+
+    all_tasks: List[BuildTask] = []
+    for build in builds.values():
+        if build.target in tasks:
+            continue
+        if cache is not None:
+            build.cache_key = get_cache_key(build, args)
+            entry = cache.lookup(build.cache_key) if build.cache_key else None
+            if entry is not None:
+                print(f"Build for {build.target} restored from cache ({len(entry['files'])} file(s))")
+                start = time.perf_counter()
+                cache.restore(entry, args.app)
+                add_timing(args.timing, args.app, "cache", time.perf_counter() - start, build.target)
+                # Nothing to build: the device is reported as successful
+                build.cache_key = None
+                tasks[build.target] = []
+                continue
+        tasks[build.target] = get_tasks(build, config, args)
+        all_tasks.extend(tasks[build.target])
+
+    if config.is_rust and all_tasks:
+        # Resolved once, before the devices are built
+        start = time.perf_counter()
+        update_rust(os.path.join(args.app, config.build_directory), args)
+        add_timing(args.timing, args.app, "update", time.perf_counter() - start)
+
+    # Each build has its own output directory as soon as there are several ones: no need to clean between them
+    isolated = len(all_tasks) > 1
+    nb_jobs = min(args.jobs, max(1, len(all_tasks)))
+    # Split the CPUs between the concurrent builds
+    make_jobs = max(1, (os.cpu_count() or 1) // nb_jobs) if nb_jobs > 1 else None
+    if isolated:
+        for task in all_tasks:
+            # The shared cargo target directory of a device is already its own
+            if not (config.is_rust and args.cargo_target_dir):
+                task.output_dir = make_output_dir(workdir, task, config)
+            task.log = os.path.join(workdir, f"{task.name}.log")
+        logging.info("Running %d builds, %d concurrently with %s jobs each",
+                     len(all_tasks), nb_jobs, make_jobs or "unlimited")
+    elif config.is_rust and args.cargo_target_dir:
+        # The crates reused and compiled are counted from the log
+        for task in all_tasks:
+            task.log = os.path.join(workdir, f"{task.name}.log")
+    with ThreadPoolExecutor(max_workers=nb_jobs) as executor:
+        results = executor.map(lambda t: run_task(t, config, args, make_jobs), all_tasks)
+        for task, err in zip(all_tasks, results):
+            task.err = err
+    if isolated:
+        # The outputs of the last variant win, as with the in-place builds
+        for task in all_tasks:
+            merge_outputs(task, config)
+    cargo: Dict[str, Dict[str, int]] = {}
+    if config.is_rust and args.cargo_target_dir:
+        for task in all_tasks:
+            if task.err == 0:
+                export_rust_outputs(task.build, config, args)
+            cargo[task.build.target] = cargo_stats(task)
+            print(f"Cargo target for {task.build.target}: {cargo[task.build.target]['fresh']} crate(s) reused, "
+                  f"{cargo[task.build.target]['compiled']} compiled")
+
+    if cache is not None:
+        for build in builds.values():
+            if build.cache_key and all(t.err == 0 for t in tasks[build.target]):
+                cache.store(build.cache_key, args.app, output_files(build, config, args))
+        cache.evict()
+        logging.info("Build cache: %s", cache.report())
+    compiler_stats = compiler.stats() if compiler is not None else None
+    if compiler_stats is not None:
+        print(f"Compiler cache: {CompilerCache.report(compiler_stats)}")
+    save_cache_stats(file_cache, cache, compiler_stats, cargo)
+
+    # Report the status, in the devices order
+    final_err = 0
+    failed: List[str] = []
+    records: List[Record] = []
+    with open(file_status, "a", encoding="utf-8") as status:
+        for target in devices:
+            build_res = builds.get(target)
+            if build_res is None:
+                status.write("|:black_circle:")
+                records.append(Record(args.app, "build", target, None, "none"))
+                continue
+            # A build restored from the cache has no task
+            records.extend(Record(args.app, "build", target, t.variant, "fail" if t.err else "pass")
+                           for t in tasks[target] or [BuildTask(build_res)])
+            for task in tasks[target]:
+                if task.log:
+                    with open(task.log, encoding="utf-8") as log:
+                        print(log.read(), end="")
+            err = next((t.err for t in tasks[target] if t.err != 0), 0)
+            if err != 0:
+                status.write("|:x:")
+                failed.append(failure_name(build_res, tasks[target]))
+            else:
+                status.write("|:white_check_mark:")
+            final_err += err
+    resolver.cleanup()
+    shutil.rmtree(workdir, ignore_errors=True)
+    write_records(file_results, records)
+    report_variants([t for target in devices for t in tasks.get(target, [])])
+
+    if failed:
+        if os.path.isfile(file_error):
+            content = f", {', '.join(failed)}"
+        else:
+            content = f"\t• {args.app}: {', '.join(failed)}"
+        with open(file_error, "a", encoding="utf-8") as f:
+            f.write(content)
+
+    sys.exit(min(final_err, 255))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Content-addressed store of the device builds results, used to skip the builds whose inputs did not change.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import IO, Callable, Dict, List, Optional
+
+# Bump it when the format of the entries changes
+CACHE_VERSION = 1
+# Default max size of the stored files (in bytes)
+MAX_SIZE = 512 * 1024 * 1024
+
+
+def file_hash(path: Path) -> str:
+    """Get the sha256 of a file content"""
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class BuildCache:
+    """Cache of the device builds results.
+
+    Each entry is keyed by the hash of the build inputs (App sha, SDK sha, device, variants, flags,
+    builder image), and holds the output files of a successful build, with the hash of their content.
+    The files contents are stored once in `objects/`, named after their hash, so identical binaries
+    produced by several builds share the same object.
+    The least recently used entries (modification time of the entry file, touched by the hits) are evicted
+    when the stored objects exceed the size limit.
+    The cache can be shared by concurrent builders: the files are written atomically (temporary file renamed).
+    """
+
+    def __init__(self, directory: str, max_size: int = MAX_SIZE):
+        self.root = Path(directory)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        (self.root / "entries").mkdir(parents=True, exist_ok=True)
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(**inputs: object) -> str:
+        """Compute the key of a build from its inputs"""
+
+        data = json.dumps({"version": CACHE_VERSION, **inputs}, sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / "entries" / f"{key}.json"
+
+    def _object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest
+
+    @staticmethod
+    def _write_atomic(path: Path, write: Callable[[IO[bytes]], object]) -> None:
+        """Write a file through a temporary file, renamed once complete"""
+
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """Get the entry of a build, and mark it as recently used.
+
+        Args:
+            key: The build key, see `make_key`
+        Returns:
+            The entry, or None if the build is not cached (or some of its objects are missing)
+        """
+
+        path = self._entry_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entry = None
+        if entry is not None and not all(self._object_path(d).is_file() for d in entry["files"].values()):
+            logging.warning("Build cache entry %s is incomplete, ignoring it", key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted meanwhile: its objects were just checked
+            pass
+        return entry
+
+    def restore(self, entry: dict, dest_dir: str) -> None:
+        """Copy the output files of a cached build.
+
+        Args:
+            entry: The build entry
+            dest_dir: Directory the output files paths are relative to
+        """
+
+        for name, digest in entry["files"].items():
+            dest = Path(dest_dir) / name
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(self._object_path(digest), dest)
+
+    def store(self, key: str, src_dir: str, files: List[str]) -> None:
+        """Store the output files of a successful build.
+
+        Args:
+            key: The build key, see `make_key`
+            src_dir: Directory the output files paths are relative to
+            files: Paths of the output files
+        """
+
+        objects: Dict[str, str] = {}
+        for name in files:
+            src = Path(src_dir) / name
+            digest = file_hash(src)
+            obj = self._object_path(digest)
+            if not obj.is_file():
+                obj.parent.mkdir(exist_ok=True)
+                with open(src, "rb") as content:
+                    self._write_atomic(obj, lambda f: shutil.copyfileobj(content, f))
+            objects[name] = digest
+        data = json.dumps({"files": objects}).encode()
+        self._write_atomic(self._entry_path(key), lambda f: f.write(data))
+
+    def evict(self) -> int:
+        """Remove the least recently used entries until the objects fit in the size limit,
+           then the objects not referenced anymore.
+
+        Returns:
+            Number of evicted entries
+        """
+
+        entries = []
+        for path in (self.root / "entries").glob("*.json"):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entries.append((path.stat().st_mtime, path, json.load(f)))
+            except (OSError, json.JSONDecodeError) as e:
+                # Removed meanwhile, or not a valid entry: left as is
+                logging.debug("Skipping build cache entry %s: %s", path.name, e)
+        entries.sort(key=lambda e: e[0])
+
+        sizes = {obj.name: obj.stat().st_size for obj in (self.root / "objects").glob("*/*") if not obj.suffix}
+        refs: Dict[str, int] = {}
+        for _, _, entry in entries:
+            for digest in entry["files"].values():
+                refs[digest] = refs.get(digest, 0) + 1
+        total = sum(sizes.get(d, 0) for d in refs)
+
+        evicted = 0
+        while entries and total > self.max_size:
+            _, path, entry = entries.pop(0)
+            for digest in entry["files"].values():
+                refs[digest] -= 1
+                if refs[digest] == 0:
+                    total -= sizes.get(digest, 0)
+            path.unlink(missing_ok=True)
+            evicted += 1
+
+        for digest in sizes:
+            if refs.get(digest, 0) == 0:
+                self._object_path(digest).unlink(missing_ok=True)
+        if evicted:
+            logging.info("Evicted %d build cache entry(ies)", evicted)
+        return evicted
+
+    def report(self) -> str:
+        """Get a one line report of the cache usage"""
+
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total else 0.0
+        return f"{self.hits} hit(s), {self.misses} miss(es) ({rate:.0f}% hit rate)"
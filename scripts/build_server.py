@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local build server: a long-lived daemon running the Build and Test of the Apps for the developers,
+with a warm state shared by all the requests:
+ - the SDK worktrees, kept and only moved to the new commits of their references,
+ - the execution plan of each App (manifest, Cargo.toml and test_info.json), parsed again only when they change,
+ - the compiler cache (ccache) and the cargo target directories.
+
+The requests are sent over a Unix socket, queued, and run by a pool of workers (one request per App at a time),
+with the same runners as the workflows (`build_app.py` and `test_app.py`) in the directory of the server.
+The output of the runner (optional) and the status line of the request (like `|:white_check_mark:|:x:`)
+are streamed back to the client.
+"""
+
+import os
+import sys
+import json
+import queue
+import shlex
+import socket
+import logging
+import threading
+import subprocess
+import socketserver
+import tempfile
+from argparse import ArgumentParser, Namespace, REMAINDER
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from utils import logging_init, logging_set_level, get_full_devices
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNNERS = {"build": "build_app.py", "test": "test_app.py"}
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "ledger-app-tester.sock")
+# Last line of a response, with the exit code of the runner
+EXIT_PREFIX = "# exit "
+
+
+@dataclass
+class Job:
+    """Build or Test request of an App"""
+
+    app: str
+    phase: str
+    options: List[str]
+    log: bool = False
+    lines: "queue.Queue[Optional[str]]" = field(default_factory=queue.Queue, repr=False)
+    code: int = 0
+
+
+class BuildServer:
+    """Queue of the requests, run by a pool of workers with a warm state"""
+
+    def __init__(self, state_dir: str, workers: int):
+        self.state = Path(state_dir).resolve()
+        self.jobs: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._plans: Dict[str, Tuple[List[float], str]] = {}
+        self._app_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        (self.state / "plans").mkdir(parents=True, exist_ok=True)
+        self.workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, job: Job) -> int:
+        """Queue a request, and get the number of requests before it"""
+
+        position = self.jobs.qsize()
+        self.jobs.put(job)
+        return position
+
+    def stop(self) -> None:
+        """Stop the workers, once the queued requests are done"""
+
+        for _ in self.workers:
+            self.jobs.put(None)
+
+    def _worker(self) -> None:
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            with self._lock:
+                app_lock = self._app_locks.setdefault(job.app, threading.Lock())
+            # The runners of an App share its tree, and its status files
+            with app_lock:
+                try:
+                    self.run(job)
+                except Exception as e:  # pylint: disable=broad-except
+                    logging.error("%s %s failed: %s", job.phase, job.app, e)
+                    job.lines.put(f"{job.app} {job.phase} |:construction:")
+                    job.code = 1
+            job.lines.put(None)
+
+    def plan(self, app: str) -> str:
+        """Get the execution plan file of an App, written again only when its inputs changed"""
+
+        inputs = [Path(app) / "ledger_app.toml", Path(app) / "Cargo.toml",
+                  Path(SCRIPTS_DIR) / "../input_files/test_info.json"]
+        key = [p.stat().st_mtime for p in inputs if p.is_file()]
+        with self._lock:
+            cached = self._plans.get(app)
+            if cached and cached[0] == key:
+                return cached[1]
+        path = str(self.state / "plans" / f"{app}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(local_plan(app), f)
+        logging.info("Execution plan of %s written in %s", app, path)
+        with self._lock:
+            self._plans[app] = (key, path)
+        return path
+
+    def command(self, job: Job) -> List[str]:
+        """Get the runner command of a request, with the warm state"""
+
+        cmd = [sys.executable, os.path.join(SCRIPTS_DIR, RUNNERS[job.phase]), "-a", job.app, "-P", self.plan(job.app)]
+        if job.phase == "build":
+            defaults = {"--compiler_cache": "compiler_cache", "--cargo_target_dir": "cargo_target",
+                        "--sdk_worktrees": "sdk"}
+            short = {"--compiler_cache": "-C", "--cargo_target_dir": "-T"}
+            for option, name in defaults.items():
+                if option not in job.options and short.get(option) not in job.options:
+                    cmd.extend([option, str(self.state / name)])
+        return cmd + job.options
+
+    def run(self, job: Job) -> None:
+        """Run a request, streaming its output and its status line"""
+
+        status_file = f"{job.phase}_status_{job.app}.md"
+        offset = os.path.getsize(status_file) if os.path.isfile(status_file) else 0
+        cmd = self.command(job)
+        logging.info("Running '%s'", " ".join(shlex.quote(c) for c in cmd))
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True) as proc:
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                if job.log:
+                    job.lines.put(line.rstrip("\n"))
+            job.code = proc.wait()
+
+        # Only the tokens written by this request
+        status = ""
+        if os.path.isfile(status_file):
+            with open(status_file, encoding="utf-8") as f:
+                f.seek(offset)
+                status = f.read().strip()
+        job.lines.put(f"{job.app} {job.phase} {status or '|:construction:'}")
+
+
+def local_plan(app: str) -> dict:
+    """Get the execution plan of a local App, like `parse_all_apps.py` does for the GitHub repositories"""
+
+    # pylint: disable=import-outside-toplevel
+    import tomli
+    from ledgered.manifest import Manifest, MANIFEST_FILE_NAME
+    from parse_all_apps import build_directory_path, get_test_dir, make_plan
+
+    manifest = Manifest.from_path(Path(app) / MANIFEST_FILE_NAME)
+    info = {
+        "repo_name": app,
+        "sdk": manifest.app.sdk,
+        "devices": sorted(manifest.app.devices),
+        "build_directory": build_directory_path(str(manifest.app.build_directory)),
+        "variant_param": None,
+        "variants_values": [],
+        "elf_name": "app.elf",
+        "test_dir": get_test_dir(manifest),
+    }
+    if manifest.app.is_rust:
+        cargo = Path(app) / info["build_directory"] / "Cargo.toml"
+        info["elf_name"] = app
+        if cargo.is_file():
+            with open(cargo, "rb") as f:
+                info["elf_name"] = tomli.load(f)["package"]["name"]
+    # The SDK references and the variants are resolved by the builds (`make listvariants`)
+    return make_plan(info, Namespace(devices=get_full_devices(), mode=None, sdk_branch=None), dict)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Handler of a client connection: a single JSON request, answered with text lines"""
+
+    server: "UnixServer"
+
+    def send(self, line: str) -> None:
+        """Send a line to the client"""
+
+        self.wfile.write(f"{line}\n".encode())
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError as e:
+            self.send(f"# invalid request: {e}")
+            self.send(f"{EXIT_PREFIX}2")
+            return
+        if request.get("command") == "stop":
+            self.send("# stopping")
+            self.send(f"{EXIT_PREFIX}0")
+            self.server.builds.stop()
+            threading.Thread(target=self.server.shutdown).start()
+            return
+        if request.get("phase") not in RUNNERS or not request.get("app"):
+            self.send("# invalid request: an App and a phase (build or test) are required")
+            self.send(f"{EXIT_PREFIX}2")
+            return
+
+        job = Job(request["app"], request["phase"], request.get("options", []), request.get("log", False))
+        position = self.server.builds.submit(job)
+        try:
+            self.send(f"# queued {job.phase} {job.app} ({position} request(s) before)")
+            while (line := job.lines.get()) is not None:
+                self.send(line)
+            self.send(f"{EXIT_PREFIX}{job.code}")
+        except OSError:
+            # The client left: the request still runs, without output
+            logging.info("Client of %s %s disconnected", job.phase, job.app)
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server, a thread per client"""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, builds: BuildServer):
+        self.builds = builds
+        super().__init__(path, RequestHandler)
+
+
+# ===============================================================================
+#          Client
+# ===============================================================================
+def send_request(path: str, request: dict) -> int:
+    """Send a request to the server, print its response, and get the exit code of the runner"""
+
+    code = 1
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall(f"{json.dumps(request)}\n".encode())
+        for line in s.makefile(encoding="utf-8"):
+            line = line.rstrip("\n")
+            if line.startswith(EXIT_PREFIX):
+                code = int(line[len(EXIT_PREFIX):])
+            else:
+                print(line, flush=True)
+    return code
+
+
+def serve(args: Namespace) -> None:
+    """Run the server, until it is stopped"""
+
+    if os.path.exists(args.socket):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(args.socket)
+            logging.error("A server is already listening on %s", args.socket)
+            sys.exit(1)
+        except OSError:
+            # Left by a stopped server
+            os.remove(args.socket)
+    builds = BuildServer(args.state, args.workers)
+    with UnixServer(args.socket, builds) as server:
+        logging.info("Listening on %s, with %d worker(s) and the state in %s", args.socket, args.workers, builds.state)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            builds.stop()
+    os.remove(args.socket)
+
+
+# ===============================================================================
+#          Parse command line options
+# ===============================================================================
+def arg_parse() -> Namespace:
+    """Parse the commandline options"""
+
+    parser = ArgumentParser(description="Local build server: run the server, or send it a Build or Test request "
+                            "(the runner options follow `--`)")
+    parser.add_argument("-s",
+                        "--socket",
+                        type=str,
+                        default=DEFAULT_SOCKET,
+                        help="Unix socket of the server. Defaults to %(default)s.")
+    parser.add_argument("--serve",
+                        action="store_true",
+                        help="Run the server, in the directory of the Apps.")
+    parser.add_argument("-w",
+                        "--workers",
+                        type=int,
+                        default=2,
+                        help="Number of requests run concurrently by the server. Defaults to %(default)s.")
+    parser.add_argument("--state",
+                        type=str,
+                        default=".build_server",
+                        help="Directory of the warm state of the server. Defaults to %(default)s.")
+    parser.add_argument("--stop",
+                        action="store_true",
+                        help="Stop the server, once the queued requests are done.")
+    parser.add_argument("-a",
+                        "--app",
+                        type=str,
+                        help="App name (directory in the directory of the server).")
+    parser.add_argument("-p",
+                        "--phase",
+                        type=str,
+                        default="build",
+                        choices=list(RUNNERS),
+                        help="Requested phase. Defaults to %(default)s.")
+    parser.add_argument("-l",
+                        "--log",
+                        action="store_true",
+                        help="Stream the output of the runner, before the status line.")
+    parser.add_argument("options",
+                        nargs=REMAINDER,
+                        help="Options of the runner (build_app.py or test_app.py), like `-- -m build -d stax`.")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase verbosity.")
+
+    args = parser.parse_args()
+    if args.options and args.options[0] == "--":
+        args.options = args.options[1:]
+    if args.workers < 1:
+        parser.error("--workers must be a positive integer.")
+    if not (args.serve or args.stop or args.app):
+        parser.error("An App must be specified (or --serve, --stop).")
+    return args
+
+
+# ===============================================================================
+#          MAIN
+# ===============================================================================
+def main() -> None:
+    """Main function"""
+
+    logging_init()
+    args = arg_parse()
+    logging_set_level(args.verbose)
+
+    if args.serve:
+        serve(args)
+        return
+    request = {"command": "stop"} if args.stop else \
+        {"app": args.app, "phase": args.phase, "options": args.options, "log": args.log}
+    try:
+        code = send_request(args.socket, request)
+    except OSError as e:
+        logging.error("Unable to reach the server on %s: %s", args.socket, e)
+        sys.exit(1)
+    sys.exit(min(code, 255))
+
+
+if __name__ == "__main__":
+    main()
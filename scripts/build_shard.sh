@@ -0,0 +1,125 @@
+#!/bin/bash
+#
+# script to Build the Apps of a shard back to back, in a single job
+#
+# The shard is an entry of the shards matrix generated by parse_all_apps.py (`--shards`).
+# Each App is cloned and built with build_app.sh, with its execution plan (entry of the shard),
+# which writes its status and error files as in the per-App jobs. The build durations are written in `build_durations_<shard>.json`, to balance
+# the next shards.
+#
+
+exeName=$(readlink "$0")
+[[ -z ${exeName} ]] && exeName=$0
+dirName=$(dirname "$exeName")
+
+BINARIES=false
+BIN_DIR="binaries_shard"
+
+#===============================================================================
+#
+#     help - Prints script help and usage
+#
+#===============================================================================
+# shellcheck disable=SC2154  # var is referenced but not assigned
+help() {
+    local err="$1"
+
+    [[ -n "${err}" ]] && echo "${err}"
+
+    echo
+    echo "Usage: ${exeName} <options> [-- <build_app.sh options>]"
+    echo
+    echo "Options:"
+    echo
+    echo "  -f <file>   : Shard JSON file"
+    echo "  -b          : Store the Apps binaries in '${BIN_DIR}/'"
+    echo "  -h          : Displays this help"
+    echo
+    exit 1
+}
+
+#===============================================================================
+#
+#     Parsing parameters
+#
+#===============================================================================
+
+while getopts ":f:bh" opt; do
+    case ${opt} in
+        f)  SHARD_FILE=${OPTARG}  ;;
+        b)  BINARIES=true ;;
+        h)  help ;;
+
+        \?) echo "Unknown option: -${OPTARG}" >&2; exit 1;;
+        : ) echo "Missing option argument for -${OPTARG}" >&2; exit 1;;
+        * ) echo "Unimplemented option: -${OPTARG}" >&2; exit 1;;
+    esac
+done
+shift $((OPTIND - 1))
+
+#===============================================================================
+#
+#     Checking parameters
+#
+#===============================================================================
+
+[[ -z "${SHARD_FILE}" ]] && help "Error: Shard file not specified"
+[[ ! -f "${SHARD_FILE}" ]] && help "Error: Shard file '${SHARD_FILE}' not found"
+
+SHARD=$(jq -r '.shard' "${SHARD_FILE}")
+FILE_DURATIONS="build_durations_${SHARD}.json"
+
+#===============================================================================
+#
+#     Store the binaries of an App, in the same store as the per-App artifacts
+#
+#===============================================================================
+store_Binaries() {
+    local app_name="$1"
+    local plan="$2"
+    local elf apps=()
+
+    # The expected binaries are in the execution plan of the App
+    while read -r elf; do
+        if [[ -f "${elf}" ]]; then apps+=("${elf}"); fi
+    done < <(jq -r --arg app "${app_name}" '.elf_paths[] | "\($app)/\(.)"' "${plan}")
+    printf 'Found App: %s\n' "${apps[@]}"
+    # The Apps of the shard share the same objects
+    "${dirName}/ledger-app-tester" binaries -v -s "${BIN_DIR}" -a "${app_name}" "${apps[@]}"
+}
+
+#===============================================================================
+#
+#     Main
+#
+#===============================================================================
+
+# The token is sent in a header, instead of the remote URL: it is not saved in the Apps `.git/config`
+# (nor in their per-variant copies). The `-c` options also apply to the submodules.
+GIT_AUTH=()
+if [[ -n "${GH_TOKEN}" ]]; then
+    GIT_AUTH=(-c "http.https://github.com/.extraheader=AUTHORIZATION: basic $(printf 'x-access-token:%s' "${GH_TOKEN}" | base64 -w0)")
+fi
+
+DURATIONS="{}"
+while read -r APP_NAME; do
+    echo "================ Shard ${SHARD}: ${APP_NAME} ================"
+    START=${SECONDS}
+    PLAN="plan_${APP_NAME}.json"
+    jq -c --arg app "${APP_NAME}" '.apps[] | select(.repo_name == $app)' "${SHARD_FILE}" > "${PLAN}"
+    # The commands must not read the shard list from stdin
+    if git "${GIT_AUTH[@]}" clone -q --recurse-submodules "https://github.com/LedgerHQ/${APP_NAME}.git" < /dev/null; then
+        "${dirName}/build_app.sh" -a "${APP_NAME}" -P "${PLAN}" "$@" < /dev/null
+        [[ ${BINARIES} == true ]] && store_Binaries "${APP_NAME}" "${PLAN}"
+    else
+        # Same status as a skipped build in the per-App jobs
+        echo -n "|:construction:" >> "build_status_${APP_NAME}.md"
+        echo -e -n "\t• ${APP_NAME}: All" >> "build_errors_${APP_NAME}.md"
+        echo "{\"app\":\"${APP_NAME}\",\"phase\":\"build\",\"target\":null,\"variant\":null,\"result\":\"error\"}" \
+            >> "build_results_${APP_NAME}.jsonl"
+    fi
+    DURATIONS=$(jq -c --arg app "${APP_NAME}" --argjson s $((SECONDS - START)) '. + {($app): $s}' <<< "${DURATIONS}")
+done < <(jq -r '.apps[].repo_name' "${SHARD_FILE}")
+
+echo "${DURATIONS}" > "${FILE_DURATIONS}"
+exit 0
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Status bundles: the status, errors, results, timing, build cache and status state files of the Apps,
+packed in a single compressed zip archive, instead of one artifact per file kind and App.
+
+The entries are stored as `<phase>_<kind>/<file name>`. The central directory of the zip is the index
+of the bundle: it is the only part read when the bundle is opened, then each entry is read in place (random access
+to its offset, and decompressed while read), without extracting the bundle.
+"""
+
+import io
+import os
+import re
+import sys
+import shutil
+import logging
+import zipfile
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+from argparse import ArgumentParser, Namespace
+from utils import logging_init, logging_set_level
+
+# Files of the Apps written by the jobs: `<phase>_<kind>_<app>.<ext>`
+FILE_NAME = re.compile(r"^(build|test|check)_(status|errors|results|timing|cache|state)_(.+)\.(md|jsonl|json)$")
+
+# Size of the chunks streamed while merging bundles
+CHUNK_SIZE = 64 * 1024
+
+
+def entry_name(filename: str) -> Optional[str]:
+    """Get the entry name of an App file in a bundle, None if the file is not an App status file"""
+
+    match = FILE_NAME.match(os.path.basename(filename))
+    if not match:
+        return None
+    return f"{match.group(1)}_{match.group(2)}/{match.group(0)}"
+
+
+def match_kind(entry: str, kind: str) -> bool:
+    """Check if an entry is of a kind: either `<phase>_<kind>` (like `build_status`), or `<kind>` for all the phases"""
+
+    directory = entry.split("/")[0]
+    return directory == kind or directory.endswith(f"_{kind}")
+
+
+def is_bundle(path: str) -> bool:
+    """Check if a path is a bundle"""
+
+    return os.path.isfile(path) and zipfile.is_zipfile(path)
+
+
+class Bundle:
+    """Read access to the entries of a bundle"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+
+    def __enter__(self) -> "Bundle":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the bundle"""
+
+        self._zip.close()
+
+    def entries(self, kind: Optional[str] = None) -> List[str]:
+        """Get the entries of the bundle, of a kind if any, sorted by name"""
+
+        return sorted(name for name in self._zip.namelist() if kind is None or match_kind(name, kind))
+
+    def infos(self) -> List[zipfile.ZipInfo]:
+        """Get the index of the bundle"""
+
+        return self._zip.infolist()
+
+    def open(self, entry: str) -> IO[str]:
+        """Open an entry of the bundle, as a text file"""
+
+        return io.TextIOWrapper(self._zip.open(entry), encoding="utf-8")
+
+    def open_binary(self, entry: str) -> IO[bytes]:
+        """Open an entry of the bundle, as a binary file"""
+
+        return self._zip.open(entry)
+
+
+def input_files(path: str, kind: str) -> Iterator[Tuple[str, IO[str]]]:
+    """Open the App files of a kind one after the other, sorted by name.
+
+    Args:
+        path: A bundle, a directory of App files, or a single file (returned whatever its kind)
+        kind: The kind of the files, like `build_status`, or `results` for all the phases
+    Returns:
+        The name and the content of each file
+    """
+
+    if is_bundle(path):
+        with Bundle(path) as bundle:
+            for entry in bundle.entries(kind):
+                with bundle.open(entry) as f:
+                    yield os.path.basename(entry), f
+    elif os.path.isdir(path):
+        for filename in sorted(os.listdir(path)):
+            name = entry_name(filename)
+            if name is None or not match_kind(name, kind):
+                continue
+            with open(os.path.join(path, filename), encoding="utf-8") as f:
+                yield filename, f
+    elif os.path.isfile(path):
+        with open(path, encoding="utf-8") as f:
+            yield os.path.basename(path), f
+    else:
+        logging.warning("'%s' not found", path)
+
+
+def pack(output: str, paths: List[str]) -> int:
+    """Pack App files in a new bundle.
+
+    Args:
+        output: The bundle
+        paths: The App files, or directories of App files (not recursively)
+    Returns:
+        The number of packed files
+    """
+
+    files: Dict[str, str] = {}
+    for path in paths:
+        if os.path.isdir(path):
+            names = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        elif os.path.isfile(path):
+            names = [path]
+        else:
+            logging.warning("'%s' not found", path)
+            continue
+        for name in names:
+            entry = entry_name(name)
+            if entry is None or not os.path.isfile(name):
+                if not os.path.isdir(path):
+                    logging.warning("'%s' is not an App status file, skipped", name)
+                continue
+            files[entry] = name
+
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        for entry, name in sorted(files.items()):
+            bundle.write(name, entry)
+    logging.info("%d file(s) packed in %s", len(files), output)
+    return len(files)
+
+
+def merge(output: str, paths: List[str]) -> int:
+    """Merge bundles in a new one, streaming their entries.
+    As when the artifacts are downloaded in a same directory, an entry of a bundle replaces the one of
+    the previous bundles (like the status of a re-run job).
+
+    Args:
+        output: The merged bundle (can be one of the bundles)
+        paths: The bundles to merge
+    Returns:
+        The number of entries in the merged bundle
+    """
+
+    bundles = []
+    for path in paths:
+        if is_bundle(path):
+            bundles.append(Bundle(path))
+        else:
+            logging.warning("'%s' is not a bundle, skipped", path)
+    try:
+        # Only the indexes are read to find the entry kept from each bundle, then the entries are streamed
+        owners = {info.filename: index for index, bundle in enumerate(bundles) for info in bundle.infos()}
+        tmp = f"{output}.tmp"
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as out:
+            for index, bundle in enumerate(bundles):
+                for info in bundle.infos():
+                    if owners[info.filename] != index:
+                        continue
+                    entry = zipfile.ZipInfo(info.filename, info.date_time)
+                    entry.compress_type = zipfile.ZIP_DEFLATED
+                    with bundle.open_binary(info.filename) as fin, out.open(entry, "w") as fout:
+                        shutil.copyfileobj(fin, fout, CHUNK_SIZE)
+    finally:
+        for bundle in bundles:
+            bundle.close()
+    os.replace(tmp, output)
+    logging.info("%d bundle(s) merged in %s, with %d entries", len(bundles), output, len(owners))
+    return len(owners)
+
+
+# ===============================================================================
+#          Parse command line options
+# ===============================================================================
+def arg_parse() -> Namespace:
+    """Parse the commandline options"""
+
+    parser = ArgumentParser(description="Pack the status files of the Apps in a bundle, or merge bundles")
+    parser.add_argument("inputs",
+                        nargs="*",
+                        help="Status files or directories to pack, bundles to merge, or the bundle to list.")
+    parser.add_argument("-o",
+                        "--output",
+                        type=str,
+                        help="Output bundle.")
+    parser.add_argument("-m",
+                        "--merge",
+                        action="store_true",
+                        help="Merge bundles, the entries of the last ones replacing the ones of the first ones.")
+    parser.add_argument("-l",
+                        "--list",
+                        action="store_true",
+                        help="List the entries of the bundles.")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase verbosity.")
+
+    args = parser.parse_args()
+    if not args.list and not args.output:
+        parser.error("An output bundle must be specified.")
+    return args
+
+
+# ===============================================================================
+#          MAIN
+# ===============================================================================
+def main() -> None:
+    """Main function"""
+
+    logging_init()
+    args = arg_parse()
+    logging_set_level(args.verbose)
+
+    if args.list:
+        for path in args.inputs:
+            with Bundle(path) as bundle:
+                for info in bundle.infos():
+                    print(f"{info.file_size:>10} {info.compress_size:>10}  {info.filename}")
+    elif args.merge:
+        if not merge(args.output, args.inputs):
+            logging.error("No bundle entry found")
+            sys.exit(1)
+    else:
+        pack(args.output, args.inputs or ["."])
+
+
+if __name__ == "__main__":
+    main()
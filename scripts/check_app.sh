@@ -64,6 +64,48 @@ done
 
 FILE_STATUS="check_status_${APP_DIR}.md"
 FILE_ERROR="check_errors_${APP_DIR}.md"
+FILE_TIMING="check_timing_${APP_DIR}.jsonl"
+FILE_RESULTS="check_results_${APP_DIR}.jsonl"
+APP_TIMING="${APP_DIR}"
+
+# Columns of the check status, like CHECK_STEPS in summary.py
+CHECK_STEPS=(manifest icons app_load_params makefile readme scan)
+
+#===============================================================================
+#
+#     Timing record of a phase, next to the status file (see add_timing in utils.py)
+#
+#===============================================================================
+add_Timing() {
+    local phase="$1"
+    local device="$2"
+    local start="$3"
+    local seconds
+
+    seconds=$(awk -v s="${start}" -v e="${EPOCHREALTIME}" 'BEGIN {printf "%.3f", e - s}')
+    printf '{"app": "%s", "device": %s, "variant": null, "phase": "%s", "seconds": %s}\n' \
+        "${APP_TIMING}" "$( [[ -n "${device}" ]] && echo "\"${device}\"" || echo null)" "${phase}" "${seconds}" >> "${FILE_TIMING}"
+}
+
+#===============================================================================
+#
+#     Results records of the check steps, from the status tokens (see results.py)
+#
+#===============================================================================
+add_Results() {
+    local status="$1"
+    local -A results=([":white_check_mark:"]=pass [":x:"]=fail [":construction:"]=error [":warning:"]=skip [":black_circle:"]=none)
+    local tokens target i
+
+    IFS='|' read -r -a tokens <<< "${status#|}"
+    for i in "${!tokens[@]}"; do
+        # A single result concerns the whole App
+        target=null
+        [[ ${#tokens[@]} -gt 1 ]] && target="\"${CHECK_STEPS[i]}\""
+        printf '{"app":"%s","phase":"check","target":%s,"variant":null,"result":"%s"}\n' \
+            "${APP_DIR}" "${target}" "${results[${tokens[i]}]:-error}" >> "${FILE_RESULTS}"
+    done
+}
 
 #===============================================================================
 #
@@ -85,9 +127,11 @@ else
 fi
 [[ "${VERBOSE}" == "true" ]] && echo "Selected SDK: ${SDK_PATH}"
 # Check
+START=${EPOCHREALTIME}
 # shellcheck disable=SC2068
 (cd "${APP_DIR}" && BOLOS_SDK="${SDK_PATH}" /opt/enforcer.sh ${ARGS[@]})
 ERR=$?
+add_Timing check "${TARGET}" "${START}"
 
 if [[ ${ERR} -ne 0 ]]; then
     echo -e "\t• ${APP_DIR}" > "${FILE_ERROR}"
@@ -100,5 +144,6 @@ elif [[ ${ERR} -ne 0 ]]; then
 else
     echo -n "|:white_check_mark:" > "${FILE_STATUS}"
 fi
+add_Results "$(head -n 1 "${FILE_STATUS}")"
 
 exit "${ERR}"
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Single entry point of the tools: `ledger-app-tester <command> [options]`.
+The module of a command is only imported when it runs, so that the heavy dependencies
+(PyGithub, ledgered) are only loaded by the commands needing them.
+"""
+
+import sys
+import importlib
+from argparse import ArgumentParser, RawDescriptionHelpFormatter, REMAINDER
+
+PROG = "ledger-app-tester"
+
+# Command name -> (module, description)
+COMMANDS = {
+    "parse-apps": ("parse_all_apps", "Get the list of Apps and their configuration"),
+    "artifacts": ("get_artifacts", "Check the artifacts of a workflow run"),
+    "summary": ("summary", "Generate the summary report"),
+    "slack": ("slack_message", "Generate the Slack message"),
+    "bundle": ("bundle", "Pack the status files in a bundle, or merge bundles"),
+    "state": ("status_state", "Fold the results of a job in a status state, or merge states"),
+    "binaries": ("binaries", "Store the Apps binaries, or restore them"),
+    "build-server": ("build_server", "Run the local build server, or send it a request"),
+}
+
+
+def main() -> None:
+    """Main function"""
+
+    commands = "\n".join(f"  {name:<12} {desc}" for name, (_, desc) in COMMANDS.items())
+    parser = ArgumentParser(prog=PROG,
+                            description="Ledger Apps tester tools",
+                            epilog=f"commands:\n{commands}\n\nRun '{PROG} <command> -h' for the command options.",
+                            formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=COMMANDS, metavar="<command>", help="Command to run.")
+    parser.add_argument("args", nargs=REMAINDER, help="Command options.")
+    args = parser.parse_args()
+
+    # The command parses its own options, as when run as a script
+    module, _ = COMMANDS[args.command]
+    sys.argv = [f"{PROG} {args.command}", *args.args]
+    importlib.import_module(module).main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Compiler cache of the C builds, with `ccache`: the objects compiled with the same preprocessed source,
+compiler and flags are reused, between the devices, variants and Apps of a job, and between the runs.
+"""
+
+import os
+import shutil
+import logging
+import subprocess
+from typing import Dict, List, Optional
+
+# Default max size of the cache
+MAX_SIZE = "2G"
+# Counters of the stats log which are hits
+HIT_COUNTERS = ["direct_cache_hit", "preprocessed_cache_hit"]
+# Counter of the stats log which is a miss
+MISS_COUNTER = "cache_miss"
+
+
+class CompilerCache:
+    """Compiler cache, shared by the C builds using the same directory.
+
+    The compiler is wrapped with `ccache` by the `CC` make variable, keyed on the preprocessed source
+    (no direct mode), the compiler content and the flags. The absolute paths are rewritten relative to the
+    build directory, and the working directory is not hashed: the isolated App trees and the SDK worktrees
+    share their objects.
+
+    The counters of the cache directory are global, and mixed between the concurrent builds of several Apps
+    (like the workers of the build server): the hits and misses of an App are read from its own stats log
+    (`CCACHE_STATSLOG`), where ccache appends the result of each compilation.
+    """
+
+    def __init__(self, directory: str, stats_log: str, max_size: str = MAX_SIZE):
+        self.root = os.path.abspath(directory)
+        self.stats_log = os.path.abspath(stats_log)
+        self.max_size = max_size
+        self.ccache = shutil.which("ccache")
+        if self.ccache is None:
+            logging.warning("ccache not found: compiler cache disabled")
+        else:
+            os.makedirs(self.root, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        """The compiler cache can be used"""
+        return self.ccache is not None
+
+    def env(self) -> Dict[str, str]:
+        """Get the environment variables of the cached builds"""
+
+        return {
+            "CCACHE_DIR": self.root,
+            "CCACHE_MAXSIZE": self.max_size,
+            "CCACHE_NODIRECT": "1",
+            "CCACHE_COMPILERCHECK": "content",
+            # The trees are at the same relative locations in all the runs
+            "CCACHE_BASEDIR": "/",
+            "CCACHE_NOHASHDIR": "1",
+            "CCACHE_STATSLOG": self.stats_log,
+        }
+
+    def make_args(self) -> List[str]:
+        """Get the make variables of the cached builds, the compiler of the SDK being wrapped"""
+
+        if not self.enabled:
+            return []
+        return [f"CC={self.ccache} {os.environ.get('CLANGPATH', '')}clang"]
+
+    def _run(self, *cmd: str) -> subprocess.CompletedProcess:
+        return subprocess.run([str(self.ccache), *cmd], env={**os.environ, **self.env()}, check=False,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    def zero_stats(self) -> None:
+        """Reset the stats log of the builds"""
+
+        if self.enabled:
+            with open(self.stats_log, "w", encoding="utf-8"):
+                pass
+
+    def stats(self) -> Optional[Dict[str, int]]:
+        """Get the counters of the builds, since the last reset of the stats log.
+
+        Returns:
+            The hits and misses, and an estimation of the bytes reused (hits x average size of the cached results),
+            or None if they are not available
+        """
+
+        if not self.enabled:
+            return None
+        # One `# <source>` line per compilation, followed by the names of its counters
+        hits = misses = 0
+        try:
+            with open(self.stats_log, encoding="utf-8") as f:
+                for line in f:
+                    name = line.strip()
+                    if name in HIT_COUNTERS:
+                        hits += 1
+                    elif name == MISS_COUNTER:
+                        misses += 1
+        except OSError as e:
+            logging.warning("Unable to get the compiler cache statistics: %s", e)
+            return None
+        # The average size of the cached results is a property of the whole cache
+        res = self._run("--print-stats")
+        counters: Dict[str, int] = {}
+        for line in res.stdout.splitlines() if res.returncode == 0 else []:
+            name, _, value = line.partition("\t")
+            if value.strip().isdigit():
+                counters[name] = int(value)
+        files = counters.get("files_in_cache", 0)
+        size = counters.get("cache_size_kibibyte", 0) * 1024
+        return {"hits": hits, "misses": misses, "bytes": hits * size // files if files else 0}
+
+    @staticmethod
+    def report(stats: Dict[str, int]) -> str:
+        """Get a one line report of the counters"""
+
+        total = stats["hits"] + stats["misses"]
+        rate = 100 * stats["hits"] / total if total else 0.0
+        return (f"{stats['hits']} hit(s), {stats['misses']} miss(es) ({rate:.0f}% hit rate), "
+                f"{stats['bytes'] / (1024 * 1024):.1f} MB reused")
@@ -0,0 +1,109 @@
+"""
+Dependency graph of the Apps, from the `dependencies` of `test_info.json`.
+
+A dependent App is tested with the binaries of its dependencies (see `binaries.py`):
+the dependencies must be selected and built along with it, once for all their dependents.
+"""
+
+from typing import Dict, Iterable, List, Optional, Set
+from utils import load_input_file
+
+
+class DependencyGraph:
+    """Graph of the dependencies between the Apps"""
+
+    def __init__(self, dependencies: Dict[str, List[str]]):
+        self.dependencies = dependencies
+
+    @classmethod
+    def from_test_info(cls, data: Optional[List[dict]] = None) -> "DependencyGraph":
+        """Build the graph from the content of `test_info.json` (read from the input files by default)"""
+
+        if data is None:
+            data = load_input_file("test_info.json")
+        return cls({info["name"]: info.get("dependencies", "").split() for info in data if info.get("dependencies")})
+
+    def closure(self, apps: Iterable[str]) -> Set[str]:
+        """Get the Apps, and all their dependencies (transitively)"""
+
+        result: Set[str] = set()
+        pending = list(apps)
+        while pending:
+            app = pending.pop()
+            if app not in result:
+                result.add(app)
+                pending.extend(self.dependencies.get(app, []))
+        return result
+
+    def missing(self, apps: Iterable[str]) -> Dict[str, List[str]]:
+        """Get the dependencies of the Apps which are not part of them, per App"""
+
+        selected = set(apps)
+        missing = {}
+        for app in sorted(selected):
+            deps = [dep for dep in self.dependencies.get(app, []) if dep not in selected]
+            if deps:
+                missing[app] = deps
+        return missing
+
+    def cycles(self) -> List[List[str]]:
+        """Get the dependency cycles, each one as the list of its Apps (the 1st one being repeated at the end)"""
+
+        cycles: List[List[str]] = []
+        # Depth first search, with the Apps of the current path, and the ones fully explored
+        done: Set[str] = set()
+        path: List[str] = []
+
+        def visit(app: str) -> None:
+            if app in path:
+                cycles.append(path[path.index(app):] + [app])
+                return
+            if app in done:
+                return
+            path.append(app)
+            for dep in self.dependencies.get(app, []):
+                visit(dep)
+            path.pop()
+            done.add(app)
+
+        for app in sorted(self.dependencies):
+            visit(app)
+        return cycles
+
+    def stages(self, apps: Iterable[str]) -> List[List[str]]:
+        """Order the Apps in stages, each App coming after all its dependencies (topological order).
+        The dependencies which are not part of the Apps are ignored.
+
+        Args:
+            apps: The Apps
+        Returns:
+            The stages, each one with its Apps sorted by name: the 1st one without dependency,
+            the next ones depending only on the Apps of the previous stages
+        Raises:
+            ValueError: If the Apps dependencies have a cycle
+        """
+
+        # Nb of (selected) dependencies of each App not staged yet, and the dependents of each App
+        selected = set(apps)
+        remaining = {app: len(set(self.dependencies.get(app, [])) & selected) for app in selected}
+        dependents: Dict[str, List[str]] = {app: [] for app in selected}
+        for app in selected:
+            for dep in set(self.dependencies.get(app, [])) & selected:
+                dependents[dep].append(app)
+
+        stages: List[List[str]] = []
+        ready = sorted(app for app, nb in remaining.items() if nb == 0)
+        while ready:
+            stages.append(ready)
+            next_ready = []
+            for app in ready:
+                for dependent in dependents[app]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        next_ready.append(dependent)
+            ready = sorted(next_ready)
+
+        if sum(len(stage) for stage in stages) != len(selected):
+            blocked = sorted(app for app, nb in remaining.items() if nb > 0)
+            raise ValueError(f"Apps blocked by a dependency cycle: {', '.join(blocked)}")
+        return stages
@@ -5,11 +5,13 @@
 Tool to list and retrieve artifacts.
 """
 
+import fnmatch
 import logging
 import os
+import re
 import sys
+from typing import List
 from argparse import ArgumentParser, Namespace
-from github import Github
 from utils import logging_init, logging_set_level, set_gh_output
 
 
@@ -19,13 +21,14 @@ from utils import logging_init, logging_set_level, set_gh_output
 def arg_parse() -> Namespace:
     """Parse the commandline options"""
 
-    parser = ArgumentParser("Selects applications and dump relevant workflow data from their "
-                            "manifests as a JSON")
+    parser = ArgumentParser("Search the artifacts of the workflow run matching one or several patterns")
     parser.add_argument("-p",
                         "--pattern",
                         required=True,
+                        action="append",
                         type=str,
-                        help="Artifact pattern to search.")
+                        help="Artifact pattern to search (glob, or regex with `--regex`). "
+                        "Can be repeated, each one being paired with its own `--exist`/`--result`.")
     parser.add_argument("-s",
                         "--substr",
                         required=False,
@@ -34,17 +37,73 @@ def arg_parse() -> Namespace:
     parser.add_argument("-e",
                         "--exist",
                         required=False,
+                        action="append",
                         type=str,
                         help="Environment variable name for existing pattern.")
     parser.add_argument("-r",
                         "--result",
                         required=False,
+                        action="append",
                         type=str,
                         help="Environment variable name for results.")
+    parser.add_argument("-x",
+                        "--regex",
+                        action="store_true",
+                        help="Patterns are regular expressions instead of glob patterns.")
 
     parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase verbosity.")
 
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    # Each pattern must have its own output variables
+    for name in ("exist", "result"):
+        values = getattr(args, name)
+        if values is None:
+            setattr(args, name, [None] * len(args.pattern))
+        elif len(values) != len(args.pattern):
+            parser.error(f"--{name} must be given once per --pattern.")
+
+    return args
+
+
+# ===============================================================================
+#          Artifacts listing
+# ===============================================================================
+def list_artifacts(run_id: int) -> List[str]:
+    """Get the names of the workflow run artifacts.
+
+    Args:
+        run_id: The workflow run ID
+    Returns:
+        The artifacts names
+    """
+
+    logging.info("Fetching artifacts from GitHub")
+    # PyGithub is only imported when the artifacts are listed
+    from gh_client import github_client, get_workflow_run, report_api_usage  # pylint: disable=import-outside-toplevel
+    gh = github_client()
+    workflow_run = get_workflow_run(gh, run_id)
+    artifacts = [a.name for a in workflow_run.get_artifacts()]
+    report_api_usage("get_artifacts")
+    return artifacts
+
+
+def match_artifacts(artifacts: List[str], pattern: str, regex: bool = False) -> List[str]:
+    """Select the artifacts matching a pattern.
+
+    Args:
+        artifacts: The artifacts names
+        pattern: Glob pattern or regular expression, matching the full name
+        regex: The pattern is a regular expression
+    Returns:
+        The matching artifacts names
+    """
+
+    if regex:
+        expr = re.compile(pattern)
+    else:
+        expr = re.compile(fnmatch.translate(pattern))
+    return [a for a in artifacts if expr.fullmatch(a)]
 
 
 # ===============================================================================
@@ -64,7 +123,6 @@ def main() -> None:
     logging_set_level(args.verbose)
 
     # GitHub environment variables
-    github_token = os.environ.get("GH_TOKEN")
     workflow_run_id = os.environ.get("GH_RUN_ID")
     if workflow_run_id is None:
         logging.error("'GH_RUN_ID' environment variable is not set")
@@ -72,29 +130,24 @@ def main() -> None:
 
     # Processing
     # ----------
-    logging.info("Fetching artifacts from GitHub")
-    gh = Github(github_token) if github_token else Github()
-
-    repo = gh.get_repo("LedgerHQ/ledger-app-tester")
-    workflow_run = repo.get_workflow_run(int(workflow_run_id))
-    artifacts = workflow_run.get_artifacts()
+    artifacts = list_artifacts(int(workflow_run_id))
 
-    artifact_list = [a.name for a in artifacts if args.pattern in a.name]
-    if args.substr:
-        artifact_list = [a.replace(args.substr, "") for a in artifact_list]
+    for pattern, exist, result in zip(args.pattern, args.exist, args.result):
+        artifact_list = match_artifacts(artifacts, pattern, args.regex)
+        if args.substr:
+            artifact_list = [a.replace(args.substr, "") for a in artifact_list]
 
-    if len(artifact_list) == 0:
-        logging.warning("Artifact '%s' NOT found", args.pattern)
-        sys.exit(0)
+        if exist:
+            set_gh_output(exist, f"{len(artifact_list) > 0}")
 
-    if args.result:
-        set_gh_output(args.result, f"{artifact_list}")
-    else:
-        print(f"Found {len(artifact_list)} artifact(s):\n{artifact_list}")
+        if len(artifact_list) == 0:
+            logging.warning("Artifact '%s' NOT found", pattern)
+            continue
 
-    if args.exist:
-        res: bool = len(artifact_list) > 0
-        set_gh_output(args.exist, f"{res}")
+        if result:
+            set_gh_output(result, f"{artifact_list}")
+        else:
+            print(f"Found {len(artifact_list)} artifact(s) for '{pattern}':\n{artifact_list}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,278 @@
+"""
+GitHub client shared by the scripts.
+
+Once this module is imported, all the PyGithub clients of the process (the connection classes of PyGithub
+are replaced once, globally), send their requests through a single keep-alive session, which also:
+ - revalidates the already fetched resources with conditional requests (ETag, on the last 1024 responses,
+   except the streamed ones),
+ - waits for the rate limit reset when the remaining budget is exhausted,
+ - counts the requests, bytes and latency, to report the API usage of the script (and its profile, if any).
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+import requests
+from requests.structures import CaseInsensitiveDict
+from github import Github
+from github.Requester import Requester, HTTPRequestsConnectionClass, HTTPSRequestsConnectionClass
+from utils import set_gh_summary, profile_http_call
+
+# GitHub API URL, can be overridden to use a local fake API
+API_URL = os.environ.get("GH_API_URL", "https://api.github.com")
+# Repository running the workflows
+TESTER_REPO = "LedgerHQ/ledger-app-tester"
+# Max number of pooled connections
+POOL_SIZE = 16
+# Remaining requests below which we wait for the rate limit reset
+RATE_LIMIT_MARGIN = 5
+# Max waiting time for the rate limit reset (in seconds)
+RATE_LIMIT_MAX_WAIT = 900
+# Max number of responses kept to be revalidated
+ETAG_CACHE_SIZE = 1024
+
+
+class ApiStats:
+    """Accounting of the GitHub API requests"""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.revalidated = 0
+        self.bytes = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.rate_remaining: Optional[int] = None
+        self.rate_limit: Optional[int] = None
+        self.rate_reset = 0
+        self._lock = threading.Lock()
+
+    def add(self, response: requests.Response, latency: float, stream: bool) -> None:
+        """Account a response"""
+
+        # Don't consume a streamed content
+        size = int(response.headers.get("Content-Length", 0)) if stream else len(response.content)
+        with self._lock:
+            self.requests += 1
+            if response.status_code == 304:
+                self.revalidated += 1
+            self.bytes += size
+            self.latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            if "X-RateLimit-Remaining" in response.headers:
+                self.rate_remaining = int(response.headers["X-RateLimit-Remaining"])
+                self.rate_limit = int(response.headers.get("X-RateLimit-Limit", 0))
+                self.rate_reset = int(response.headers.get("X-RateLimit-Reset", 0))
+
+    def report(self) -> str:
+        """Get a one line report of the API usage"""
+
+        avg = self.latency / self.requests if self.requests else 0.0
+        line = (f"{self.requests} request(s) ({self.revalidated} not modified), "
+                f"{self.bytes / 1024:.1f} KB, latency avg {avg * 1000:.0f} ms / max {self.max_latency * 1000:.0f} ms")
+        if self.rate_remaining is not None:
+            line += f", rate limit {self.rate_remaining}/{self.rate_limit} remaining"
+        return line
+
+
+stats = ApiStats()
+
+
+class GitHubAdapter(requests.adapters.HTTPAdapter):
+    """HTTP adapter adding the conditional requests, the rate limit backoff, and the accounting"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # Last responses (ETag, status, headers, content, encoding) per URL, the least recently used first
+        self._etags: "OrderedDict[str, Tuple[str, int, dict, bytes, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _wait_rate_limit(self) -> None:
+        """Wait for the rate limit reset if the remaining budget is exhausted"""
+
+        if stats.rate_remaining is None or stats.rate_remaining > RATE_LIMIT_MARGIN:
+            return
+        delay = stats.rate_reset - time.time() + 1
+        if delay > 0:
+            delay = min(delay, RATE_LIMIT_MAX_WAIT)
+            logging.warning("GitHub rate limit nearly exhausted (%d remaining), waiting %.0fs",
+                            stats.rate_remaining, delay)
+            time.sleep(delay)
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False,  # type: ignore[override]
+             **kwargs) -> requests.Response:
+        self._wait_rate_limit()
+
+        url = request.url or ""
+        cached = None
+        if request.method == "GET" and not stream:
+            with self._lock:
+                cached = self._etags.get(url)
+                if cached:
+                    self._etags.move_to_end(url)
+            if cached and "If-None-Match" not in request.headers:
+                request.headers["If-None-Match"] = cached[0]
+            else:
+                cached = None
+
+        start = time.perf_counter()
+        response = super().send(request, stream=stream, **kwargs)
+        stats.add(response, time.perf_counter() - start, stream)
+        profile_http_call()
+
+        if cached and response.status_code == 304:
+            # Not modified: serve the previous response
+            response = self._rebuild(request, cached)
+        elif request.method == "GET" and not stream and response.status_code == 200 and "ETag" in response.headers:
+            entry = (response.headers["ETag"], response.status_code, dict(response.headers), response.content,
+                     response.encoding)
+            with self._lock:
+                self._etags[url] = entry
+                self._etags.move_to_end(url)
+                while len(self._etags) > ETAG_CACHE_SIZE:
+                    self._etags.popitem(last=False)
+        return response
+
+    @staticmethod
+    def _rebuild(request: requests.PreparedRequest,
+                 cached: Tuple[str, int, dict, bytes, Optional[str]]) -> requests.Response:
+        """Build a response from a previous one"""
+
+        _, status, headers, content, encoding = cached
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = content  # pylint: disable=protected-access
+        response.encoding = encoding
+        response.url = request.url or ""
+        response.request = request
+        return response
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session(retry: Any, pool_size: Optional[int]) -> requests.Session:
+    """Get the session shared by all the connections"""
+
+    global _session
+    with _session_lock:
+        if _session is None:
+            size = pool_size or POOL_SIZE
+            adapter = GitHubAdapter(max_retries=retry, pool_connections=size, pool_maxsize=size)
+            _session = requests.Session()
+            # Disable the fallback on the .netrc file, as done by PyGithub
+            _session.auth = Requester.noopAuth
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _thread_attribute(name: str) -> property:
+    return property(lambda self: getattr(self._pending, name),
+                    lambda self, value: setattr(self._pending, name, value))
+
+
+class _PerThreadRequest:
+    """Pending request of a connection, kept per thread.
+
+    A PyGithub client keeps a single connection, which stores the request (`request()`)
+    until its response is read (`getresponse()`): the workers sharing the client would send
+    the requests of each other. The session and its pool of connections are thread-safe.
+    """
+
+    _pending: threading.local
+    verb = _thread_attribute("verb")
+    url = _thread_attribute("url")
+    input = _thread_attribute("input")
+    headers = _thread_attribute("headers")
+    stream = _thread_attribute("stream")
+
+
+class _HTTPSConnection(_PerThreadRequest, HTTPSRequestsConnectionClass):
+    """PyGithub connection using the shared session"""
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, host: str, port: Optional[int] = None, strict: bool = False, timeout: Optional[int] = None,
+                 retry: Any = None, pool_size: Optional[int] = None, **kwargs: Any) -> None:
+        self._pending = threading.local()
+        self.port = port if port else 443
+        self.host = host
+        self.protocol = "https"
+        self.timeout = timeout
+        self.verify = kwargs.get("verify", True)
+        self.session = _get_session(retry, pool_size)
+
+    def close(self) -> None:
+        # The shared session is kept alive
+        pass
+
+
+class _HTTPConnection(_PerThreadRequest, HTTPRequestsConnectionClass):
+    """PyGithub connection using the shared session, used with a local fake API"""
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, host: str, port: Optional[int] = None, strict: bool = False, timeout: Optional[int] = None,
+                 retry: Any = None, pool_size: Optional[int] = None, **kwargs: Any) -> None:
+        self._pending = threading.local()
+        self.port = port if port else 80
+        self.host = host
+        self.protocol = "http"
+        self.timeout = timeout
+        self.verify = kwargs.get("verify", True)
+        self.session = _get_session(retry, pool_size)
+
+    def close(self) -> None:
+        # The shared session is kept alive
+        pass
+
+
+# All the PyGithub clients of the process (also the ones not created by `github_client`)
+# use the shared session from now on
+Requester.injectConnectionClasses(_HTTPConnection, _HTTPSConnection)
+
+
+def github_client(cls: type = Github, **kwargs) -> Any:
+    """Create a GitHub client using the shared session.
+
+    Args:
+        cls: Client class (Github or a subclass, like GitHubLedgerHQ)
+        kwargs: Additional client parameters
+    Returns:
+        The client, authenticated with the `GH_TOKEN` env variable if set
+    """
+
+    kwargs.setdefault("pool_size", POOL_SIZE)
+    kwargs.setdefault("per_page", 100)
+    token = os.environ.get("GH_TOKEN")
+    return cls(token, base_url=API_URL, **kwargs)
+
+
+def get_workflow_run(gh: Github, run_id: int) -> Any:
+    """Get a workflow run of the tester repository, without fetching the repository itself.
+
+    Args:
+        gh: GitHub client
+        run_id: The workflow run ID
+    Returns:
+        The workflow run
+    """
+
+    return gh.get_repo(TESTER_REPO, lazy=True).get_workflow_run(run_id)
+
+
+def report_api_usage(name: str, summary: bool = False) -> None:
+    """Report the API usage of the script.
+
+    Args:
+        name: Name of the script
+        summary: Also write the report in the step summary
+    """
+
+    report = stats.report()
+    logging.info("GitHub API usage for %s: %s", name, report)
+    if summary:
+        set_gh_summary(f":satellite: GitHub API usage for {name}: {report}\n<br>")
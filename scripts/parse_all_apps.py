@@ -7,18 +7,37 @@ relevant workflow data from their manifests as a JSON file.
 """
 
 import os
+import sys
 import json
+import heapq
 import logging
-from typing import List, Optional
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 from argparse import ArgumentParser, Namespace
 from dataclasses import asdict, dataclass, field
-from ledgered.github import AppRepository, Condition, GitHubLedgerHQ
-from utils import logging_init, logging_set_level, set_gh_output, get_full_devices
+from apps_cache import AppsCache
+from dependencies import DependencyGraph
+from sdk_resolver import resolve_refs
+from utils import logging_init, logging_set_level, set_gh_output, set_gh_summary, get_full_devices, get_test_info, \
+    add_profile_option, profile_start, profile_span, profile_stop
+
+# PyGithub and ledgered are only imported when the applications are resolved, not by `-h`
+if TYPE_CHECKING:
+    from ledgered.github import AppRepository, GitHubLedgerHQ
+    from ledgered.manifest import Manifest
 
 
-devices = get_full_devices()
 sdks = ["C", "Rust"]
 
+# Estimated durations (in seconds) of the Apps without history, used to balance the shards:
+# a fixed cost per App (clone, setup), and a build cost per device depending on the SDK
+APP_COST = 30
+DEVICE_COST = {"c": 60, "rust": 240}
+
+# Repository of the C SDK, with the `api_levels.json` used to select the SDK reference of each device (scan mode)
+SDK_REPO = "LedgerHQ/ledger-secure-sdk"
+
 
 @dataclass
 class AppInfo:
@@ -30,18 +49,107 @@ class AppInfo:
     build_directory: str
     variant_param: Optional[str] = None
     variants_values: List[str] = field(default_factory=list)
+    elf_name: Optional[str] = None
+    test_dir: Optional[str] = None
 
-    def __init__(self, app: AppRepository, filtered_devices: set[str]):
-        self.build_directory = str(app.manifest.app.build_directory)
-        if self.build_directory[-1] == ".":
-            self.build_directory += "/"
-        else:
-            self.build_directory = f"./{self.build_directory}/"
+    def __init__(self, app: "AppRepository", filtered_devices: set[str]):
+        self.build_directory = build_directory_path(str(app.manifest.app.build_directory))
         self.devices = sorted(list(set(app.manifest.app.devices) & set(filtered_devices)))
         self.repo_name = app.name
         self.sdk = app.manifest.app.sdk
         self.variant_param = app.variant_param
         self.variants_values = app.variants
+        self.elf_name = get_elf_name(app)
+        self.test_dir = get_test_dir(app.manifest)
+
+
+def build_directory_path(build_directory: str) -> str:
+    """Get the build directory of the manifest as a relative path, ending with `/` (like `./` or `./app/`)"""
+
+    if build_directory[-1] == ".":
+        return f"{build_directory}/"
+    return f"./{build_directory}/"
+
+
+def get_elf_name(app: "AppRepository") -> str:
+    """Get the name of the App binary: the package name of a Rust App (in its Cargo.toml), `app.elf` for a C App"""
+
+    # pylint: disable=import-outside-toplevel
+    import tomli
+    from github import GithubException
+    if not app.manifest.app.is_rust:
+        return "app.elf"
+    try:
+        return tomli.loads(app.makefile)["package"]["name"]
+    except (GithubException, tomli.TOMLDecodeError, KeyError):
+        return app.name
+
+
+def get_test_dir(manifest: "Manifest") -> Optional[str]:
+    """Get the pytest directory of the App, like `ledger-manifest -otp`: the legacy `[tests]` one,
+       or the `[pytest.standalone]` one. None if the App has no pytest.
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from ledgered.manifest.tests import PyTestsConfig, TestsConfig
+    if not manifest.pytests:
+        return None
+    config = manifest.pytests[0]
+    if isinstance(config, TestsConfig):
+        return str(config.pytest_directory) if config.pytest_directory else None
+    for config in manifest.pytests:
+        if isinstance(config, PyTestsConfig) and config.key == "standalone":
+            return str(config.directory)
+    return None
+
+
+def elf_path(info: dict, target: str) -> str:
+    """Get the path of the App binary for a device, relative to the App directory"""
+
+    if info["sdk"].lower() == "rust":
+        path = os.path.join(info["build_directory"], "target", target.replace("s+", "splus"), "release",
+                            info["elf_name"] or info["repo_name"])
+    else:
+        path = os.path.join(info["build_directory"], "build", target.replace("s+", "s2"), "bin", "app.elf")
+    return os.path.normpath(path)
+
+
+def make_plan(info: dict, args: Namespace, api_levels: Callable[[], Dict[str, List[str]]]) -> dict:
+    """Complete the information of an App with its execution plan, for the selected devices.
+       All the runners need is in the plan: they don't read the manifest nor `test_info.json` again.
+
+    Args:
+        info: The App information, for all its devices
+        args: Command line arguments
+        api_levels: Getter of the content of `api_levels.json`, to select the SDK references of the devices
+    Returns:
+        The App information, with its selected devices, and per device: the SDK reference (C Apps, when the mode
+        is known) and the expected binary
+    """
+
+    plan = {**info, "devices": [d for d in info["devices"] if d in args.devices]}
+    test_info = get_test_info(info["repo_name"])
+    plan["build_flags"] = test_info.get("build_flags", "").split()
+    plan["test_flags"] = test_info.get("test_flags", "").split()
+    plan["dependencies"] = test_info.get("dependencies", "").split()
+    is_c = info["sdk"].lower() == "c"
+    plan["sdk_refs"] = resolve_refs(plan["devices"], args.mode, args.sdk_branch, api_levels) \
+        if is_c and args.mode else {}
+    plan["elf_paths"] = {d: elf_path(info, d) for d in plan["devices"]}
+    return plan
+
+
+def fetch_api_levels(gh: "GitHubLedgerHQ") -> Dict[str, List[str]]:
+    """Get the content of `api_levels.json`, from the master branch of the SDK"""
+
+    from github import GithubException  # pylint: disable=import-outside-toplevel
+    try:
+        content = gh.get_repo(SDK_REPO).get_contents("api_levels.json", ref="master")
+        assert not isinstance(content, list)
+        return json.loads(content.decoded_content)
+    except (GithubException, ValueError) as e:
+        logging.warning("Unable to read api_levels.json: %s", e)
+        return {}
 
 
 # ===============================================================================
@@ -50,6 +158,7 @@ class AppInfo:
 def arg_parse() -> Namespace:
     """Parse the commandline options"""
 
+    devices = get_full_devices()
     parser = ArgumentParser("Selects applications and dump relevant workflow data from their "
                             "manifests as a JSON")
     parser.add_argument("-d",
@@ -75,7 +184,7 @@ def arg_parse() -> Namespace:
                         default=[],
                         help="List of applications to select. "
                         "Accepts several successive values (separated with space). "
-                        "Takes precedence other `--exclude`.")
+                        "Takes precedence other `--exclude`. Their dependencies are also selected.")
     parser.add_argument("-l",
                         "--limit",
                         required=False,
@@ -100,6 +209,40 @@ def arg_parse() -> Namespace:
                         required=False,
                         type=str,
                         help="Output variable name for the Nb of Apps.")
+    parser.add_argument("--jobs",
+                        required=False,
+                        default=8,
+                        type=int,
+                        help="Number of applications resolved concurrently. Defaults to %(default)s.")
+    parser.add_argument("-c",
+                        "--cache",
+                        required=False,
+                        type=str,
+                        help="Directory of the applications cache, to only resolve the apps whose HEAD changed.")
+    parser.add_argument("-S",
+                        "--shards",
+                        required=False,
+                        default=0,
+                        type=int,
+                        help="Also pack the applications into this number of balanced shards, "
+                        "output with the `_shards` suffix (needs `--json`).")
+    parser.add_argument("-D",
+                        "--durations",
+                        required=False,
+                        type=str,
+                        help="JSON file with the durations of the previous runs (in seconds, per app name), "
+                        "used to balance the shards.")
+    parser.add_argument("-m",
+                        "--mode",
+                        required=False,
+                        type=str,
+                        choices=["build", "scan", "test"],
+                        help="Build mode, to resolve the SDK reference of the devices in the execution plan.")
+    parser.add_argument("--sdk_branch",
+                        required=False,
+                        type=str,
+                        help="SDK branch requested for the builds, if any.")
+    add_profile_option(parser)
 
     parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase verbosity.")
 
@@ -134,9 +277,226 @@ def arg_parse() -> Namespace:
         args.exclude = []
     args.exclude = [name.lower() for name in args.exclude]
 
+    if args.jobs < 1:
+        parser.error("--jobs must be a positive integer.")
+    if args.shards < 0:
+        parser.error("--shards must be a positive integer.")
+    if args.shards and not args.json:
+        parser.error("--shards requires --json.")
+
     return args
 
 
+# ===============================================================================
+#          Concurrent applications resolution
+# ===============================================================================
+def run_for_apps(func: Callable[["AppRepository"], Any],
+                 apps: List["AppRepository"],
+                 jobs: int) -> List[Tuple["AppRepository", Any, Optional[Exception]]]:
+    """Run a function on each application, using a bounded pool of workers.
+
+    Args:
+        func: Function to call for each application
+        apps: List of applications
+        jobs: Maximum number of concurrent workers
+    Returns:
+        List of (app, result, error) tuples, in the same order as the input list
+    """
+
+    results: List[Tuple["AppRepository", Any, Optional[Exception]]] = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(func, app) for app in apps]
+        for app, future in zip(apps, futures):
+            try:
+                results.append((app, future.result(), None))
+            except Exception as e:  # pylint: disable=broad-except
+                results.append((app, None, e))
+    return results
+
+
+def resolve_apps(apps: List["AppRepository"],
+                 args: Namespace,
+                 cache: Optional[AppsCache] = None,
+                 graph: Optional[DependencyGraph] = None,
+                 api_levels: Optional[Future] = None) -> Tuple[List[dict], List[str]]:
+    """Resolve the manifests and variants of the applications, and their execution plan.
+
+    Args:
+        apps: List of applications, already filtered on the repository properties
+        args: Command line arguments
+        cache: Cache of the applications information (optional)
+        graph: Dependency graph, to also select the dependencies of the selected applications (optional)
+        api_levels: Pending content of `api_levels.json`, fetched meanwhile (optional)
+    Returns:
+        Tuple containing
+         - The list of selected applications plans, sorted by name,
+         - The list of applications names which could not be resolved.
+    """
+
+    from ledgered.github import NoManifestException  # pylint: disable=import-outside-toplevel
+
+    failed: List[str] = []
+    # Information of the apps, resolved for all the devices (None if no manifest)
+    infos: Dict[str, Optional[dict]] = {}
+
+    # 1st step: revalidate the cached information against the HEAD of the apps
+    if cache:
+        for app, record, error in run_for_apps(cache.lookup, apps, args.jobs):
+            if error is not None:
+                logging.warning("Failed to revalidate the cache of app '%s': %s", app.name, error)
+            elif record is not None:
+                infos[app.name] = record["info"]
+        logging.info("Apps cache: %d hit(s), %d miss(es)", cache.hits, cache.misses)
+
+    # 2nd step: fetch the manifests, needed to filter on the SDK
+    to_fetch = [app for app in apps if app.name not in infos]
+    manifests: Dict[str, "AppRepository"] = {}
+    for app, _, error in run_for_apps(lambda a: a.manifest, to_fetch, args.jobs):
+        if isinstance(error, NoManifestException):
+            logging.debug("No manifest found for app '%s'", app.name)
+            if cache:
+                cache.store(app, None)
+        elif error is not None:
+            logging.error("Failed to get the manifest of app '%s': %s", app.name, error)
+            failed.append(app.name)
+        else:
+            manifests[app.name] = app
+
+    selected = [name for name, info in infos.items() if info and info["sdk"] in args.sdk]
+    selected += [name for name, app in manifests.items() if app.manifest.app.sdk in args.sdk]
+    selected.sort()
+    if args.limit and len(selected) > args.limit:
+        logging.info("Limiting to %d applications", args.limit)
+        del selected[args.limit:]
+    if graph:
+        # The dependencies are needed to test their dependents, whatever the SDK or the limit
+        available = {name for name, info in infos.items() if info} | set(manifests)
+        added = sorted((graph.closure(selected) & available) - set(selected))
+        if added:
+            logging.info("Adding the dependencies: %s", ", ".join(added))
+            selected = sorted(selected + added)
+
+    # 3rd step: extract the relevant information, including the variants
+    to_resolve = [manifests[name] for name in selected if name in manifests]
+    for app, info, error in run_for_apps(lambda a: asdict(AppInfo(a, set(get_full_devices()))), to_resolve, args.jobs):
+        if error is not None:
+            logging.error("Failed to resolve app '%s': %s", app.name, error)
+            failed.append(app.name)
+        else:
+            infos[app.name] = info
+            if cache:
+                cache.store(app, info)
+
+    selected_apps: List[dict] = []
+    for name in selected:
+        info = infos.get(name)
+        if info is None:
+            continue
+        logging.info("Managing app '%s'", name)
+        selected_apps.append(make_plan(info, args, lambda: api_levels.result() if api_levels else {}))
+
+    return selected_apps, sorted(failed)
+
+
+# ===============================================================================
+#          Matrix sharding
+# ===============================================================================
+def load_durations(path: Optional[str]) -> Dict[str, float]:
+    """Load the durations of the previous runs, if any"""
+
+    if not path or not os.path.isfile(path):
+        logging.info("No durations history, using the estimated durations")
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def estimate_duration(info: dict, durations: Dict[str, float]) -> float:
+    """Get the expected duration of an application: the last known one, or an estimation"""
+
+    if info["repo_name"] in durations:
+        return durations[info["repo_name"]]
+    return APP_COST + DEVICE_COST.get(info["sdk"].lower(), DEVICE_COST["c"]) * len(info["devices"])
+
+
+def make_shards(apps: List[dict], nb_shards: int, durations: Dict[str, float]) -> List[dict]:
+    """Pack the applications into balanced shards, with the Longest Processing Time first heuristic:
+       the longest applications are assigned first, each one to the currently shortest shard.
+
+    Args:
+        apps: The applications information
+        nb_shards: Maximum number of shards
+        durations: Durations of the previous runs
+    Returns:
+        The shards, each one with its applications (sorted by stage, then name), their names
+        and the estimated duration
+    """
+
+    shards: List[dict] = [{"shard": i, "names": "", "estimate": 0, "apps": []} for i in range(nb_shards)]
+    loads = [(0.0, i) for i in range(nb_shards)]
+    estimated = sorted(((estimate_duration(info, durations), info) for info in apps),
+                       key=lambda e: (-e[0], e[1]["repo_name"]))
+    for duration, info in estimated:
+        load, i = heapq.heappop(loads)
+        shards[i]["apps"].append(info)
+        heapq.heappush(loads, (load + duration, i))
+    for load, i in loads:
+        shards[i]["estimate"] = round(load)
+
+    result: List[dict] = []
+    for shard in shards:
+        if not shard["apps"]:
+            continue
+        shard["apps"].sort(key=lambda info: (info.get("stage", 0), info["repo_name"]))
+        shard["names"] = " ".join(info["repo_name"] for info in shard["apps"])
+        shard["shard"] = len(result)
+        result.append(shard)
+        logging.info("Shard %d: %d app(s), estimated %ds", shard["shard"], len(shard["apps"]), shard["estimate"])
+    return result
+
+
+# ===============================================================================
+#          Dependencies
+# ===============================================================================
+def check_cycles(graph: DependencyGraph) -> None:
+    """Exit with an error if the dependencies have a cycle, before fetching anything"""
+
+    cycles = graph.cycles()
+    if not cycles:
+        return
+    names = [" -> ".join(cycle) for cycle in cycles]
+    for name in names:
+        logging.error("Dependency cycle: %s", name)
+    set_gh_summary(f":x: Dependency cycle(s) in test_info.json: {', '.join(names)}\n<br>")
+    sys.exit(1)
+
+
+def set_stages(apps: List[dict], graph: DependencyGraph) -> List[List[str]]:
+    """Set the stage of each application, and report the dependencies which are not selected.
+
+    Args:
+        apps: The selected applications information
+        graph: The dependency graph
+    Returns:
+        The stages, each one with the names of its applications
+    """
+
+    names = [info["repo_name"] for info in apps]
+    missing = graph.missing(names)
+    if missing:
+        lines = [f"{app} ({', '.join(deps)})" for app, deps in missing.items()]
+        logging.error("Missing dependencies: %s", ", ".join(lines))
+        set_gh_summary(f":warning: Missing dependencies, their dependents can't be tested: {', '.join(lines)}\n<br>")
+
+    stages = graph.stages(names)
+    stage_of = {name: index for index, stage in enumerate(stages) for name in stage}
+    for info in apps:
+        info["stage"] = stage_of[info["repo_name"]]
+    if len(stages) > 1:
+        logging.info("%d dependency stages: %s", len(stages), " | ".join(" ".join(stage) for stage in stages))
+    return stages
+
+
 # ===============================================================================
 #          MAIN
 # ===============================================================================
@@ -152,42 +512,73 @@ def main() -> None:
     # Arguments checking
     # ------------------
     logging_set_level(args.verbose)
+    profile_start("parse_all_apps", args.profile)
 
-    # GitHub environment variables
-    github_token = os.environ.get("GH_TOKEN")
+    # The profile is also written when the script fails, to diagnose it
+    try:
+        # Processing
+        # ----------
+        graph = DependencyGraph.from_test_info()
+        check_cycles(graph)
+        if args.only:
+            args.only = sorted(graph.closure(args.only))
 
-    selected_apps: List[dict] = []
-    app: AppRepository
-
-    # Processing
-    # ----------
-    logging.info("Fetching application repositories from GitHub")
-    gh = GitHubLedgerHQ(github_token) if github_token else GitHubLedgerHQ()
-    apps = gh.apps.filter(archived=Condition.WITHOUT,
-                          only_list=args.only,
-                          exclude_list=args.exclude,
-                          sdk=args.sdk)
-
-    apps.sort(key=lambda r: r.name)
-    if args.limit and len(apps) > args.limit:
-        logging.info("Limiting to %d applications", args.limit)
-        del apps[(args.limit - len(apps)):]
+        # pylint: disable=import-outside-toplevel
+        from ledgered.github import Condition, GitHubLedgerHQ
+        from gh_client import github_client, report_api_usage
 
-    for app in apps:
-        logging.info("Managing app '%s'", app.name)
-        selected_apps.append(asdict(AppInfo(app, args.devices)))
+        start = time.perf_counter()
+        logging.info("Fetching application repositories from GitHub")
+        # Requests are sent by concurrent workers: drop the default throttling between them
+        gh = github_client(GitHubLedgerHQ, seconds_between_requests=None)
+        with profile_span("fetch repos"):
+            # The SDK filtering is done afterwards, as it requires the manifests
+            apps = gh.apps.filter(archived=Condition.WITHOUT,
+                                  only_list=args.only,
+                                  exclude_list=args.exclude)
 
-    if args.json:
-        set_gh_output(args.json, json.dumps(selected_apps))
-        with open(f"{args.json}.json", "w", encoding="utf-8") as f:
-            json.dump(selected_apps, f)
-    else:
-        print(json.dumps(selected_apps, indent=4))
+            cache: Optional[AppsCache] = None
+            if args.cache:
+                cache = AppsCache(args.cache)
+                nb_evicted = cache.evict(gh.apps)
+                if nb_evicted:
+                    logging.info("Evicted %d archived or removed app(s) from cache", nb_evicted)
 
-    if args.nb:
-        set_gh_output(args.nb, f"{len(selected_apps)}")
-    else:
-        print(f"Nb of Apps: {len(selected_apps)}")
+        logging.info("Resolving %d applications with %d workers", len(apps), args.jobs)
+        with profile_span("resolve manifests"), ThreadPoolExecutor(max_workers=1) as executor:
+            # Only needed to plan the scan builds (without requested SDK branch): fetched along with the manifests
+            api_levels = executor.submit(fetch_api_levels, gh) if args.mode == "scan" and not args.sdk_branch else None
+            selected_apps, failed_apps = resolve_apps(apps, args, cache, graph, api_levels)
+        stages = set_stages(selected_apps, graph)
+        logging.info("Applications list resolved in %.2fs", time.perf_counter() - start)
+
+        if cache:
+            cache.save()
+        report_api_usage("parse_all_apps", summary=True)
+
+        if failed_apps:
+            logging.error("Failed to resolve %d application(s): %s", len(failed_apps), ", ".join(failed_apps))
+            set_gh_summary(f":warning: {len(failed_apps)} App(s) could not be resolved: {', '.join(failed_apps)}\n<br>")
+
+        if args.json:
+            set_gh_output(args.json, json.dumps(selected_apps))
+            with open(f"{args.json}.json", "w", encoding="utf-8") as f:
+                json.dump(selected_apps, f)
+            if args.shards:
+                shards = make_shards(selected_apps, args.shards, load_durations(args.durations))
+                set_gh_output(f"{args.json}_shards", json.dumps(shards))
+                with open(f"{args.json}_shards.json", "w", encoding="utf-8") as f:
+                    json.dump(shards, f)
+        else:
+            print(json.dumps(selected_apps, indent=4))
+            print(f"Stages: {json.dumps(stages)}")
+
+        if args.nb:
+            set_gh_output(args.nb, f"{len(selected_apps)}")
+        else:
+            print(f"Nb of Apps: {len(selected_apps)}")
+    finally:
+        profile_stop()
 
 
 if __name__ == "__main__":
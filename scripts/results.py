@@ -0,0 +1,192 @@
+"""
+Results ledger: JSON Lines records of the Apps results, one per app/phase/device/variant.
+
+The runners write their records in `<phase>_results_<app>.jsonl`, next to their status files.
+The records of all the Apps are merged in a single pass, and aggregated in `Results`,
+from which the summary and the Slack message are rendered.
+"""
+
+import os
+import json
+import logging
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from bundle import input_files
+
+# Phases, in the order of the workflows
+PHASES = ["build", "test", "check"]
+
+# Status token of each result, the worst result first
+STATUS_TOKENS = {
+    "error": ":construction:",
+    "fail": ":x:",
+    "skip": ":warning:",
+    "retry": ":repeat:",
+    "pass": ":white_check_mark:",
+    "none": ":black_circle:",
+}
+RESULTS = {token: result for result, token in STATUS_TOKENS.items()}
+SEVERITY = {result: rank for rank, result in enumerate(STATUS_TOKENS)}
+
+
+class Record(NamedTuple):
+    """Result of an App, for a phase
+
+    `target` is the device (the check step for the `check` phase), None if the result concerns the whole App.
+    `variant` is the variant of a build, None for the default one.
+    """
+
+    app: str
+    phase: str
+    target: Optional[str]
+    variant: Optional[str]
+    result: str
+
+
+def write_records(path: str, records: Iterable[Record]) -> None:
+    """Append records to a results file"""
+
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record._asdict(), separators=(",", ":")) + "\n")
+
+
+def read_records(paths: Iterable[str], merged: Optional[str] = None) -> Iterator[Record]:
+    """Read the records of results files, streaming them in a single pass.
+
+    Args:
+        paths: The results files, or directories or bundles of results files
+        merged: File where all the valid records are written while read, if any
+    Returns:
+        The records, the invalid lines being skipped
+    """
+
+    out = open(merged, "w", encoding="utf-8") if merged else None  # pylint: disable=consider-using-with
+    try:
+        for path in paths:
+            for name, f in input_files(path, "results"):
+                for nb, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = Record(**json.loads(line))
+                    except (ValueError, TypeError) as e:
+                        logging.warning("%s:%d: invalid record (%s)", name, nb, e)
+                        continue
+                    if record.result not in STATUS_TOKENS:
+                        logging.warning("%s:%d: unknown result '%s'", name, nb, record.result)
+                        continue
+                    if out:
+                        out.write(line if line.endswith("\n") else line + "\n")
+                    yield record
+    finally:
+        if out:
+            out.close()
+
+
+def records_from_status(path: str, phase: str, columns: List[str]) -> Iterator[Record]:
+    """Get the records of the status files of a phase (`<phase>_status_<app>.md`), written without results files.
+    The status files are read from a directory or a bundle.
+    """
+
+    for fname, infile in input_files(path, f"{phase}_status"):
+        tokens = infile.readline().split("|")[1:]
+        app = os.path.splitext(os.path.basename(fname.split("_")[-1]))[0]
+        if len(tokens) == 1:
+            # A single result, for the whole App
+            yield Record(app, phase, None, None, RESULTS.get(tokens[0], "error"))
+            continue
+        for column, token in zip(columns, tokens):
+            yield Record(app, phase, column, None, RESULTS.get(token, "error"))
+
+
+class Results:
+    """Results of the Apps, aggregated from their records.
+
+    The result of a device is the worst result of its variants, and the variants failures are kept
+    to name them in the errors report.
+    """
+
+    def __init__(self, records: Iterable[Record] = ()):
+        self.results: Dict[Tuple[str, str], Dict[Optional[str], str]] = {}
+        self.failed_variants: Dict[Tuple[str, str, Optional[str]], List[str]] = {}
+        for record in records:
+            self.add(record)
+
+    def add(self, record: Record) -> None:
+        """Add a record"""
+
+        targets = self.results.setdefault((record.app, record.phase), {})
+        current = targets.get(record.target)
+        if current is None or SEVERITY[record.result] < SEVERITY[current]:
+            targets[record.target] = record.result
+        if record.variant and record.result in ("fail", "error"):
+            self.failed_variants.setdefault((record.app, record.phase, record.target), []).append(record.variant)
+
+    def phases(self) -> List[str]:
+        """Get the phases having results, in the workflows order"""
+
+        present = {phase for _, phase in self.results}
+        return [phase for phase in PHASES if phase in present]
+
+    def main_phase(self) -> Optional[str]:
+        """Get the phase reported by the run: the last one having results"""
+
+        phases = self.phases()
+        return phases[-1] if phases else None
+
+    def apps(self, phase: str) -> List[str]:
+        """Get the Apps having results for a phase, sorted alphabetically"""
+
+        return sorted(app for app, p in self.results if p == phase)
+
+    def result(self, app: str, phase: str, target: str) -> Optional[str]:
+        """Get the result of an App for a device (or check step), None if the App has no results for the phase"""
+
+        targets = self.results.get((app, phase))
+        if targets is None:
+            return None
+        return targets.get(target, targets.get(None, "none"))
+
+    def tokens(self, app: str, phase: str, columns: List[str]) -> Optional[List[str]]:
+        """Get the status tokens of an App, like in the status files.
+
+        Args:
+            app: The App
+            phase: The phase
+            columns: The devices (or check steps)
+        Returns:
+            The token of each column, a single one if the whole App failed, None if the App has no results
+        """
+
+        targets = self.results.get((app, phase))
+        if targets is None:
+            return None
+        if None in targets and targets[None] in ("fail", "error"):
+            return [STATUS_TOKENS[targets[None]]]
+        return [STATUS_TOKENS[targets.get(c, targets.get(None, "none"))] for c in columns]
+
+    def failures(self, app: str, phase: str) -> List[str]:
+        """Get the names of the failed devices (or check steps) of an App, with their failed variants if any"""
+
+        targets = self.results.get((app, phase), {})
+        if targets.get(None) in ("fail", "error"):
+            return ["All"]
+        names = []
+        for target, result in targets.items():
+            if result not in ("fail", "error") or target is None:
+                continue
+            # Particular target name of Nanos+ in the errors files
+            name = target.replace("s+", "sp")
+            variants = self.failed_variants.get((app, phase, target))
+            names.append(f"{name} [{' '.join(variants)}]" if variants else name)
+        return names
+
+    def errors_report(self, phase: str) -> List[str]:
+        """Get the lines of the errors report of a phase, one per failed App"""
+
+        lines = []
+        for app in self.apps(phase):
+            names = self.failures(app, phase)
+            if names:
+                lines.append(f"\t• {app}: {', '.join(names)}")
+        return lines
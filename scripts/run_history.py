@@ -0,0 +1,206 @@
+"""
+SQLite store of the results of the previous runs, to detect the new failures, the fixed and flaky Apps,
+and the duration regressions.
+"""
+
+import time
+import sqlite3
+import logging
+import statistics
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from results import STATUS_TOKENS
+
+# Nb of runs kept per mode, to keep the database small enough to be cached
+MAX_RUNS = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    date REAL NOT NULL,
+    UNIQUE (run_id, mode)
+);
+CREATE TABLE IF NOT EXISTS results (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    app TEXT NOT NULL,
+    device TEXT NOT NULL,
+    variant TEXT,
+    result TEXT NOT NULL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS results_run ON results (run);
+CREATE INDEX IF NOT EXISTS results_app_device ON results (app, device, run);
+"""
+
+# Results stored for the status tokens (not selected devices are not stored)
+RESULTS = {token: result for result, token in STATUS_TOKENS.items() if result != "none"}
+# Results compared to detect the new failures and the fixed Apps (a pass on retry is not a change)
+PASSED = ("pass", "retry")
+FAILED = ("fail", "error")
+
+
+class Result(NamedTuple):
+    """Result of an App on a device"""
+
+    app: str
+    device: str
+    variant: Optional[str]
+    result: str
+    duration: Optional[float]
+
+
+class RunHistory:
+    """History of the runs results.
+
+    A run is identified by the workflow run ID and a mode, which separates the kinds of results
+    (like the builds and the tests of a same workflow run) and the workflows.
+    The queries compare a run with the previous runs of the same mode.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        """Close the database"""
+
+        self.db.close()
+
+    def add_run(self, run_id: int, mode: str, results: Iterable[Result]) -> int:
+        """Store the results of a run, replacing the previous ones of the same run and mode.
+
+        Args:
+            run_id: The workflow run ID
+            mode: The run mode
+            results: The results of the run
+        Returns:
+            The run key, used by the queries
+        """
+
+        with self.db:
+            self.db.execute("DELETE FROM runs WHERE run_id = ? AND mode = ?", (run_id, mode))
+            cur = self.db.execute("INSERT INTO runs (run_id, mode, date) VALUES (?, ?, ?)", (run_id, mode, time.time()))
+            run = cur.lastrowid
+            assert run is not None
+            self.db.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)", ((run, *r) for r in results))
+        return run
+
+    def prune(self, max_runs: int = MAX_RUNS) -> int:
+        """Remove the oldest runs of each mode.
+
+        Args:
+            max_runs: Nb of runs kept per mode
+        Returns:
+            Nb of removed runs
+        """
+
+        with self.db:
+            cur = self.db.execute("""
+                DELETE FROM runs WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY mode ORDER BY id DESC) AS rank FROM runs
+                    ) WHERE rank > ?
+                )""", (max_runs,))
+        if cur.rowcount:
+            self.db.execute("VACUUM")
+        return cur.rowcount
+
+    def _previous_run(self, run: int, mode: str) -> Optional[int]:
+        row = self.db.execute("SELECT id FROM runs WHERE mode = ? AND id < ? ORDER BY id DESC LIMIT 1",
+                              (mode, run)).fetchone()
+        return row[0] if row else None
+
+    def _changes(self, run: int, mode: str, before: Tuple[str, ...], after: Tuple[str, ...]) -> List[Tuple[str, str]]:
+        prev = self._previous_run(run, mode)
+        if prev is None:
+            return []
+        return self.db.execute(f"""
+            SELECT c.app, c.device FROM results c
+            JOIN results p ON p.run = ? AND p.app = c.app AND p.device = c.device AND p.variant IS NULL
+            WHERE c.run = ? AND c.variant IS NULL
+              AND p.result IN ({", ".join("?" * len(before))}) AND c.result IN ({", ".join("?" * len(after))})
+            ORDER BY c.app, c.device""", (prev, run, *before, *after)).fetchall()
+
+    def new_failures(self, run: int, mode: str) -> List[Tuple[str, str]]:
+        """Get the (app, device) failing (or in error) in a run, which were passing in the previous run"""
+
+        return self._changes(run, mode, PASSED, FAILED)
+
+    def fixed(self, run: int, mode: str) -> List[Tuple[str, str]]:
+        """Get the (app, device) passing in a run, which were failing (or in error) in the previous run"""
+
+        return self._changes(run, mode, FAILED, PASSED)
+
+    def failed_variants(self, run: int) -> Dict[Tuple[str, str], List[str]]:
+        """Get the failed variants of a run, per (app, device)"""
+
+        variants: Dict[Tuple[str, str], List[str]] = {}
+        for app, device, variant in self.db.execute("""
+                SELECT app, device, variant FROM results
+                WHERE run = ? AND variant IS NOT NULL ORDER BY rowid""", (run,)):
+            variants.setdefault((app, device), []).append(variant)
+        return variants
+
+    def flaky(self, mode: str, window: int = 10, min_flips: int = 3) -> List[Tuple[str, str, int]]:
+        """Get the (app, device) flipping between pass and fail, or passing on retry, in the last runs.
+
+        Args:
+            mode: The run mode
+            window: Nb of last runs considered
+            min_flips: Min nb of flips (a pass on retry counts as one) to be considered as flaky
+        Returns:
+            The (app, device, nb of flips), the flakiest first
+        """
+
+        return self.db.execute("""
+            SELECT app, device, SUM(flip) AS flips FROM (
+                SELECT app, device,
+                       CASE WHEN result = 'retry' THEN 1
+                            ELSE result != LAG(result) OVER (PARTITION BY app, device, result = 'retry' ORDER BY run)
+                       END AS flip
+                FROM results
+                WHERE run IN (SELECT id FROM runs WHERE mode = ? ORDER BY id DESC LIMIT ?)
+                  AND variant IS NULL AND result IN ('pass', 'fail', 'retry')
+            )
+            GROUP BY app, device HAVING flips >= ?
+            ORDER BY flips DESC, app, device""", (mode, window, min_flips)).fetchall()
+
+    def duration_regressions(self,
+                             run: int,
+                             mode: str,
+                             window: int = 5,
+                             factor: float = 1.5,
+                             min_delta: float = 30.0) -> List[Tuple[str, str, float, float]]:
+        """Get the (app, device) whose duration increased, compared to the median of the previous runs.
+
+        Args:
+            run: The run key
+            mode: The run mode
+            window: Nb of previous runs considered
+            factor: Min ratio between the duration and the previous median
+            min_delta: Min increase (in seconds), to ignore the small durations
+        Returns:
+            The (app, device, duration, previous median), the largest increase first
+        """
+
+        previous: Dict[Tuple[str, str], List[float]] = {}
+        for app, device, duration in self.db.execute("""
+                SELECT app, device, duration FROM results
+                WHERE run IN (SELECT id FROM runs WHERE mode = ? AND id < ? ORDER BY id DESC LIMIT ?)
+                  AND duration IS NOT NULL""", (mode, run, window)):
+            previous.setdefault((app, device), []).append(duration)
+
+        regressions = []
+        for app, device, duration in self.db.execute(
+                "SELECT app, device, duration FROM results WHERE run = ? AND duration IS NOT NULL", (run,)):
+            if (app, device) not in previous:
+                continue
+            median = statistics.median(previous[(app, device)])
+            if duration > median * factor and duration - median > min_delta:
+                regressions.append((app, device, duration, median))
+        regressions.sort(key=lambda r: (r[3] - r[2], r[0], r[1]))
+        logging.debug("%d duration regression(s) found", len(regressions))
+        return regressions
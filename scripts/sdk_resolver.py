@@ -0,0 +1,210 @@
+"""
+Resolution of the SDK references of the device builds, with one git worktree per distinct reference.
+"""
+
+import os
+import re
+import json
+import fcntl
+import shutil
+import logging
+import subprocess
+from contextlib import contextmanager
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional
+
+
+def api_level_ref(api_levels: Dict[str, List[str]], target: str) -> str:
+    """Get the dedicated API_LEVEL_xx branch for the targeted device, from the content of `api_levels.json`"""
+
+    levels = [int(level) for level, names in api_levels.items()
+              if any(target in n for n in names) and any("-rc" not in n for n in names)]
+    if not levels:
+        logging.info("No API_LEVEL branch found for %s. Keep master!", target)
+        return "master"
+    return f"API_LEVEL_{max(levels)}"
+
+
+def resolve_refs(targets: List[str], mode: str, branch: Optional[str],
+                 api_levels: Callable[[], Dict[str, List[str]]]) -> Dict[str, Optional[str]]:
+    """Compute the SDK reference of each device.
+
+    Args:
+        targets: The devices
+        mode: The build mode (scan, test or build)
+        branch: The SDK branch requested by the user, if any
+        api_levels: Getter of the content of `api_levels.json`, only called when needed (scan mode)
+    Returns:
+        The reference of each device, None to use the SDK of the container for the device (test mode)
+    """
+
+    refs: Dict[str, Optional[str]] = {}
+    for target in targets:
+        if branch:
+            refs[target] = branch
+        elif mode == "build":
+            refs[target] = "master"
+        elif mode == "test":
+            refs[target] = None
+        else:
+            # Using the HEAD of the dedicated API_LEVEL_xx branch for the targeted device
+            refs[target] = api_level_ref(api_levels(), target)
+    return refs
+
+
+class SdkResolver:
+    """Resolver of the SDK checkouts of the device builds.
+
+    The device -> reference mapping is computed once, from the mode and the `api_levels.json` of the SDK.
+    The SDK repository is fetched once, and each distinct reference gets its own git worktree,
+    so that the builds for the devices using different references can run side by side.
+    The repository can be bare (the references are then its local branches).
+    With `keep`, the worktrees are kept after the builds, and only moved to the new commit of their reference
+    by the next builds (see `build_server.py`).
+
+    The kept worktrees are shared by the builds running concurrently (like the workers of the build server),
+    with file locks in the worktrees directory:
+     - `<ref>.lock` is held shared by the builds using the worktree, until the cleanup, and exclusive to move it,
+     - `<ref>.mutex` serializes the checkouts of the reference, so that no new build uses the worktree
+       while it waits for the running ones to move it,
+     - `.repo.lock` serializes the fetches and the worktrees additions in the SDK repository.
+    The references are locked in the same (sorted) order by all the builds, see `checkout_all`.
+    """
+
+    def __init__(self, repo: str, worktrees_dir: str, keep: bool = False):
+        self.repo = repo
+        self.worktrees_dir = worktrees_dir
+        self.keep = keep
+        self.worktrees: Dict[str, str] = {}
+        self._fetched = False
+        self._api_levels: Optional[Dict[str, List[str]]] = None
+        self._locks: List[IO] = []
+
+    @contextmanager
+    def _lock(self, name: str) -> Iterator[IO]:
+        """Hold an exclusive lock on a file of the worktrees directory"""
+
+        os.makedirs(self.worktrees_dir, exist_ok=True)
+        with open(os.path.join(self.worktrees_dir, name), "a", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield f
+
+    def _git(self, *cmd: str) -> subprocess.CompletedProcess:
+        logging.debug("Running 'git -C %s %s'", self.repo, " ".join(cmd))
+        return subprocess.run(["git", "-C", self.repo, *cmd], check=False,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    def fetch(self) -> None:
+        """Fetch the SDK repository, once (nothing to do without remote)"""
+
+        if self._fetched:
+            return
+        self._fetched = True
+        if not self._git("remote").stdout.strip():
+            return
+        with self._lock(".repo.lock"):
+            res = self._git("fetch", "-q")
+        if res.returncode != 0:
+            logging.warning("Unable to fetch the SDK: %s", res.stderr.strip())
+
+    def commit(self, ref: str) -> Optional[str]:
+        """Get the commit of a reference, preferring the remote branch (like a `pull`)"""
+
+        for name in (f"refs/remotes/origin/{ref}", ref):
+            res = self._git("rev-parse", "--verify", "-q", f"{name}^{{commit}}")
+            if res.returncode == 0:
+                return res.stdout.strip()
+        return None
+
+    def api_levels(self) -> Dict[str, List[str]]:
+        """Get the content of `api_levels.json`, from the master branch of the SDK"""
+
+        if self._api_levels is None:
+            self.fetch()
+            commit = self.commit("master") or "HEAD"
+            res = self._git("show", f"{commit}:api_levels.json")
+            if res.returncode != 0:
+                logging.warning("Unable to read api_levels.json: %s", res.stderr.strip())
+            self._api_levels = json.loads(res.stdout) if res.returncode == 0 else {}
+        return self._api_levels
+
+    def api_level_ref(self, target: str) -> str:
+        """Get the dedicated API_LEVEL_xx branch for the targeted device"""
+
+        return api_level_ref(self.api_levels(), target)
+
+    def resolve(self, targets: List[str], mode: str, branch: Optional[str] = None) -> Dict[str, Optional[str]]:
+        """Compute the SDK reference of each device (see `resolve_refs`)"""
+
+        return resolve_refs(targets, mode, branch, self.api_levels)
+
+    def checkout(self, ref: str) -> Optional[str]:
+        """Get the path of the worktree of a reference, creating it the 1st time.
+
+        Args:
+            ref: The SDK reference (branch, tag or commit)
+        Returns:
+            The worktree path, or None if the reference can't be checked out
+        """
+
+        if ref in self.worktrees:
+            return self.worktrees[ref]
+        self.fetch()
+        commit = self.commit(ref)
+        if commit is None:
+            logging.error("SDK reference '%s' not found", ref)
+            return None
+        name = re.sub(r"[^\w.-]", "_", ref)
+        path = os.path.join(self.worktrees_dir, name)
+        with self._lock(f"{name}.mutex"):
+            # pylint: disable=consider-using-with
+            users = open(os.path.join(self.worktrees_dir, f"{name}.lock"), "a", encoding="utf-8")
+            fcntl.flock(users, fcntl.LOCK_SH)
+            if self.keep and os.path.isdir(path) and self._worktree_head(path) == commit:
+                logging.info("SDK reference '%s' (%s) already checked out in %s", ref, commit[:12], path)
+            else:
+                # Wait for the running builds using the worktree, the new ones waiting for the mutex
+                fcntl.flock(users, fcntl.LOCK_EX)
+                res = self._move(path, commit)
+                fcntl.flock(users, fcntl.LOCK_SH)
+                if res.returncode != 0:
+                    users.close()
+                    logging.error("Unable to checkout the SDK reference '%s': %s", ref, res.stderr.strip())
+                    return None
+                logging.info("SDK reference '%s' (%s) checked out in %s", ref, commit[:12], path)
+        self._locks.append(users)
+        self.worktrees[ref] = path
+        return path
+
+    def checkout_all(self, refs: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Get the paths of the worktrees of references (see `checkout`), locked in the sorted order"""
+
+        return {ref: self.checkout(ref) for ref in sorted(set(refs))}
+
+    def _move(self, path: str, commit: str) -> subprocess.CompletedProcess:
+        """Checkout a commit in a worktree, adding it if needed"""
+
+        if self.keep and os.path.isdir(path):
+            return subprocess.run(["git", "-C", path, "checkout", "-q", "-f", "--detach", commit], check=False,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        with self._lock(".repo.lock"):
+            return self._git("worktree", "add", "-f", "--detach", path, commit)
+
+    @staticmethod
+    def _worktree_head(path: str) -> Optional[str]:
+        res = subprocess.run(["git", "-C", path, "rev-parse", "HEAD"], check=False,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        return res.stdout.strip() if res.returncode == 0 else None
+
+    def cleanup(self) -> None:
+        """Remove the worktrees (unless they are kept), and release them"""
+
+        if not self.keep:
+            with self._lock(".repo.lock"):
+                for path in self.worktrees.values():
+                    if self._git("worktree", "remove", "-f", path).returncode != 0:
+                        shutil.rmtree(path, ignore_errors=True)
+                self._git("worktree", "prune")
+        for lock in self._locks:
+            lock.close()
+        self._locks.clear()
+        self.worktrees.clear()
@@ -12,12 +12,10 @@ import logging
 import re
 from typing import Any
 from argparse import ArgumentParser, Namespace
+from results import Results, read_records
 from utils import logging_init, logging_set_level, get_full_devices
 
 
-devices = get_full_devices()
-
-
 # ===============================================================================
 #          Parse command line options
 # ===============================================================================
@@ -40,6 +38,11 @@ def arg_parse() -> Namespace:
                         required=False,
                         type=str,
                         help="Details report file.")
+    parser.add_argument("-r",
+                        "--results",
+                        required=False,
+                        type=str,
+                        help="Results file (merged by the summary), used instead of the details report file.")
     parser.add_argument("-j",
                         "--json",
                         type=str,
@@ -49,7 +52,7 @@ def arg_parse() -> Namespace:
                         nargs="+",
                         required=False,
                         type=str,
-                        choices=sorted(devices + ["nanosp", "all"]),
+                        choices=sorted(get_full_devices() + ["nanosp", "all"]),
                         help="List of devices to filter on. "
                         "Accepts several successive values (separated with space).  Defaults to 'all'.")
     parser.add_argument("-n",
@@ -161,8 +164,21 @@ def main() -> None:
         logging.error("'GH_RUN_ID' environment variable is not set")
         sys.exit(1)
 
-    if args.errors:
+    content = ""
+    fail_count = 0
+    if args.results:
+        # Failed Apps of the reported phase
+        results = Results(read_records([args.results]))
+        phase = results.main_phase()
+        lines = results.errors_report(phase) if phase else []
+        fail_count = len(lines)
+        content = "\n".join(lines)
+    elif args.errors:
         fail_count = count_apps(args.errors)
+        with open(args.errors, encoding="utf-8") as f:
+            content = f.read()
+
+    if fail_count:
         status = f":red-cross: Fail for {fail_count} / {args.nb} Apps"
     elif args.missing and args.missing != "0":
         status = f":rotating_light: Missing {args.missing} Apps in summary"
@@ -172,10 +188,6 @@ def main() -> None:
     # Processing
     # ----------
     logging.info("Preparing JSON data with workflow result")
-    content = ""
-    if args.errors:
-        with open(args.errors, encoding="utf-8") as f:
-            content = f.read()
     slack_json = prepare_slack_payload(args, status, run_id, content)
 
     logging.debug("JSON_DATA:\n%s", json.dumps(slack_json, indent=4))
@@ -0,0 +1,27 @@
+"""
+pytest plugin loaded by test_app.py in the test sessions of the devices (`-p speculos_ports`).
+
+The sessions run concurrently: each one gets its own range of ports for the Speculos emulators,
+starting at the `SPECULOS_API_PORT` env variable, instead of the default API port of Ragger (5000).
+The APDU port follows the API port, and Ragger still skips the ports already in use from there.
+"""
+
+import os
+
+# Env variable with the first port of the session
+PORT_ENV = "SPECULOS_API_PORT"
+
+
+def pytest_configure(config) -> None:  # pylint: disable=unused-argument
+    """Set the first port of the emulators of the session"""
+
+    port = os.environ.get(PORT_ENV)
+    if not port:
+        return
+    try:
+        # pylint: disable=import-outside-toplevel
+        from ragger.backend.speculos import SpeculosBackend
+    except ImportError:
+        # Not a Ragger test suite
+        return
+    SpeculosBackend._DEFAULT_API_PORT = int(port)  # pylint: disable=protected-access
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Status state: the running aggregation of the Apps results, folded by each job as soon as it finishes,
+and merged between the jobs (shards), instead of re-reading all the status files at the end of the run.
+
+The state holds, per App and phase, the result of each device (or check step), the failed variants,
+the link of the job and its run attempt. Two states are merged entry by entry (App and phase):
+the entry of the latest attempt wins (re-run jobs), and the entries of a same attempt are combined,
+keeping the worst result of each device. This merge is associative, commutative and idempotent:
+the states can be merged in any order and grouping, and merged again without changing the result.
+"""
+
+import os
+import sys
+import json
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from argparse import ArgumentParser, Namespace
+from bundle import input_files
+from results import PHASES, SEVERITY, Record, Results, read_records
+from utils import logging_init, logging_set_level
+
+# Bump it when the format of the state changes
+STATE_VERSION = 1
+# Target of the results concerning the whole App (JSON keys can't be null)
+ALL_TARGETS = "*"
+
+
+def _worst(first: str, second: str) -> str:
+    return first if SEVERITY[first] <= SEVERITY[second] else second
+
+
+class StatusState:
+    """Mergeable aggregation state of the Apps results.
+
+    Each entry, indexed by `(app, phase)`, is a dict with the `attempt` and the `job` link which produced it,
+    the `targets` results and the `variants` failed per target.
+    """
+
+    def __init__(self) -> None:
+        self.entries: Dict[Tuple[str, str], dict] = {}
+
+    def fold(self, record: Record, attempt: int = 0, job: Optional[str] = None) -> None:
+        """Fold a result record of a job"""
+
+        target = ALL_TARGETS if record.target is None else record.target
+        variants = {target: [record.variant]} if record.variant and record.result in ("fail", "error") else {}
+        self._merge_entry((record.app, record.phase),
+                          {"attempt": attempt, "job": job, "targets": {target: record.result}, "variants": variants})
+
+    def merge(self, other: "StatusState") -> None:
+        """Merge another state in this one"""
+
+        for key, entry in other.entries.items():
+            self._merge_entry(key, entry)
+
+    def _merge_entry(self, key: Tuple[str, str], entry: dict) -> None:
+        current = self.entries.get(key)
+        if current is None or entry["attempt"] > current["attempt"]:
+            self.entries[key] = {"attempt": entry["attempt"], "job": entry["job"],
+                                 "targets": dict(entry["targets"]),
+                                 "variants": {t: list(v) for t, v in entry["variants"].items()}}
+            return
+        if entry["attempt"] < current["attempt"]:
+            return
+        # Same attempt: the worst result of each target, and the union of the failed variants
+        for target, result in entry["targets"].items():
+            known = current["targets"].get(target)
+            current["targets"][target] = result if known is None else _worst(known, result)
+        for target, variants in entry["variants"].items():
+            current["variants"][target] = sorted(set(current["variants"].get(target, [])) | set(variants))
+        # Deterministic link, whatever the merge order
+        if entry["job"] and (current["job"] is None or entry["job"] < current["job"]):
+            current["job"] = entry["job"]
+
+    def apps(self, phase: str) -> List[str]:
+        """Get the Apps having results for a phase, sorted alphabetically"""
+
+        return sorted(app for app, p in self.entries if p == phase)
+
+    def job_link(self, app: str, phase: str) -> Optional[str]:
+        """Get the link of the job which produced the results of an App, if known"""
+
+        entry = self.entries.get((app, phase))
+        return entry["job"] if entry else None
+
+    def records(self) -> Iterator[Record]:
+        """Get the records of the state: one per target, and one per failed variant"""
+
+        for (app, phase), entry in sorted(self.entries.items()):
+            for target, result in sorted(entry["targets"].items()):
+                yield Record(app, phase, None if target == ALL_TARGETS else target, None, result)
+                for variant in entry["variants"].get(target, []):
+                    yield Record(app, phase, None if target == ALL_TARGETS else target, variant, "fail")
+
+    def results(self) -> Results:
+        """Get the results of the Apps, rendered like the ones of the results files"""
+
+        return Results(self.records())
+
+    def to_dict(self) -> dict:
+        """Get the JSON content of the state"""
+
+        apps: Dict[str, Dict[str, dict]] = {}
+        for (app, phase), entry in sorted(self.entries.items()):
+            apps.setdefault(app, {})[phase] = entry
+        return {"version": STATE_VERSION, "apps": apps}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StatusState":
+        """Get a state from its JSON content"""
+
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"unsupported state version {data.get('version')}")
+        state = cls()
+        for app, phases in data["apps"].items():
+            for phase, entry in phases.items():
+                if phase not in PHASES:
+                    raise ValueError(f"unknown phase '{phase}'")
+                state._merge_entry((app, phase), entry)
+        return state
+
+    def save(self, path: str) -> None:
+        """Write the state in a file"""
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+
+def load_states(paths: Iterable[str]) -> StatusState:
+    """Merge the states of state files, or directories or bundles of state files (`<phase>_state_<name>.json`).
+    The invalid files are skipped.
+    """
+
+    state = StatusState()
+    for path in paths:
+        for name, f in input_files(path, "state"):
+            try:
+                state.merge(StatusState.from_dict(json.load(f)))
+            except (ValueError, KeyError, TypeError) as e:
+                logging.warning("%s: invalid state (%s)", name, e)
+    return state
+
+
+# ===============================================================================
+#          Parse command line options
+# ===============================================================================
+def arg_parse() -> Namespace:
+    """Parse the commandline options"""
+
+    parser = ArgumentParser(description="Fold the results of a job in a status state, or merge status states")
+    parser.add_argument("inputs",
+                        nargs="*",
+                        help="State files, or directories or bundles of state files, to merge.")
+    parser.add_argument("-o",
+                        "--output",
+                        required=True,
+                        type=str,
+                        help="Output state file, like `build_state_<app>.json`.")
+    parser.add_argument("-R",
+                        "--Results",
+                        nargs="+",
+                        default=[],
+                        help="Results files of the job, or directories or bundles of results files, to fold.")
+    parser.add_argument("--job_url",
+                        type=str,
+                        help="Link of the job producing the folded results.")
+    parser.add_argument("--attempt",
+                        type=int,
+                        default=int(os.environ.get("GITHUB_RUN_ATTEMPT", 0)),
+                        help="Run attempt of the job producing the folded results, the latest one replacing "
+                        "the previous ones. Defaults to the `GITHUB_RUN_ATTEMPT` env variable, or 0.")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase verbosity.")
+
+    args = parser.parse_args()
+    if not args.inputs and not args.Results:
+        parser.error("States to merge, or results to fold, must be specified.")
+    return args
+
+
+# ===============================================================================
+#          MAIN
+# ===============================================================================
+def main() -> None:
+    """Main function"""
+
+    logging_init()
+    args = arg_parse()
+    logging_set_level(args.verbose)
+
+    state = load_states(args.inputs)
+    nb_records = 0
+    for record in read_records(args.Results):
+        state.fold(record, args.attempt, args.job_url)
+        nb_records += 1
+    if not state.entries:
+        logging.error("No results found")
+        sys.exit(1)
+    state.save(args.output)
+    logging.info("%d record(s) folded in %s, with %d App(s) entries", nb_records, args.output, len(state.entries))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,15 +6,29 @@ Tool to generate the summary report.
 """
 
 import os
+import json
 import logging
+import re
 import sys
-from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from argparse import ArgumentParser, Namespace
-from github import Github
-from utils import logging_init, logging_set_level, set_gh_summary, set_gh_output, get_full_devices
+from bundle import input_files
+from results import Results, read_records, records_from_status, write_records
+from run_history import RESULTS, Result, RunHistory
+from status_state import StatusState, load_states
+from utils import logging_init, logging_set_level, set_gh_summary, set_gh_output, get_full_devices, \
+    add_profile_option, profile_start, profile_span, profile_stop
 
 
-devices = get_full_devices()
+# Columns of the check status files
+CHECK_STEPS = ["manifest", "icons", "app_load_params", "makefile", "readme", "scan"]
+
+# Merged results files of the apps, written by the summary
+MERGED_RESULTS = "results.jsonl"
+
+# Jobs links indexed by (token, job kind), see `build_job_index`
+JobIndex = Dict[Tuple[str, str], str]
 
 
 # ===============================================================================
@@ -34,7 +48,7 @@ def arg_parse() -> Namespace:
                         "--job",
                         required=True,
                         type=str,
-                        help="Substring to check in jobs to get the URL.")
+                        help="Job kind (word of the calling job name, like 'Build') to get the URL.")
     parser.add_argument("-o",
                         "--output",
                         required=True,
@@ -46,22 +60,46 @@ def arg_parse() -> Namespace:
                         type=str,
                         help="Output variable name for the Nb of Missing Apps.")
 
-    parser.add_argument("-E",
-                        "--Error",
+    parser.add_argument("-R",
+                        "--Results",
                         type=str,
-                        help="Error files directory.")
+                        help="Results files directory, or bundle. "
+                        "The status files are only read for the Apps without results.")
+    parser.add_argument("-S",
+                        "--State",
+                        type=str,
+                        help="Status state files directory, or bundle, or state file (see status_state.py). "
+                        "The Apps are rendered from it, without reading their results or status files.")
     parser.add_argument("-C",
                         "--Check",
                         type=str,
-                        help="Check Status files directory.")
+                        help="Check Status files directory, or bundle.")
     parser.add_argument("-B",
                         "--Build",
                         type=str,
-                        help="Build Status files directory.")
+                        help="Build Status files directory, or bundle.")
     parser.add_argument("-T",
                         "--Test",
                         type=str,
-                        help="Test Status files directory.")
+                        help="Test Status files directory, or bundle.")
+    parser.add_argument("-K",
+                        "--Cache",
+                        type=str,
+                        help="Build cache statistics files directory, or bundle.")
+    parser.add_argument("-P",
+                        "--Perf",
+                        type=str,
+                        help="Timing files directory, or bundle, to add the performance table.")
+    parser.add_argument("--slowest",
+                        type=int,
+                        default=10,
+                        help="Nb of slowest Apps listed in the performance table. Defaults to %(default)s.")
+    parser.add_argument("-H",
+                        "--History",
+                        type=str,
+                        help="SQLite database of the previous runs, to report the new failures, "
+                        "fixed and flaky Apps, and the duration regressions.")
+    add_profile_option(parser)
 
     parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase verbosity.")
 
@@ -78,36 +116,345 @@ def arg_parse() -> Namespace:
 
 
 # ===============================================================================
-#          Apps error report
+#          Apps results
 # ===============================================================================
-def errors_report(report_file: str, indir: str) -> int:
-    nb_apps = 0
+def get_phases(args: Namespace) -> List[Tuple[str, Optional[str], List[str]]]:
+    """Get the reported phases, with their status files (directory or bundle) and their columns"""
+
+    if args.Check:
+        return [("check", args.Check, CHECK_STEPS)]
+    phases = [("build", args.Build, get_full_devices())]
+    if args.Test is not None:
+        phases.append(("test", args.Test, get_full_devices()))
+    return phases
+
+
+def load_results(args: Namespace, state: Optional[StatusState] = None) -> Results:
+    """Load the results of the apps, from the status state if any (written as a merged results file),
+       else from the results files (merged in a single file while read),
+       then from the status files for the apps without results.
+    Args:
+        args: Command line arguments.
+        state: The status state of the apps, if any.
+    Returns:
+        The results of the reported phases.
+    """
+
+    phases = get_phases(args)
+    names = [phase for phase, _, _ in phases]
+    if state is not None:
+        records = [r for r in state.records() if r.phase in names]
+        if os.path.exists(MERGED_RESULTS):
+            os.remove(MERGED_RESULTS)
+        write_records(MERGED_RESULTS, records)
+        return Results(records)
+    results = Results()
+    if args.Results:
+        logging.info("Reading results files")
+        merged = MERGED_RESULTS if os.path.abspath(args.Results) != os.path.abspath(MERGED_RESULTS) else None
+        results = Results(r for r in read_records([args.Results], merged) if r.phase in names)
+    for phase, indir, columns in phases:
+        if not indir or not os.path.exists(indir):
+            continue
+        known = set(results.apps(phase))
+        for record in records_from_status(indir, phase, columns):
+            if record.app not in known:
+                results.add(record)
+    return results
+
+
+def errors_report(report_file: str, results: Results, phase: str) -> int:
+    """Write the errors report of the apps.
+    Args:
+        report_file: The file to write the report to.
+        results: The results of the apps.
+        phase: The reported phase.
+    Returns:
+        The number of apps with errors.
+    """
+
     logging.info("Generating errors report")
-    with open(report_file, "w", encoding="utf-8") as outfile:
-        for filename in os.listdir(indir):
-            nb_apps += 1
-            with open(f"{indir}/{filename}", encoding="utf-8") as infile:
-                outfile.write(infile.read())
-                outfile.write("\n")
-    return nb_apps
+    lines = results.errors_report(phase)
+    if lines:
+        with open(report_file, "w", encoding="utf-8") as outfile:
+            outfile.write("\n".join(lines) + "\n")
+    return len(lines)
+
+
+# ===============================================================================
+#          Build cache report
+# ===============================================================================
+def cache_report(indir: str) -> List[str]:
+    """Aggregate the build and compiler caches statistics of the apps, and of the shared cargo target directories.
+    Args:
+        indir: Directory (or bundle) of the build cache statistics files.
+    Returns:
+        The summary lines, one per cache having statistics.
+    """
+
+    hits = 0
+    misses = 0
+    compiler = {"hits": 0, "misses": 0, "bytes": 0}
+    cargo = {"fresh": 0, "compiled": 0}
+    for _, infile in input_files(indir, "build_cache"):
+        data = json.load(infile)
+        hits += data.get("hits", 0)
+        misses += data.get("misses", 0)
+        for name, value in data.get("compiler", {}).items():
+            compiler[name] = compiler.get(name, 0) + value
+        for device in data.get("cargo", {}).values():
+            for name, value in device.items():
+                cargo[name] = cargo.get(name, 0) + value
+    lines = []
+    total = hits + misses
+    if total:
+        lines.append(f":package: Build cache: {hits}/{total} device build(s) reused "
+                     f"({100 * hits / total:.0f}% hit rate)")
+    total = compiler["hits"] + compiler["misses"]
+    if total:
+        lines.append(f":hammer: Compiler cache: {compiler['hits']}/{total} object(s) reused "
+                     f"({100 * compiler['hits'] / total:.0f}% hit rate, {compiler['bytes'] / (1024 * 1024):.1f} MB)")
+    total = cargo["fresh"] + cargo["compiled"]
+    if total:
+        lines.append(f":crab: Cargo target: {cargo['fresh']}/{total} crate(s) reused "
+                     f"({100 * cargo['fresh'] / total:.0f}% hit rate)")
+    return lines
+
+
+# ===============================================================================
+#          Performance report
+# ===============================================================================
+def load_timings(indir: str) -> List[dict]:
+    """Load the timing records of the apps (JSON lines files).
+    Args:
+        indir: Directory (or bundle) of the timing files.
+    Returns:
+        The timing records.
+    """
+
+    records: List[dict] = []
+    for filename, infile in input_files(indir, "timing"):
+        # The kind (build, test, check) is the prefix of the file name
+        kind = filename.split("_")[0]
+        records.extend({"kind": kind, **json.loads(line)} for line in infile if line.strip())
+    return records
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Get a percentile of values, with the nearest-rank method."""
+
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def perf_report(indir: str, slowest: int) -> Optional[str]:
+    """Generate the performance table of the apps.
+    Args:
+        indir: Directory (or bundle) of the timing files.
+        slowest: Nb of slowest apps to list.
+    Returns:
+        The Markdown report, or None if no timing was found.
+    """
+
+    records = load_timings(indir)
+    if not records:
+        return None
+
+    devices = get_full_devices()
+
+    # Durations per app and device ("" for the phases of the whole app), and per phase
+    per_app: Dict[str, Dict[str, float]] = {}
+    per_phase: Dict[str, float] = {}
+    for rec in records:
+        app_times = per_app.setdefault(rec["app"], {})
+        device = rec.get("device") or ""
+        app_times[device] = app_times.get(device, 0.0) + rec["seconds"]
+        per_phase[rec["phase"]] = per_phase.get(rec["phase"], 0.0) + rec["seconds"]
+    totals = {app: sum(times.values()) for app, times in per_app.items()}
+    ranked = sorted(totals, key=lambda app: (-totals[app], app))
+    values = list(totals.values())
+
+    lines = [
+        "<details><summary>Performance</summary>",
+        "",
+        f"Total: {sum(values):.0f}s for {len(values)} App(s), "
+        f"p50: {percentile(values, 50):.0f}s, p95: {percentile(values, 95):.0f}s",
+        "",
+        "Phases: " + ", ".join(f"{phase} {secs:.0f}s" for phase, secs in sorted(per_phase.items())),
+        "",
+        f"Slowest Apps: {', '.join(f'{app} ({totals[app]:.0f}s)' for app in ranked[:slowest])}",
+        "",
+        "| App | Setup | " + " | ".join(devices) + " | Total |",
+        "|-----|:---:|" + "|".join(":---:" for _ in devices) + "|:---:|",
+    ]
+    for app in ranked:
+        cells = [f"{per_app[app][d]:.0f}s" if d in per_app[app] else "-" for d in [""] + devices]
+        lines.append(f"| {app} | " + " | ".join(cells) + f" | {totals[app]:.0f}s |")
+    lines.extend(["", "</details>"])
+    return "\n".join(lines)
+
+
+# ===============================================================================
+#          Run history report
+# ===============================================================================
+def collect_results(results: Results,
+                    phase: str,
+                    columns: List[str],
+                    durations: Dict[Tuple[str, str], float]) -> List[Result]:
+    """Get the results of the apps for the history.
+    Args:
+        results: The results of the apps.
+        phase: The phase.
+        columns: Names of the status columns (devices or check steps).
+        durations: Durations per (app, device), from the timing records.
+    Returns:
+        The results, without the not selected devices: one per App and device,
+        and one per failed variant of the device.
+    """
+
+    collected = []
+    for app_name in results.apps(phase):
+        for column in columns:
+            result = results.result(app_name, phase, column)
+            if result is not None and result in RESULTS.values():
+                collected.append(Result(app_name, column, None, result, durations.get((app_name, column))))
+                for variant in results.failed_variants.get((app_name, phase, column), []):
+                    collected.append(Result(app_name, column, variant, "fail", None))
+    return collected
+
+
+def history_report(run_id: int, results: Results, args: Namespace) -> None:
+    """Store the results of the run in the history, and report the changes since the previous runs.
+    Args:
+        run_id: The workflow run ID.
+        results: The results of the apps.
+        args: Command line arguments.
+    """
+
+    logging.info("Updating the run history")
+    timings = load_timings(args.Perf) if args.Perf and os.path.exists(args.Perf) else []
+    # Separate the workflows, and the scheduled runs from the manual ones
+    workflow = f"{os.environ.get('GITHUB_WORKFLOW', 'local')}/{os.environ.get('GITHUB_EVENT_NAME', 'manual')}"
+    history = RunHistory(args.History)
+    lines = []
+    for kind, _, columns in get_phases(args):
+        if kind not in results.phases():
+            continue
+        durations: Dict[Tuple[str, str], float] = {}
+        for rec in timings:
+            if rec["kind"] == kind and rec.get("device"):
+                key = (rec["app"], rec["device"])
+                durations[key] = durations.get(key, 0.0) + rec["seconds"]
+        mode = f"{workflow}/{kind}"
+        run = history.add_run(run_id, mode, collect_results(results, kind, columns, durations))
+
+        new_failures = history.new_failures(run, mode)
+        if new_failures:
+            variants = history.failed_variants(run)
+            names = [f"{a} ({d}: {' '.join(variants[(a, d)])})" if (a, d) in variants else f"{a} ({d})"
+                     for a, d in new_failures]
+            lines.append(f":new: New {kind} failure(s): " + ", ".join(names))
+        fixed = history.fixed(run, mode)
+        if fixed:
+            lines.append(f":tada: Fixed {kind}: " + ", ".join(f"{a} ({d})" for a, d in fixed))
+        flaky = history.flaky(mode)
+        if flaky:
+            lines.append(f":game_die: Flaky {kind}: " + ", ".join(f"{a} ({d}, {n} flips)" for a, d, n in flaky))
+        slower = history.duration_regressions(run, mode)
+        if slower:
+            lines.append(f":snail: Slower {kind}: "
+                         + ", ".join(f"{a} ({d}, {cur:.0f}s vs {prev:.0f}s)" for a, d, cur, prev in slower))
+    history.prune()
+    history.close()
+
+    if not lines:
+        lines.append(":card_file_box: No change since the previous run")
+    set_gh_summary("\n".join(lines) + "\n<br>")
+
+
+# ===============================================================================
+#          Get jobs from GitHub
+# ===============================================================================
+def fetch_jobs(run, workers: int = 8) -> list:
+    """Fetch all the jobs of a workflow run, requesting the pages concurrently.
+    Args:
+        run: The GitHub workflow run.
+        workers: Maximum number of concurrent requests.
+    Returns:
+        The list of jobs, in the GitHub order.
+    """
+
+    paginated = run.jobs()
+    # The 1st page gives the total number of jobs, hence the number of pages
+    jobs = paginated.get_page(0)
+    if not jobs:
+        return []
+    nb_pages = -(-paginated.totalCount // len(jobs))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for page in executor.map(paginated.get_page, range(1, nb_pages)):
+            jobs.extend(page)
+    return jobs
+
+
+def build_job_index(jobs) -> JobIndex:
+    """Index the jobs by (token, job kind).
+       A matrix job name looks like `Build All apps / Run for all targets (app-boilerplate, ...)`:
+       the kinds are the words of the caller job name (before ` / `),
+       the tokens are the words of the matrix job name, including the app name.
+    Args:
+        jobs: List of jobs from GitHub.
+    Returns:
+        The jobs links index. On duplicates, the first job is kept.
+    """
+
+    index: JobIndex = {}
+    for job in jobs:
+        prefix, _, name = job.name.partition(" / ")
+        if not name:
+            name = prefix
+        kinds = set(re.findall(r"[\w.+-]+", prefix))
+        for token in set(re.findall(r"[\w.+-]+", name)):
+            for kind in kinds:
+                index.setdefault((token, kind), job.html_url)
+    return index
+
+
+def state_job_index(state: StatusState, args: Namespace) -> JobIndex:
+    """Index the jobs links of the status state by (app, job kind), like `build_job_index`.
+    Args:
+        state: The status state of the apps.
+        args: Command line arguments.
+    Returns:
+        The jobs links index, of the apps whose job link is known.
+    """
+
+    index: JobIndex = {}
+    for phase, _, _ in get_phases(args):
+        kind = "Test" if phase == "test" else args.job
+        for app in state.apps(phase):
+            url = state.job_link(app, phase)
+            if url:
+                index[(app, kind)] = url
+    return index
 
 
 # ===============================================================================
 #          Get job Link in GitHub
 # ===============================================================================
-def get_job_link(app_name: str, job_name: str, jobs) -> str:
+def get_job_link(app_name: str, job_name: str, job_index: JobIndex) -> str:
     """Get the job link from GitHub.
     Args:
         app_name: The name of the app.
         job_name: The job name to search for.
-        jobs: List of jobs from GitHub.
+        job_index: Index of the jobs links.
     Returns:
         The job link if found, otherwise 'N/A'.
     """
 
-    job = next((job for job in jobs if app_name in job.name and job_name in job.name), None)
-    if job:
-        return f"[{job_name}]({job.html_url})"
+    url = job_index.get((app_name, job_name))
+    if url:
+        return f"[{job_name}]({url})"
     logging.warning("'%s' job not found for app '%s'", job_name, app_name)
     return "N/A"
 
@@ -116,28 +463,24 @@ def get_job_link(app_name: str, job_name: str, jobs) -> str:
 #          Generate full job Status
 # ===============================================================================
 def construct_job_status(app_name: str,
-                         fname: str,
                          build_status: List[str],
+                         results: Results,
                          args: Namespace,
-                         jobs) -> Tuple[str, int]:
+                         job_index: JobIndex) -> Tuple[str, int, int]:
     """Construct the job status string.
     Args:
         app_name: The name of the app.
-        fname: The name of the build file.
-        build_status: The build status string.
+        build_status: The build status tokens.
+        results: The results of the apps.
         args: Command line arguments.
-        jobs: List of jobs from GitHub.
+        job_index: Index of the jobs links.
     Returns:
-        Job status line and nb errors.
+        Job status line, nb errors and nb devices passed on retry.
     """
 
-    tname = fname.replace("build", "test", 1)
-    test_path = os.path.join(args.Test, tname)
-    try:
-        with open(test_path, encoding="utf-8") as infile:
-            test_status = infile.readline().split("|")[1:]
-    except FileNotFoundError:
-        logging.warning("File '%s' not found", test_path)
+    test_status = results.tokens(app_name, "test", get_full_devices())
+    if test_status is None:
+        logging.warning("No test results for '%s'", app_name)
         test_status = [":construction:" for _ in build_status]
 
     # Combine build and test statuses
@@ -147,12 +490,12 @@ def construct_job_status(app_name: str,
         for b_status, t_status in zip(build_status, test_status)
     ]
 
-    job_status = f"|{get_job_link(app_name, args.job, jobs)}"
+    job_status = f"|{get_job_link(app_name, args.job, job_index)}"
     job_status += "<br>"
-    job_status += f"{get_job_link(app_name, 'Test', jobs)}"
+    job_status += f"{get_job_link(app_name, 'Test', job_index)}"
     job_status += "".join(merged_tokens)
 
-    return job_status, test_status.count(":x:")
+    return job_status, test_status.count(":x:"), test_status.count(":repeat:")
 
 
 # ===============================================================================
@@ -160,86 +503,93 @@ def construct_job_status(app_name: str,
 # ===============================================================================
 def status_report(report_file: str,
                   run_id: int,
+                  results: Results,
                   args: Namespace,
-                  github_token: Optional[str] = None) -> Tuple[int, int, int, int]:
+                  state: Optional[StatusState] = None) -> Tuple[int, int, int, int, int]:
     """Generate the status report for the apps.
 
     Args:
         report_file: The file to write the report to.
         run_id: The workflow run ID.
+        results: The results of the apps.
         args: Command line arguments.
-        github_token: GitHub token for authentication (optional).
+        state: The status state of the apps, giving their jobs links, if any.
     Returns:
         Tuple containing
          - The number of apps,
          - The number of build/check errors,
          - The number of test errors,
+         - The number of tests passed on retry,
          - The number of skipped errors.
     """
 
-    logging.info("Fetching jobs from GitHub")
-    gh = Github(github_token) if github_token else Github()
-
-    repo = gh.get_repo("LedgerHQ/ledger-app-tester")
-    run = repo.get_workflow_run(run_id)
-    jobs = list(run.jobs())
+    # The jobs are only fetched from GitHub when a link is not known from the status state
+    job_index = state_job_index(state, args) if state else {}
+    kinds = [args.job] + (["Test"] if args.Test is not None else [])
+    phase = get_phases(args)[0][0]
+    if any((app, kind) not in job_index for app in results.apps(phase) for kind in kinds):
+        logging.info("Fetching jobs from GitHub")
+        # PyGithub is only imported when the jobs are fetched
+        from gh_client import github_client, get_workflow_run  # pylint: disable=import-outside-toplevel
+        gh = github_client(seconds_between_requests=None)
+        run = get_workflow_run(gh, run_id)
+        with profile_span("fetch jobs"):
+            for key, url in build_job_index(fetch_jobs(run)).items():
+                job_index.setdefault(key, url)
 
     nb_apps = 0
     nb_errors = 0
     nb_test_errors = 0
+    nb_test_retries = 0
     nb_skip_errors = 0
 
     lines = []
     # Format the header lines automatically
     headers = [" App Names ", " Jobs "]
     if args.Check:
-        added_hdr = [" manifest ", " icons ", " app_load_params ", " makefile ", " readme ", " scan"]
+        added_hdr = [f" {step} " for step in CHECK_STEPS]
     else:
-        added_hdr = [f" {d} " for d in devices]
+        added_hdr = [f" {d} " for d in get_full_devices()]
     headers += added_hdr
     lines.append("|" + "|".join(headers) + "|\n")
     lines.append("|" + "|".join(["-----------"] + [f":{'-' * max(3, len(h.strip()))}:" for h in headers[1:]]) + "|\n")
 
     # List all apps and their status, sorted alphabetically
-    indir = args.Check if args.Check else args.Build
-    for fname in sorted(os.listdir(indir)):
+    _, _, columns = get_phases(args)[0]
+    for app_name in results.apps(phase):
         nb_apps += 1
-        file_path = os.path.join(indir, fname)
-        with open(file_path, encoding="utf-8") as infile:
-            app_status = infile.readline()
+        app_status = "".join(f"|{token}" for token in results.tokens(app_name, phase, columns) or [])
         nb_errors += app_status.count(":x:")
         if app_status in ("|:x:", "|:construction:"):
             # Only a single fail on the 1st step
             app_status += f"{'|:black_circle:' * len(added_hdr)}"
             nb_errors += len(added_hdr)
 
-        # Extract app name from file name
-        app_name = os.path.splitext(os.path.basename(fname.split("_")[-1]))[0]
-
         # Construct the job status string
         if args.Test is None:
-            job_status = f"|{get_job_link(app_name, args.job, jobs)}{app_status}"
+            job_status = f"|{get_job_link(app_name, args.job, job_index)}{app_status}"
         else:
             # If test directory is provided, Analyze both Build and Test Status
-            job_status, test_erros = construct_job_status(app_name,
-                                                          fname,
-                                                          app_status.split("|")[1:],
-                                                          args,
-                                                          jobs)
+            job_status, test_erros, test_retries = construct_job_status(app_name,
+                                                                        app_status.split("|")[1:],
+                                                                        results,
+                                                                        args,
+                                                                        job_index)
             nb_test_errors += test_erros
+            nb_test_retries += test_retries
 
         # Write the status to the report file
         app_url = f"https://github.com/LedgerHQ/{app_name}"
         lines.append(f"|[{app_name}]({app_url}){job_status}{app_status}\n")
 
-        if app_status.count(":black_circle:") == len(devices):
+        if app_status.count(":black_circle:") == len(get_full_devices()):
             nb_skip_errors += 1
 
     logging.info("Generating status report")
     with open(report_file, "w", encoding="utf-8") as outfile:
         outfile.writelines(lines)
 
-    return nb_apps, nb_errors, nb_test_errors, nb_skip_errors
+    return nb_apps, nb_errors, nb_test_errors, nb_test_retries, nb_skip_errors
 
 
 # ===============================================================================
@@ -248,6 +598,7 @@ def status_report(report_file: str,
 def summary_report(nb_apps_error: int,
                    nb_errors: int,
                    nb_test_errors: int,
+                   nb_test_retries: int,
                    nb_skip_errors: int,
                    args: Namespace) -> None:
     """Generate the summary report for the apps.
@@ -255,6 +606,7 @@ def summary_report(nb_apps_error: int,
         nb_apps_error: The number of apps with errors.
         nb_errors: The number of build/check errors.
         nb_test_errors: The number of test errors.
+        nb_test_retries: The number of tests passed on retry.
         nb_skip_errors: The number of skipped errors.
         args: Command line arguments.
     """
@@ -271,8 +623,12 @@ def summary_report(nb_apps_error: int,
         lines.append(f":loudspeaker: Nb Build Error(s) found: {nb_errors}")
     if args.Test is not None:
         lines.append(f":loudspeaker: Nb Test Error(s) found: {nb_test_errors}")
+        if nb_test_retries:
+            lines.append(f":repeat: Nb Test(s) passed on retry: {nb_test_retries}")
     if nb_apps_error:
         lines.append(f":boom: Nb App(s) with error(s): {nb_apps_error}")
+    if args.Cache and os.path.exists(args.Cache):
+        lines.extend(cache_report(args.Cache))
     lines.append("<br>")
 
     content = "\n".join(lines) + "\n"
@@ -284,6 +640,12 @@ def summary_report(nb_apps_error: int,
     except FileNotFoundError:
         logging.warning("File 'app_status.md' not found while generating summary")
 
+    # Performance section
+    if args.Perf and os.path.exists(args.Perf):
+        perf = perf_report(args.Perf, args.slowest)
+        if perf:
+            content += perf + "\n<br>\n"
+
     # Legend section
     legend = [
         "<details><summary>Legend</summary>",
@@ -294,6 +656,7 @@ def summary_report(nb_apps_error: int,
         " - :construction: Workflow issue"
     ]
     if args.Test is not None:
+        legend.append(" - :repeat: Success, after rerunning the failed tests")
         legend.append(" - :warning: Build issue, No test!")
     legend.extend(["", "</details>"])
     content += "\n".join(legend) + "\n"
@@ -319,40 +682,52 @@ def main() -> None:
     # Arguments checking
     # ------------------
     logging_set_level(args.verbose)
+    profile_start("summary", args.profile)
 
-    # GitHub environment variables
-    github_token = os.environ.get("GH_TOKEN")
-    workflow_run_id = os.environ.get("GH_RUN_ID")
-    if workflow_run_id is None:
-        logging.error("'GH_RUN_ID' environment variable is not set")
-        sys.exit(1)
-
-    # Processing
-    # ----------
-    logging.info("Generating summary...")
-
-    # Generate reports
-    if os.path.isdir("error"):
-        nb_apps_error = errors_report(args.output, args.Error)
-    else:
-        nb_apps_error = 0
-    nb_apps_analyzed, nb_errors, nb_test_errors, nb_skip_errors = status_report("app_status.md",
-                                                                                int(workflow_run_id),
-                                                                                args,
-                                                                                github_token)
-
-    # Check if apps are missing in the status report
-    nb_apps_not_analyzed = args.total_apps - nb_apps_analyzed
-    if nb_apps_not_analyzed != 0:
-        set_gh_summary(f":warning: {nb_apps_not_analyzed} App(s) missing!!!\n<br>")
-    set_gh_output(args.missing, f"{nb_apps_not_analyzed}")
-
-    # Generate full summary
-    summary_report(nb_apps_error,
-                   nb_errors,
-                   nb_test_errors,
-                   nb_skip_errors,
-                   args)
+    # The profile is also written when the script fails, to diagnose it
+    try:
+        # GitHub environment variables
+        workflow_run_id = os.environ.get("GH_RUN_ID")
+        if workflow_run_id is None:
+            logging.error("'GH_RUN_ID' environment variable is not set")
+            sys.exit(1)
+
+        # Processing
+        # ----------
+        logging.info("Generating summary...")
+
+        # Generate reports
+        with profile_span("read status files"):
+            state = load_states([args.State]) if args.State else None
+            results = load_results(args, state)
+        nb_apps_error = errors_report(args.output, results, get_phases(args)[-1][0])
+        nb_apps_analyzed, nb_errors, nb_test_errors, nb_test_retries, nb_skip_errors = status_report(
+            "app_status.md",
+            int(workflow_run_id),
+            results,
+            args,
+            state)
+
+        # Check if apps are missing in the status report
+        nb_apps_not_analyzed = args.total_apps - nb_apps_analyzed
+        if nb_apps_not_analyzed != 0:
+            set_gh_summary(f":warning: {nb_apps_not_analyzed} App(s) missing!!!\n<br>")
+        set_gh_output(args.missing, f"{nb_apps_not_analyzed}")
+
+        # Generate full summary
+        with profile_span("render"):
+            summary_report(nb_apps_error,
+                           nb_errors,
+                           nb_test_errors,
+                           nb_test_retries,
+                           nb_skip_errors,
+                           args)
+        if args.History:
+            history_report(int(workflow_run_id), results, args)
+        from gh_client import report_api_usage  # pylint: disable=import-outside-toplevel
+        report_api_usage("summary", summary=True)
+    finally:
+        profile_stop()
 
 
 if __name__ == "__main__":
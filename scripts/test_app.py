@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tool to Test an App on the devices and manage the status and log files.
+The per-device test sessions run concurrently, each one with its own range of emulator ports
+(see `speculos_ports.py`), pytest temporary directory and cache, so that they never collide.
+The failed tests can be rerun alone (`--retries`), from the JUnit XML report of the session:
+a device whose tests all pass after a rerun gets its own status.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import subprocess
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import IO, Dict, List, Optional
+from argparse import ArgumentParser, Namespace
+from dataclasses import dataclass, field
+from results import STATUS_TOKENS, Record, write_records
+from utils import logging_init, logging_set_level, get_full_devices, get_test_info, add_timing
+
+
+BANNER = "#" * 73
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# First emulator port of the sessions, and number of ports of each session
+BASE_PORT = 5000
+PORTS_PER_SESSION = 100
+
+# Interval between the checks of the running sessions (in seconds)
+POLL_INTERVAL = 0.2
+
+
+@dataclass
+class DeviceTest:
+    """Test session of the App on a device"""
+
+    target: str
+    test_dir: str
+    port: int = BASE_PORT
+    output_dir: Optional[str] = None
+    log: Optional[str] = None
+    err: int = 0
+    proc: Optional[subprocess.Popen] = field(default=None, repr=False)
+    start: float = 0.0
+    junit: str = ""
+    retries: int = 0
+    nodes: List[str] = field(default_factory=list)
+
+    @property
+    def status_name(self) -> str:
+        """Particular target name of Nanos+ in status files"""
+        return self.target.replace("s+", "sp")
+
+
+# ===============================================================================
+#          Parse command line options
+# ===============================================================================
+def arg_parse() -> Namespace:
+    """Parse the commandline options"""
+
+    parser = ArgumentParser(description="Test an App and manage the status and log files")
+    parser.add_argument("-a",
+                        "--app",
+                        required=True,
+                        type=str,
+                        help="App name.")
+    parser.add_argument("-j",
+                        "--jobs",
+                        required=False,
+                        type=int,
+                        help="Max number of devices tested concurrently, capped by the number of CPUs. "
+                        "Defaults to all the devices.")
+    parser.add_argument("-r",
+                        "--retries",
+                        required=False,
+                        type=int,
+                        default=0,
+                        help="Max number of reruns of the failed tests, per device. Defaults to %(default)s.")
+    parser.add_argument("-P",
+                        "--plan",
+                        required=False,
+                        type=str,
+                        help="JSON file with the execution plan of the App (entry of the Apps list), "
+                        "instead of reading its manifest, Cargo.toml and test flags.")
+
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase verbosity.")
+
+    args = parser.parse_args()
+    if args.jobs is None:
+        args.jobs = len(get_full_devices())
+    if args.jobs < 1:
+        parser.error("--jobs must be a positive integer.")
+    # Each session runs its emulators: more sessions than CPUs only slows them down
+    args.jobs = min(args.jobs, os.cpu_count() or 1)
+    if args.retries < 0:
+        parser.error("--retries must not be negative.")
+    return args
+
+
+# ===============================================================================
+#          Sessions isolation
+# ===============================================================================
+def isolate_sessions(sessions: List[DeviceTest], app: str) -> None:
+    """Give each session its own emulator ports, and its own output directory (outside of the App tree),
+       with the pytest temporary directory and cache
+    """
+
+    for index, session in enumerate(sessions):
+        session.port = BASE_PORT + index * PORTS_PER_SESSION
+        session.output_dir = os.path.abspath(f"test_output_{app}_{session.status_name}")
+        os.makedirs(session.output_dir, exist_ok=True)
+        session.log = os.path.join(session.output_dir, "session.log")
+
+
+# ===============================================================================
+#          Tests execution
+# ===============================================================================
+def get_test_dir(app: str) -> Optional[str]:
+    """Get the pytest directory of the App from its manifest"""
+
+    # pylint: disable=import-outside-toplevel
+    from ledgered.manifest import MANIFEST_FILE_NAME
+    res = subprocess.run(["ledger-manifest", "-otp", f"{app}/{MANIFEST_FILE_NAME}"], check=False,
+                         stdout=subprocess.PIPE, text=True)
+    test_dir = res.stdout.strip()
+    return test_dir if res.returncode == 0 and test_dir else None
+
+
+def get_elf_files(app: str) -> Dict[str, str]:
+    """Get the path of the App binary for each device, from its manifest"""
+
+    # pylint: disable=import-outside-toplevel
+    import tomli
+    from ledgered.manifest import Manifest, MANIFEST_FILE_NAME
+    manifest = Manifest.from_path(Path(app) / MANIFEST_FILE_NAME)
+    devices = get_full_devices()
+    if manifest.app.is_rust:
+        cargo = Path(app) / "Cargo.toml"
+        if cargo.is_file():
+            with open(cargo, "rb") as f:
+                elf_name = tomli.load(f)["package"]["name"]
+        else:
+            elf_name = app
+        return {target: f"{app}/target/{target.replace('s+', 'splus')}/release/{elf_name}" for target in devices}
+    return {target: f"{app}/build/{target.replace('s+', 's2')}/bin/app.elf" for target in devices}
+
+
+def load_plan(args: Namespace) -> dict:
+    """Get the execution plan of the App: test directory, test flags and binaries.
+       Without plan file, they are read from its manifest, Cargo.toml and `test_info.json`.
+    """
+
+    if args.plan:
+        with open(args.plan, encoding="utf-8") as f:
+            plan = json.load(f)
+        return {"test_dir": plan["test_dir"], "test_flags": plan["test_flags"],
+                "elf_paths": {target: os.path.join(args.app, path) for target, path in plan["elf_paths"].items()}}
+    return {"test_dir": get_test_dir(args.app),
+            "test_flags": get_test_info(args.app).get("test_flags", "").split(),
+            "elf_paths": get_elf_files(args.app)}
+
+
+def node_id(classname: str, name: str, test_dir: str, app: str) -> Optional[str]:
+    """Get the pytest node ID of a JUnit test case, relative to the tests directory.
+       The JUnit class name is the dotted path of the test file (relative to the pytest rootdir,
+       searched from the tests directory up to the App directory), followed by the test classes.
+    """
+
+    parts = classname.split(".") if classname else []
+    base = Path(test_dir).resolve()
+    top = Path(app).resolve()
+    while True:
+        for i in range(len(parts), 0, -1):
+            path = base.joinpath(*parts[:i]).with_suffix(".py")
+            if path.is_file():
+                file_id = os.path.relpath(path, Path(test_dir).resolve())
+                return "::".join([file_id, *parts[i:], name])
+        if base == top or base == base.parent:
+            return None
+        base = base.parent
+
+
+def failed_nodes(session: DeviceTest, app: str) -> Optional[List[str]]:
+    """Get the node IDs of the failed tests of a session, from its JUnit XML report.
+       None if the failures can't be rerun alone (no report, collection errors...)
+    """
+
+    try:
+        root = ET.parse(session.junit).getroot()
+    except (OSError, ET.ParseError) as e:
+        logging.warning("Unable to read the JUnit report of %s: %s", session.target, e)
+        return None
+    nodes = []
+    for case in root.iter("testcase"):
+        if case.find("failure") is None and case.find("error") is None:
+            continue
+        node = node_id(case.get("classname", ""), case.get("name", ""), session.test_dir, app)
+        if node is None:
+            logging.warning("Unable to find the test '%s' of %s", case.get("name"), session.target)
+            return None
+        nodes.append(node)
+    return nodes or None
+
+
+def start_session(session: DeviceTest, extra_flags: List[str]) -> None:
+    """Start the pytest session of a device, or the rerun of its failed tests"""
+
+    out: Optional[IO] = None
+    if session.log:
+        # pylint: disable=consider-using-with
+        out = open(session.log, "a" if session.retries else "w", encoding="utf-8")
+    if session.retries:
+        title = f"Retry {session.retries}: {len(session.nodes)} failed test(s) on device {session.target}"
+    else:
+        title = f"Running Tests on device {session.target}"
+    banner = "\n".join([BANNER, f"     {title}", BANNER])
+    print(banner, file=out, flush=True)
+    cmd = ["pytest", "--tb=short", "-v", f"--device={session.status_name}", *extra_flags]
+    env = None
+    if session.output_dir:
+        cmd.extend(["-p", "speculos_ports", f"--basetemp={os.path.join(session.output_dir, 'tmp')}",
+                    "-o", f"cache_dir={os.path.join(session.output_dir, 'cache')}"])
+        env = {**os.environ, "SPECULOS_API_PORT": str(session.port),
+               "PYTHONPATH": os.pathsep.join(filter(None, [SCRIPTS_DIR, os.environ.get("PYTHONPATH")]))}
+    if session.junit:
+        cmd.append(f"--junitxml={session.junit}")
+    cmd.extend(session.nodes)
+    logging.debug("Running '%s' in %s", " ".join(cmd), session.test_dir)
+    session.start = time.perf_counter()
+    session.proc = subprocess.Popen(cmd, cwd=session.test_dir, env=env, stdout=out,
+                                    stderr=subprocess.STDOUT if out else None)
+    if out:
+        out.close()
+
+
+def run_sessions(sessions: List[DeviceTest], extra_flags: List[str], args: Namespace) -> None:
+    """Run the sessions, with at most `args.jobs` of them at the same time"""
+
+    pending = list(sessions)
+    running: List[DeviceTest] = []
+    while pending or running:
+        while pending and len(running) < args.jobs:
+            session = pending.pop(0)
+            start_session(session, extra_flags)
+            running.append(session)
+        # Only the sessions are waited for, not the other children of the process
+        finished = [session for session in running if session.proc is not None and session.proc.poll() is not None]
+        if not finished:
+            time.sleep(POLL_INTERVAL)
+            continue
+        for session in finished:
+            assert session.proc is not None
+            # Killed by a signal: same exit code as a shell
+            session.err = session.proc.returncode if session.proc.returncode >= 0 \
+                else 128 - session.proc.returncode
+            add_timing(f"test_timing_{args.app}.jsonl", args.app, "retry" if session.retries else "tests",
+                       time.perf_counter() - session.start, session.target)
+            running.remove(session)
+            if session.err != 0 and session.retries < args.retries:
+                nodes = failed_nodes(session, args.app)
+                if nodes:
+                    # Rerun only the failed tests, before the sessions not started yet
+                    session.retries += 1
+                    session.nodes = nodes
+                    pending.insert(0, session)
+
+
+# ===============================================================================
+#          MAIN
+# ===============================================================================
+def main() -> None:
+    """Main function"""
+
+    logging_init()
+
+    # Arguments parsing
+    # -----------------
+    args = arg_parse()
+
+    # Arguments checking
+    # ------------------
+    logging_set_level(args.verbose)
+
+    file_status = f"test_status_{args.app}.md"
+    file_error = f"test_errors_{args.app}.md"
+    file_results = f"test_results_{args.app}.jsonl"
+
+    # Processing
+    # ----------
+    plan = load_plan(args)
+    if plan["test_dir"] is None:
+        logging.error("No test directory found")
+        sys.exit(1)
+    test_dir = os.path.join(args.app, plan["test_dir"])
+
+    extra_flags: List[str] = plan["test_flags"]
+    if extra_flags:
+        print(f"Found Test flags: {' '.join(extra_flags)}")
+
+    # Select the devices with a binary
+    devices = get_full_devices()
+    sessions: List[DeviceTest] = []
+    for target in devices:
+        elf_file = plan["elf_paths"].get(target)
+        if elf_file and os.path.isfile(elf_file):
+            session = DeviceTest(target, test_dir)
+            if args.retries:
+                session.junit = os.path.abspath(f"test_junit_{args.app}_{session.status_name}.xml")
+            sessions.append(session)
+        elif args.verbose:
+            print(f"{target} not available.")
+
+    if len(sessions) > 1:
+        if args.jobs == 1:
+            logging.warning("A single session at a time (--jobs or CPUs): the devices are tested one by one")
+        isolate_sessions(sessions, args.app)
+        logging.info("Testing %d devices, %d concurrently", len(sessions), min(args.jobs, len(sessions)))
+    run_sessions(sessions, extra_flags, args)
+
+    # Report the status, in the devices order
+    final_err = 0
+    failed: List[str] = []
+    retried: List[str] = []
+    records: List[Record] = []
+    tested = {session.target: session for session in sessions}
+    with open(file_status, "a", encoding="utf-8") as status:
+        for target in devices:
+            result = tested.get(target)
+            if result is None:
+                status.write("|:black_circle:")
+                records.append(Record(args.app, "test", target, None, "none"))
+                continue
+            if result.log:
+                with open(result.log, encoding="utf-8") as log:
+                    print(log.read(), end="", flush=True)
+                os.remove(result.log)
+            if result.junit and os.path.isfile(result.junit):
+                os.remove(result.junit)
+            if result.err != 0:
+                status.write("|:x:")
+                failed.append(result.status_name)
+                records.append(Record(args.app, "test", target, None, "fail"))
+            elif result.retries:
+                status.write(f"|{STATUS_TOKENS['retry']}")
+                retried.append(result.status_name)
+                records.append(Record(args.app, "test", target, None, "retry"))
+            else:
+                status.write("|:white_check_mark:")
+                records.append(Record(args.app, "test", target, None, "pass"))
+            final_err += result.err
+
+    write_records(file_results, records)
+
+    if retried:
+        print(f"Passed on retry: {', '.join(retried)}")
+    if failed:
+        if os.path.isfile(file_error):
+            content = f", {', '.join(failed)}"
+        else:
+            content = f"\t• {args.app}: {', '.join(failed)}"
+        with open(file_error, "a", encoding="utf-8") as f:
+            f.write(content)
+
+    sys.exit(min(final_err, 255))
+
+
+if __name__ == "__main__":
+    main()
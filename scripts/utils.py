@@ -1,6 +1,12 @@
 import os
 import json
+import time
 import logging
+import functools
+import threading
+import contextlib
+from argparse import ArgumentParser
+from typing import Any, ContextManager, Dict, Iterator, Optional
 
 
 def logging_init() -> None:
@@ -52,24 +58,205 @@ def set_gh_summary(value: str) -> None:
             try:
                 with open(value, "r", encoding="utf-8") as infile:
                     outfile.write(infile.read())
-            except FileNotFoundError:
-                # Consider this is a simple string
+            except OSError:
+                # Consider this is a simple string (not found, or too long to be a filename)
                 outfile.write(f"{value}\n")
 
 
-def get_full_devices() -> list:
-    """Get the full list of devices from the config file.
+@functools.lru_cache(maxsize=None)
+def load_input_file(name: str) -> Any:
+    """Load a JSON config file of the input_files directory, once per process.
+
+    Args:
+        name: Name of the file
 
     Returns:
-        list: List of devices
+        The file content, shared by the callers: don't modify it
     """
 
     # Get the directory of the current script
     script_directory = os.path.dirname(os.path.abspath(__file__))
     # Construct the absolute path to the JSON file
-    file_path = os.path.join(script_directory, "../input_files/devices_list.json")
+    file_path = os.path.join(script_directory, "../input_files", name)
 
     with open(file_path, encoding="utf-8") as f:
-        data = json.load(f)
-        devices = data[0]["devices"]
-    return devices
+        return json.load(f)
+
+
+def get_full_devices() -> list:
+    """Get the full list of devices from the config file.
+
+    Returns:
+        list: List of devices
+    """
+
+    return list(load_input_file("devices_list.json")[0]["devices"])
+
+
+def get_test_info(app_name: str) -> dict:
+    """Get the test configuration of an application from the config file.
+
+    Args:
+        app_name: Name of the application
+
+    Returns:
+        dict: Test configuration (build_flags, test_flags, dependencies), empty if none
+    """
+
+    data = load_input_file("test_info.json")
+    return dict(next((info for info in data if info["name"] == app_name), {}))
+
+
+_timing_lock = threading.Lock()
+
+
+def add_timing(path: str,
+               app: str,
+               phase: str,
+               seconds: float,
+               device: Optional[str] = None,
+               variant: Optional[str] = None) -> None:
+    """Append a timing record (JSON line) to the timing file of an application.
+
+    Args:
+        path: Timing file, like `build_timing_<app>.jsonl`
+        app: Name of the application
+        phase: Name of the phase (sdk, flags, listvariants, compile, cache, tests, check)
+        seconds: Duration of the phase
+        device: Device of the phase, None if it concerns the whole application
+        variant: Variant of the phase, if any
+    """
+
+    record = {"app": app, "device": device, "variant": variant, "phase": phase, "seconds": round(seconds, 3)}
+    with _timing_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+# ===============================================================================
+#          Profiling
+# ===============================================================================
+# Nb of functions listed in the hotspots table of the profile
+PROFILE_TOP = 15
+
+
+class Profiler:
+    """Profile of a script: cProfile statistics, named timing spans, and outbound HTTP calls.
+
+    cProfile only records the main thread: the work of the pools shows up as waiting there,
+    and is measured by the spans (wall-clock time, and HTTP calls sent meanwhile by all the threads).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.http_calls = 0
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        # Only imported when profiling, to keep the startup of the scripts fast
+        import cProfile  # pylint: disable=import-outside-toplevel
+        self._profile = cProfile.Profile()
+        self._start = time.perf_counter()
+        self._profile.enable()
+
+    def count_http_call(self) -> None:
+        """Account an outbound HTTP call"""
+
+        with self._lock:
+            self.http_calls += 1
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time a named span (accumulated if entered several times)"""
+
+        start = time.perf_counter()
+        with self._lock:
+            http_calls = self.http_calls
+        try:
+            yield
+        finally:
+            with self._lock:
+                span = self.spans.setdefault(name, {"seconds": 0.0, "count": 0, "http_calls": 0})
+                span["seconds"] = round(span["seconds"] + time.perf_counter() - start, 3)
+                span["count"] += 1
+                span["http_calls"] += self.http_calls - http_calls
+
+    def stop(self, top: int = PROFILE_TOP) -> dict:
+        """Stop the profiling, and get the profile: total time, spans, HTTP calls and the top hotspots (self time)"""
+
+        import pstats  # pylint: disable=import-outside-toplevel
+        self._profile.disable()
+        stats = pstats.Stats(self._profile)
+        hotspots = []
+        # (file, line, function) -> (primitive calls, calls, self time, cumulative time, callers)
+        for (filename, line, function), (_, calls, tottime, cumtime, _) in sorted(
+                stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]:  # type: ignore[attr-defined]
+            # The built-in functions have no location
+            name = f"{os.path.basename(filename)}:{line}({function})" if line else function
+            hotspots.append({"function": name, "calls": calls,
+                             "self": round(tottime, 3), "cumulative": round(cumtime, 3)})
+        return {"script": self.name, "seconds": round(time.perf_counter() - self._start, 3),
+                "http_calls": self.http_calls, "spans": self.spans, "hotspots": hotspots}
+
+    @staticmethod
+    def report(profile: dict) -> str:
+        """Get the Markdown report of a profile: the spans, and the hotspots table"""
+
+        spans = ", ".join(f"{name} {span['seconds']:.2f}s ({span['http_calls']} HTTP)"
+                          for name, span in profile["spans"].items())
+        lines = [f"<details><summary>:stopwatch: Profile of {profile['script']}: {profile['seconds']:.2f}s, "
+                 f"{profile['http_calls']} HTTP call(s)</summary>\n",
+                 f"Spans: {spans or 'none'}\n",
+                 "| Function | Calls | Self (s) | Cumulative (s) |",
+                 "|----------|:-----:|:--------:|:--------------:|"]
+        lines += [f"| `{h['function']}` | {h['calls']} | {h['self']:.3f} | {h['cumulative']:.3f} |"
+                  for h in profile["hotspots"]]
+        lines.append("\n</details>\n")
+        return "\n".join(lines)
+
+
+_profiler: Optional[Profiler] = None
+
+
+def add_profile_option(parser: ArgumentParser) -> None:
+    """Add the `--profile` option to the parser of a script"""
+
+    parser.add_argument("--profile",
+                        action="store_true",
+                        help="Profile the script: write `profile_<script>.json`, "
+                        "and the hotspots table in the step summary.")
+
+
+def profile_start(name: str, enabled: bool) -> None:
+    """Start the profiling of a script, if enabled (`--profile`)"""
+
+    global _profiler
+    if enabled:
+        _profiler = Profiler(name)
+
+
+def profile_span(name: str) -> ContextManager:
+    """Time a named span of the profile, like `fetch jobs` (nothing if the profiling is disabled)"""
+
+    return _profiler.span(name) if _profiler else contextlib.nullcontext()
+
+
+def profile_http_call() -> None:
+    """Account an outbound HTTP call in the profile, if any"""
+
+    if _profiler:
+        _profiler.count_http_call()
+
+
+def profile_stop() -> None:
+    """Stop the profiling, if any: write the JSON profile, and its report in the step summary"""
+
+    global _profiler
+    if _profiler is None:
+        return
+    profile = _profiler.stop()
+    _profiler = None
+    path = f"profile_{profile['script']}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, separators=(",", ":"))
+    logging.info("Profile written in %s: %.2fs, %d HTTP call(s)", path, profile["seconds"], profile["http_calls"])
+    set_gh_summary(Profiler.report(profile))
@@ -0,0 +1,41 @@
+from argparse import Namespace
+from pathlib import Path
+
+import build_app
+from build_app import AppConfig, BuildTask, DeviceBuild, failure_name, make_output_dir, merge_outputs
+
+
+def test_isolated_outputs(tmp_path, monkeypatch):
+    app = tmp_path / "app-boilerplate"
+    (app / "src").mkdir(parents=True)
+    config = AppConfig("c", ".", ["nanos+"])
+    build = DeviceBuild("nanos+", variant_param="COIN", variants_values=["BTC", "ETH"])
+    tasks = [BuildTask(build, variant=v, app_dir=str(app)) for v in build.variants_values]
+    commands = []
+    monkeypatch.setattr(build_app, "run_cmd", lambda cmd, **kwargs: commands.append(cmd) or 0)
+    args = Namespace(compiler_env={}, compiler_args=[], variants=True, extra_flags=[])
+
+    for task in tasks:
+        task.output_dir = make_output_dir(str(tmp_path / "work"), task, config)
+        build_app.build_c(task, str(app), ["-j2"], args)
+        # Outputs of the fake build
+        bin_dir = Path(task.output_dir) / "nanos2" / "bin"
+        bin_dir.mkdir(parents=True)
+        (bin_dir / "app.elf").write_text(task.variant or "")
+
+    # The builds share the sources, with their own output directory
+    assert [cmd[-2:] for cmd in commands] == [[f"BUILD_DIR={tmp_path}/work/nanosp-BTC/build", "COIN=BTC"],
+                                              [f"BUILD_DIR={tmp_path}/work/nanosp-ETH/build", "COIN=ETH"]]
+    assert sorted(p.name for p in (tmp_path / "work").iterdir()) == ["nanosp-BTC", "nanosp-ETH"]
+
+    # The outputs of the last variant win
+    for task in tasks:
+        merge_outputs(task, config)
+    assert (app / "build" / "nanos2" / "bin" / "app.elf").read_text() == "ETH"
+
+
+def test_failure_name():
+    build = DeviceBuild("nanos+", variant_param="COIN")
+    tasks = [BuildTask(build, "BTC", err=2), BuildTask(build, "ETH"), BuildTask(build, "LTC", err=2)]
+    assert failure_name(build, tasks) == "nanosp [COIN: BTC LTC]"
+    assert failure_name(build, [BuildTask(build, err=2)]) == "nanosp"
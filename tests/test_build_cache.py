@@ -0,0 +1,43 @@
+import os
+
+from build_cache import BuildCache
+
+
+def store_build(cache, tmp_path, key, content):
+    out = tmp_path / "app" / "build" / "stax" / "bin"
+    out.mkdir(parents=True, exist_ok=True)
+    (out / "app.elf").write_bytes(content)
+    cache.store(key, str(tmp_path / "app"), ["build/stax/bin/app.elf"])
+
+
+def test_store_lookup_restore(tmp_path):
+    cache = BuildCache(str(tmp_path / "cache"))
+    key = BuildCache.make_key(app="sha", device="stax")
+    store_build(cache, tmp_path, key, b"elf")
+
+    entry = cache.lookup(key)
+    assert entry == {"files": {"build/stax/bin/app.elf": entry["files"]["build/stax/bin/app.elf"]}}
+    cache.restore(entry, str(tmp_path / "restored"))
+    assert (tmp_path / "restored" / "build/stax/bin/app.elf").read_bytes() == b"elf"
+    assert cache.lookup("unknown") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    # No temporary file left
+    assert not list((tmp_path / "cache").rglob("*.tmp"))
+
+
+def test_evict_lru(tmp_path):
+    cache = BuildCache(str(tmp_path / "cache"), max_size=5)
+    keys = [BuildCache.make_key(device=d) for d in ("stax", "flex")]
+    store_build(cache, tmp_path, keys[0], b"old")
+    store_build(cache, tmp_path, keys[1], b"new")
+    os.utime(cache._entry_path(keys[0]), (0, 0))
+    os.utime(cache._entry_path(keys[1]), (1, 1))
+    # A hit makes the entry the most recently used
+    assert cache.lookup(keys[0]) is not None
+    # An invalid entry is left as is, and doesn't stop the eviction
+    (tmp_path / "cache" / "entries" / "invalid.json").write_text("{")
+
+    assert cache.evict() == 1
+    assert cache.lookup(keys[0]) is not None
+    assert cache.lookup(keys[1]) is None
+    assert (tmp_path / "cache" / "entries" / "invalid.json").is_file()
@@ -0,0 +1,25 @@
+from compiler_cache import CompilerCache
+
+# Stats log of ccache: one `# <source>` line per compilation, followed by the names of its counters
+STATS_LOG = """# /tmp/build_app/src/main.c
+direct_cache_hit
+# /tmp/build_app/src/ui.c
+preprocessed_cache_hit
+# /tmp/build_app/src/crypto.c
+cache_miss
+# /tmp/build_app/src/app.S
+unsupported_source_language
+"""
+
+
+def test_stats_from_log(tmp_path):
+    cache = CompilerCache(str(tmp_path / "ccache"), str(tmp_path / "stats.log"))
+    # Without the counters of the cache directory, no bytes are estimated
+    cache.ccache = "false"
+    assert cache.env()["CCACHE_STATSLOG"] == str(tmp_path / "stats.log")
+
+    (tmp_path / "stats.log").write_text(STATS_LOG)
+    assert cache.stats() == {"hits": 2, "misses": 1, "bytes": 0}
+
+    cache.zero_stats()
+    assert cache.stats() == {"hits": 0, "misses": 0, "bytes": 0}
@@ -0,0 +1,81 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import requests
+
+import gh_client
+
+
+class FakeSession:
+    """Session answering with the requested URL"""
+
+    def get(self, url, **kwargs):
+        return SimpleNamespace(status_code=200, headers={}, text=url)
+
+
+def test_connection_shared_by_threads():
+    cnx = gh_client._HTTPSConnection("api.github.com")
+    cnx.session = FakeSession()
+    # Both requests are pending before their responses are read, like with the workers sharing a client
+    barrier = threading.Barrier(2)
+    responses = {}
+
+    def worker(name):
+        cnx.request("GET", f"/repos/LedgerHQ/{name}", None, {})
+        barrier.wait()
+        responses[name] = cnx.getresponse().read()
+
+    threads = [threading.Thread(target=worker, args=(name,)) for name in ("app-a", "app-b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert responses == {"app-a": "https://api.github.com:443/repos/LedgerHQ/app-a",
+                         "app-b": "https://api.github.com:443/repos/LedgerHQ/app-b"}
+
+
+class EtagHandler(BaseHTTPRequestHandler):
+    """Resources with an ETag, not modified when revalidated"""
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_etag_revalidation():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EtagHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    session = requests.Session()
+    session.mount("http://", gh_client.GitHubAdapter())
+    try:
+        first = session.get(f"{url}/repos/a")
+        revalidated = gh_client.stats.revalidated
+        second = session.get(f"{url}/repos/a")
+        # Not modified: the previous content is served again
+        assert gh_client.stats.revalidated == revalidated + 1
+        assert second.status_code == 200 and second.json() == first.json() == {"path": "/repos/a"}
+        assert second.headers["ETag"] == '"v1"'
+
+        # The streamed responses are not kept
+        with session.get(f"{url}/repos/b", stream=True) as streamed:
+            assert streamed.json() == {"path": "/repos/b"}
+        assert session.get(f"{url}/repos/b").json() == {"path": "/repos/b"}
+        assert gh_client.stats.revalidated == revalidated + 1
+    finally:
+        server.shutdown()
@@ -0,0 +1,131 @@
+import base64
+import json
+import random
+import threading
+import time
+from argparse import Namespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+from github.Requester import Requester
+from ledgered.github import GitHubLedgerHQ
+
+import gh_client
+from parse_all_apps import resolve_apps
+
+# Stub Apps of the organization: the devices of their manifest, and the variants of their Makefile.
+# None: no manifest, "error": the manifest can't be fetched
+APPS = {
+    "app-alpha": (["nanox", "stax"], "COIN ALPHA ALPHA_TEST"),
+    "app-bravo": (["flex"], None),
+    "app-charlie": None,
+    "app-delta": "error",
+    "app-echo": (["nanos+", "stax", "flex"], "CHAIN ECHO"),
+    "app-foxtrot": (["nanox"], None),
+    "app-golf": (["nanos+", "stax"], "COIN GOLF"),
+}
+
+
+def file_content(path, text):
+    return {"type": "file", "encoding": "base64", "name": path, "path": path, "sha": "0",
+            "content": base64.b64encode(text.encode()).decode()}
+
+
+class StubGitHub(BaseHTTPRequestHandler):
+    """Stub of the GitHub API, answering after a random delay, and counting the concurrent requests"""
+
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.running += 1
+            cls.max_running = max(cls.max_running, cls.running)
+        try:
+            time.sleep(random.uniform(0, 0.02))
+            self.answer(urlparse(self.path).path)
+        finally:
+            with cls.lock:
+                cls.running -= 1
+
+    def answer(self, path):
+        base = f"http://{self.headers['Host']}"
+        # The organization name is case insensitive
+        parts = [part.lower() if i < 2 else part for i, part in enumerate(path.strip("/").split("/"))]
+        if parts == ["orgs", "ledgerhq"]:
+            return self.send_json({"login": "LedgerHQ", "url": f"{base}/orgs/LedgerHQ"})
+        if parts == ["orgs", "ledgerhq", "repos"]:
+            return self.send_json([{"name": name, "full_name": f"LedgerHQ/{name}", "default_branch": "main",
+                                    "archived": False, "visibility": "public", "url": f"{base}/repos/LedgerHQ/{name}"}
+                                   for name in APPS])
+        if parts[:2] == ["repos", "ledgerhq"] and parts[3:4] == ["contents"]:
+            app = APPS.get(parts[2])
+            if app == "error":
+                return self.send_json({"message": "Forbidden"}, 403)
+            if app is None:
+                return self.send_json({"message": "Not Found"}, 404)
+            devices, variants = app
+            name = "/".join(parts[4:])
+            if name == "ledger_app.toml":
+                return self.send_json(file_content(name, f'[app]\nbuild_directory = "./"\nsdk = "C"\n'
+                                                         f'devices = {json.dumps(devices)}\n'))
+            if name == "Makefile":
+                return self.send_json(file_content(name, f"\t@echo VARIANTS {variants}\n" if variants else "\n"))
+        return self.send_json({"message": "Not Found"}, 404)
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def github(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGitHub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Like `GH_API_URL`, read when gh_client is imported
+    monkeypatch.setattr(gh_client, "API_URL", f"http://127.0.0.1:{server.server_port}")
+    # A single connection shared by the workers, like the default persistent connection of PyGithub,
+    # and the other workers run between the request and the response, as in a busy process
+    monkeypatch.setattr(Requester, "_Requester__persist", True)
+    request = gh_client._HTTPConnection.request
+
+    def slow_request(self, *args, **kwargs):
+        request(self, *args, **kwargs)
+        time.sleep(0.005)
+
+    monkeypatch.setattr(gh_client._HTTPConnection, "request", slow_request)
+    StubGitHub.max_running = 0
+    # Like parse_all_apps.py: the requests are sent by concurrent workers, without throttling
+    yield gh_client.github_client(GitHubLedgerHQ, seconds_between_requests=None)
+    server.shutdown()
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_resolve_apps(github, jobs):
+    args = Namespace(jobs=jobs, sdk=["c"], limit=0, devices=["nanox", "stax", "flex", "nanos+"],
+                     mode=None, sdk_branch=None)
+
+    apps, failed = resolve_apps(list(github.apps), args)
+
+    # Sorted by name, each App with its own manifest and variants (whatever the thread which fetched them)
+    assert [(a["repo_name"], a["devices"], a["variant_param"], a["variants_values"]) for a in apps] == [
+        ("app-alpha", ["nanox", "stax"], "COIN", ["ALPHA", "ALPHA_TEST"]),
+        ("app-bravo", ["flex"], None, []),
+        ("app-echo", ["flex", "nanos+", "stax"], "CHAIN", ["ECHO"]),
+        ("app-foxtrot", ["nanox"], None, []),
+        ("app-golf", ["nanos+", "stax"], "COIN", ["GOLF"]),
+    ]
+    # The App whose manifest can't be fetched is reported, without stopping the others
+    assert failed == ["app-delta"]
+    # At most `--jobs` concurrent requests
+    assert 1 <= StubGitHub.max_running <= jobs
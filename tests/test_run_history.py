@@ -0,0 +1,33 @@
+from run_history import Result, RunHistory
+
+
+def add(history, run_id, results):
+    return history.add_run(run_id, "wf/build", [Result(*r) for r in results])
+
+
+def test_changes(tmp_path):
+    history = RunHistory(str(tmp_path / "history.db"))
+    add(history, 1, [("app-a", "stax", None, "pass", 10.0),
+                     ("app-b", "stax", None, "pass", 10.0),
+                     ("app-c", "stax", None, "error", None)])
+    run = add(history, 2, [("app-a", "stax", None, "error", None),
+                           ("app-b", "stax", None, "fail", 10.0),
+                           ("app-b", "stax", "BTC", "fail", None),
+                           ("app-b", "stax", "ETH", "fail", None),
+                           ("app-c", "stax", None, "pass", 10.0)])
+
+    assert history.new_failures(run, "wf/build") == [("app-a", "stax"), ("app-b", "stax")]
+    assert history.fixed(run, "wf/build") == [("app-c", "stax")]
+    assert history.failed_variants(run) == {("app-b", "stax"): ["BTC", "ETH"]}
+    history.close()
+
+
+def test_flaky_ignores_variants(tmp_path):
+    history = RunHistory(str(tmp_path / "history.db"))
+    for run_id in range(4):
+        result = "fail" if run_id % 2 else "pass"
+        variants = [("app-a", "stax", "BTC", "fail", None)] * 3 if result == "fail" else []
+        add(history, run_id, [("app-a", "stax", None, result, 10.0), *variants])
+
+    assert history.flaky("wf/build") == [("app-a", "stax", 3)]
+    history.close()
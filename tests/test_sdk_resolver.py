@@ -0,0 +1,99 @@
+import json
+import threading
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from sdk_resolver import SdkResolver
+
+API_LEVELS = {"22": ["nanox", "stax"], "23": ["stax", "flex"], "24": ["flex-rc"]}
+
+
+def git(*cmd: str) -> str:
+    return subprocess.run(["git", *cmd], check=True, stdout=subprocess.PIPE, text=True).stdout.strip()
+
+
+def commit_file(work: Path, name: str, content: str) -> None:
+    (work / name).write_text(content)
+    git("-C", str(work), "add", name)
+    git("-C", str(work), "-c", "user.name=test", "-c", "user.email=test@test", "commit", "-q", "-m", name)
+
+
+@pytest.fixture
+def sdk_repo(tmp_path):
+    """Bare SDK repository: master with api_levels.json, and the API_LEVEL_xx branches"""
+
+    work = tmp_path / "work"
+    work.mkdir()
+    git("init", "-q", "-b", "master", str(work))
+    commit_file(work, "api_levels.json", json.dumps(API_LEVELS))
+    for level in ["22", "23"]:
+        git("-C", str(work), "checkout", "-q", "-b", f"API_LEVEL_{level}", "master")
+        commit_file(work, "level", level)
+    bare = tmp_path / "sdk.git"
+    git("clone", "-q", "--bare", str(work), str(bare))
+    return bare
+
+
+def test_resolve(sdk_repo, tmp_path):
+    resolver = SdkResolver(str(sdk_repo), str(tmp_path / "worktrees"))
+    targets = ["nanos+", "nanox", "stax", "flex"]
+
+    assert resolver.resolve(targets, "scan") == {
+        "nanos+": "master", "nanox": "API_LEVEL_22", "stax": "API_LEVEL_23", "flex": "API_LEVEL_23"}
+    assert resolver.resolve(targets, "build") == {target: "master" for target in targets}
+    assert resolver.resolve(targets, "test") == {target: None for target in targets}
+    assert resolver.resolve(targets, "scan", "my_branch") == {target: "my_branch" for target in targets}
+
+
+def test_checkout_cleanup(sdk_repo, tmp_path):
+    resolver = SdkResolver(str(sdk_repo), str(tmp_path / "worktrees"))
+
+    path = resolver.checkout("API_LEVEL_22")
+    assert path is not None
+    assert (Path(path) / "level").read_text() == "22"
+    # A worktree per distinct reference, created once
+    assert resolver.checkout("API_LEVEL_22") == path
+    other = resolver.checkout("API_LEVEL_23")
+    assert other != path and (Path(other) / "level").read_text() == "23"
+    assert resolver.checkout("unknown") is None
+
+    resolver.cleanup()
+    assert not Path(path).exists() and not Path(other).exists()
+    assert "API_LEVEL" not in git("-C", str(sdk_repo), "worktree", "list")
+
+
+def test_keep_worktrees(sdk_repo, tmp_path):
+    path = SdkResolver(str(sdk_repo), str(tmp_path / "worktrees"), keep=True).checkout("master")
+    assert path is not None
+    # The next builds reuse the kept worktree
+    resolver = SdkResolver(str(sdk_repo), str(tmp_path / "worktrees"), keep=True)
+    assert resolver.checkout("master") == path
+    resolver.cleanup()
+    assert Path(path, "api_levels.json").is_file()
+
+
+def test_shared_worktree_not_moved_while_used(sdk_repo, tmp_path):
+    worktrees = str(tmp_path / "worktrees")
+    first = SdkResolver(str(sdk_repo), worktrees, keep=True)
+    path = first.checkout("API_LEVEL_22")
+    assert path is not None
+
+    # New commit of the reference, while the 1st build still uses the worktree
+    work = tmp_path / "update"
+    git("clone", "-q", "-b", "API_LEVEL_22", str(sdk_repo), str(work))
+    commit_file(work, "level", "22.1")
+    git("-C", str(work), "push", "-q", "origin", "API_LEVEL_22")
+
+    second = SdkResolver(str(sdk_repo), worktrees, keep=True)
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (second.checkout("API_LEVEL_22"), done.set()))
+    thread.start()
+    assert not done.wait(0.5)
+    assert (Path(path) / "level").read_text() == "22"
+
+    first.cleanup()
+    thread.join(timeout=10)
+    assert done.is_set() and (Path(path) / "level").read_text() == "22.1"
+    second.cleanup()
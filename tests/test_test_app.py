@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import subprocess
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+import test_app
+from test_app import DeviceTest, run_sessions
+
+SCRIPTS_DIR = Path(test_app.__file__).parent
+
+# Stub of pytest: logs its arguments, and fails on flex
+STUB_PYTEST = """#!/bin/sh
+echo "stub pytest $*"
+echo "port ${SPECULOS_API_PORT:-none}"
+case "$*" in
+    *--device=flex*) exit 1 ;;
+esac
+exit 0
+"""
+
+
+@pytest.fixture
+def stub_pytest(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    stub = bin_dir / "pytest"
+    stub.write_text(STUB_PYTEST)
+    stub.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_run_sessions(stub_pytest):
+    tests_dir = stub_pytest / "tests"
+    tests_dir.mkdir()
+    sessions = [DeviceTest(target, str(tests_dir), log=str(stub_pytest / f"{target}.log"))
+                for target in ["stax", "flex", "nanos+"]]
+    args = Namespace(app="app", jobs=2, retries=0)
+
+    run_sessions(sessions, ["--flag"], args)
+
+    assert [s.err for s in sessions] == [0, 1, 0]
+    for session in sessions:
+        log = Path(session.log).read_text()
+        assert f"Running Tests on device {session.target}" in log
+        assert f"stub pytest --tb=short -v --device={session.status_name} --flag" in log
+    timings = [json.loads(line) for line in (stub_pytest / "test_timing_app.jsonl").read_text().splitlines()]
+    assert sorted(t["device"] for t in timings) == ["flex", "nanos+", "stax"]
+
+
+def test_status_files(stub_pytest):
+    app = stub_pytest / "app"
+    (app / "tests").mkdir(parents=True)
+    elf_paths = {}
+    for target in ["stax", "flex"]:
+        elf = Path("build") / target / "bin" / "app.elf"
+        (app / elf).parent.mkdir(parents=True)
+        (app / elf).write_bytes(b"elf")
+        elf_paths[target] = str(elf)
+    plan = stub_pytest / "plan.json"
+    plan.write_text(json.dumps({"test_dir": "tests", "test_flags": [], "elf_paths": elf_paths}))
+
+    res = subprocess.run([sys.executable, str(SCRIPTS_DIR / "test_app.py"), "-a", "app", "-P", str(plan)],
+                         check=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+    assert res.returncode == 1, res.stdout
+    expected = {"stax": ":white_check_mark:", "flex": ":x:"}
+    status = "".join(f"|{expected.get(target, ':black_circle:')}" for target in test_app.get_full_devices())
+    assert (stub_pytest / "test_status_app.md").read_text() == status
+    assert (stub_pytest / "test_errors_app.md").read_text() == "\t• app: flex"
+    # The logs of the sessions are printed, in the devices order
+    assert res.stdout.index("--device=stax") < res.stdout.index("--device=flex")
+    # The sessions run in the tests directory, with their own ports and outputs outside of the App tree
+    assert "port 5000" in res.stdout and "port 5100" in res.stdout
+    assert f"--basetemp={stub_pytest / 'test_output_app_flex' / 'tmp'}" in res.stdout
+    assert sorted(p.name for p in app.iterdir()) == ["build", "tests"]